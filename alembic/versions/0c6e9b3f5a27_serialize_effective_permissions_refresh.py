@@ -0,0 +1,137 @@
+"""serialize user_effective_permissions refresh per user
+
+Revision ID: 0c6e9b3f5a27
+Revises: f3a9d6c2b814
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0c6e9b3f5a27"
+down_revision = "f3a9d6c2b814"
+branch_labels = None
+depends_on = None
+
+# Две транзакции, меняющие роли одного пользователя, раньше собирали
+# права каждая в своем снимке и последняя затирала строку чужим
+# устаревшим набором. Теперь строки пользователей блокируются в порядке
+# id до агрегации. Агрегат - отдельный оператор plpgsql, в READ
+# COMMITTED он получает новый снимок и видит то, что зафиксировала
+# транзакция, которую пришлось ждать.
+# FOR NO KEY UPDATE, а не FOR UPDATE: вставка в user_role держит
+# FOR KEY SHARE на строке пользователя, и FOR UPDATE двух таких
+# транзакций ждали бы друг друга до deadlock
+REFRESH_FUNCTION = """
+CREATE OR REPLACE FUNCTION refresh_user_effective_permissions(user_ids uuid[])
+RETURNS void AS $$
+BEGIN
+    PERFORM 1 FROM "user" WHERE id = ANY(user_ids)
+    ORDER BY id FOR NO KEY UPDATE;
+
+    INSERT INTO user_effective_permissions (user_id, permissions)
+    SELECT target.id, COALESCE(
+        (
+            SELECT array_agg(DISTINCT permission.name ORDER BY permission.name)
+            FROM user_role
+            JOIN role_permission
+                ON role_permission.role_id = user_role.role_id
+            JOIN permission ON permission.id = role_permission.permission_id
+            WHERE user_role.user_id = target.id
+        ),
+        '{}'
+    )
+    FROM unnest(user_ids) AS target(id)
+    WHERE EXISTS (SELECT 1 FROM "user" WHERE "user".id = target.id)
+    ON CONFLICT (user_id) DO UPDATE SET permissions = EXCLUDED.permissions;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Изменение прав роли пересчитывает ее держателей, но назначение роли,
+# еще не зафиксированное другой транзакцией, в этот список не попадет,
+# а та транзакция соберет права роли в старом снимке. Поэтому обе
+# стороны сначала блокируют строки затронутых ролей: роли, затем
+# пользователи - порядок одинаковый для всех триггеров
+LOCK_ROLES = """
+    PERFORM 1 FROM role WHERE id IN (SELECT role_id FROM changed)
+    ORDER BY id FOR NO KEY UPDATE;
+"""
+
+TRIGGER_FUNCTIONS = {
+    "user_role_changed": LOCK_ROLES
+    + """
+        PERFORM refresh_user_effective_permissions(
+            ARRAY(SELECT DISTINCT user_id FROM changed)
+        );
+    """,
+    "role_permission_changed": LOCK_ROLES
+    + """
+        PERFORM refresh_user_effective_permissions(
+            ARRAY(
+                SELECT DISTINCT user_role.user_id FROM user_role
+                WHERE user_role.role_id IN (SELECT role_id FROM changed)
+            )
+        );
+    """,
+}
+
+# Определения из e5c81a2d9f47 для downgrade
+PREVIOUS_REFRESH_FUNCTION = """
+CREATE OR REPLACE FUNCTION refresh_user_effective_permissions(user_ids uuid[])
+RETURNS void AS $$
+    INSERT INTO user_effective_permissions (user_id, permissions)
+    SELECT target.id, COALESCE(
+        (
+            SELECT array_agg(DISTINCT permission.name ORDER BY permission.name)
+            FROM user_role
+            JOIN role_permission
+                ON role_permission.role_id = user_role.role_id
+            JOIN permission ON permission.id = role_permission.permission_id
+            WHERE user_role.user_id = target.id
+        ),
+        '{}'
+    )
+    FROM unnest(user_ids) AS target(id)
+    WHERE EXISTS (SELECT 1 FROM "user" WHERE "user".id = target.id)
+    ON CONFLICT (user_id) DO UPDATE SET permissions = EXCLUDED.permissions;
+$$ LANGUAGE sql;
+"""
+
+PREVIOUS_TRIGGER_FUNCTIONS = {
+    "user_role_changed": """
+        PERFORM refresh_user_effective_permissions(
+            ARRAY(SELECT DISTINCT user_id FROM changed)
+        );
+    """,
+    "role_permission_changed": """
+        PERFORM refresh_user_effective_permissions(
+            ARRAY(
+                SELECT DISTINCT user_role.user_id FROM user_role
+                WHERE user_role.role_id IN (SELECT role_id FROM changed)
+            )
+        );
+    """,
+}
+
+
+def create_functions(refresh_function: str, trigger_functions: dict) -> None:
+    # смена языка sql -> plpgsql допустима в CREATE OR REPLACE,
+    # триггеры продолжают ссылаться на те же функции
+    op.execute(refresh_function)
+    for name, body in trigger_functions.items():
+        op.execute(
+            "CREATE OR REPLACE FUNCTION {0}() RETURNS trigger AS $$ "
+            "BEGIN {1} RETURN NULL; END; $$ LANGUAGE plpgsql".format(
+                name, body
+            )
+        )
+
+
+def upgrade() -> None:
+    create_functions(REFRESH_FUNCTION, TRIGGER_FUNCTIONS)
+
+
+def downgrade() -> None:
+    create_functions(PREVIOUS_REFRESH_FUNCTION, PREVIOUS_TRIGGER_FUNCTIONS)
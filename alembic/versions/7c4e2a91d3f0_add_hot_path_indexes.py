@@ -0,0 +1,99 @@
+"""add indexes for hot lookup paths
+
+Revision ID: 7c4e2a91d3f0
+Revises: 5ee723718d4d
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "7c4e2a91d3f0"
+down_revision = "5ee723718d4d"
+branch_labels = None
+depends_on = None
+
+# name, table, columns
+INDEXES = [
+    # /auth/history: фильтр по user_id и сортировка по (created_at, id)
+    (
+        "ix_user_history_user_id_created_at",
+        "user_history",
+        "user_id, created_at, id",
+    ),
+    # обратный поиск пользователей роли, первичный ключ user_role
+    # начинается с user_id и здесь не помогает
+    ("ix_user_role_role_id", "user_role", "role_id"),
+    # exists и delete по user_id при обновлении и проверке токена
+    ("ix_refresh_token_user_id", "refresh_token", "user_id"),
+]
+
+TABLES_WITH_ID = ["user", "role", "refresh_token", "user_history"]
+
+# Удаляет unique-ограничения ровно на колонке id: миграции создали
+# их в дополнение к первичному ключу (<table>_id_key, <table>_id_key1),
+# и каждое держит свой индекс, который обновляется на каждой вставке
+DROP_ID_UNIQUE = """
+DO $$
+DECLARE
+    constraint_name text;
+BEGIN
+    FOR constraint_name IN
+        SELECT con.conname
+        FROM pg_constraint con
+        JOIN pg_attribute att
+            ON att.attrelid = con.conrelid AND att.attnum = con.conkey[1]
+        WHERE con.conrelid = '"{table}"'::regclass
+            AND con.contype = 'u'
+            AND array_length(con.conkey, 1) = 1
+            AND att.attname = 'id'
+            -- внешний ключ мог привязаться к индексу этого ограничения
+            -- вместо первичного ключа, такие ограничения оставляем
+            AND NOT EXISTS (
+                SELECT 1 FROM pg_constraint fk
+                WHERE fk.contype = 'f' AND fk.conindid = con.conindid
+            )
+    LOOP
+        EXECUTE format(
+            'ALTER TABLE "{table}" DROP CONSTRAINT IF EXISTS %I',
+            constraint_name
+        );
+    END LOOP;
+END $$;
+"""
+
+RESTORE_ID_UNIQUE = """
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = '"{table}"'::regclass AND conname = '{table}_id_key'
+    ) THEN
+        ALTER TABLE "{table}" ADD CONSTRAINT "{table}_id_key" UNIQUE (id);
+    END IF;
+END $$;
+"""
+
+
+def upgrade() -> None:
+    for table in TABLES_WITH_ID:
+        op.execute(DROP_ID_UNIQUE.format(table=table))
+
+    # CREATE INDEX CONCURRENTLY не блокирует запись в таблицу,
+    # но не может выполняться внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.execute(
+                'CREATE INDEX CONCURRENTLY IF NOT EXISTS {0} ON "{1}" ({2})'
+                .format(name, table, columns)
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _, _ in INDEXES:
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS {0}".format(name))
+
+    for table in TABLES_WITH_ID:
+        op.execute(RESTORE_ID_UNIQUE.format(table=table))
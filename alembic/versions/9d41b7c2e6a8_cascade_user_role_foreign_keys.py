@@ -0,0 +1,40 @@
+"""delete user_role rows together with their user or role
+
+Revision ID: 9d41b7c2e6a8
+Revises: 0c6e9b3f5a27
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "9d41b7c2e6a8"
+down_revision = "0c6e9b3f5a27"
+branch_labels = None
+depends_on = None
+
+# Ключи user_role из 5ee723718d4d создавались без ON DELETE, и удаление
+# назначенной роли падало на нарушении ключа. Триггер user_role_changed
+# срабатывает и на каскадное удаление и пересчитывает права держателей
+# name, referenced table, column
+FOREIGN_KEYS = [
+    ("user_role_role_id_fkey", "role", "role_id"),
+    ("user_role_user_id_fkey", "user", "user_id"),
+]
+
+
+def recreate_foreign_keys(ondelete) -> None:
+    for name, referent, column in FOREIGN_KEYS:
+        op.drop_constraint(name, "user_role", type_="foreignkey")
+        op.create_foreign_key(
+            name, "user_role", referent, [column], ["id"], ondelete=ondelete
+        )
+
+
+def upgrade() -> None:
+    recreate_foreign_keys("CASCADE")
+
+
+def downgrade() -> None:
+    recreate_foreign_keys(None)
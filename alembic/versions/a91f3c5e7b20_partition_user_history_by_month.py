@@ -0,0 +1,119 @@
+"""partition user_history by month of created_at
+
+Revision ID: a91f3c5e7b20
+Revises: 7c4e2a91d3f0
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a91f3c5e7b20"
+down_revision = "7c4e2a91d3f0"
+branch_labels = None
+depends_on = None
+
+# Будущие месяцы, для которых партиции создаются сразу,
+# дальше их создает фоновая задача приложения или cli
+PARTITIONS_AHEAD = 3
+
+CREATE_MONTH_PARTITIONS = """
+DO $$
+DECLARE
+    month date;
+BEGIN
+    FOR month IN
+        SELECT generate_series(
+            date_trunc(
+                'month',
+                COALESCE((SELECT min(created_at) FROM user_history_old), now())
+            ),
+            date_trunc('month', now()) + interval '{ahead} months',
+            interval '1 month'
+        )::date
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF user_history '
+            'FOR VALUES FROM (%L) TO (%L)',
+            'user_history_p' || to_char(month, 'YYYYMM'),
+            month,
+            (month + interval '1 month')::date
+        );
+    END LOOP;
+END $$;
+"""
+
+
+def create_history_indexes() -> None:
+    op.create_index(
+        "ix_user_history_user_id_created_at",
+        "user_history",
+        ["user_id", "created_at", "id"],
+    )
+
+
+def upgrade() -> None:
+    op.rename_table("user_history", "user_history_old")
+    op.execute(
+        "ALTER TABLE user_history_old "
+        "RENAME CONSTRAINT user_history_pkey TO user_history_old_pkey"
+    )
+    op.drop_index("ix_user_history_user_id_created_at")
+
+    # ключ партиционирования обязан входить в первичный ключ
+    op.create_table(
+        "user_history",
+        sa.Column("id", sa.UUID, nullable=False),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        sa.Column("event", sa.String(255), nullable=False),
+        sa.Column("user_id", sa.UUID),
+        sa.PrimaryKeyConstraint("id", "created_at"),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+    create_history_indexes()
+    # BRIN на порядки меньше btree и подходит для выборок по диапазону
+    # времени, так как строки пишутся в порядке created_at
+    op.create_index(
+        "ix_user_history_created_at_brin",
+        "user_history",
+        ["created_at"],
+        postgresql_using="brin",
+    )
+    # строки вне созданных месяцев не теряются, а попадают в default
+    op.execute(
+        "CREATE TABLE user_history_default PARTITION OF user_history DEFAULT"
+    )
+    op.execute(CREATE_MONTH_PARTITIONS.format(ahead=PARTITIONS_AHEAD))
+
+    op.execute(
+        "INSERT INTO user_history (id, created_at, event, user_id) "
+        "SELECT id, COALESCE(created_at, now()), event, user_id "
+        "FROM user_history_old"
+    )
+    op.drop_table("user_history_old")
+
+
+def downgrade() -> None:
+    op.create_table(
+        "user_history_old",
+        sa.Column("id", sa.UUID, primary_key=True),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("event", sa.String(255), nullable=False),
+        sa.Column("user_id", sa.UUID),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+    )
+    op.execute(
+        "INSERT INTO user_history_old (id, created_at, event, user_id) "
+        "SELECT id, created_at, event, user_id FROM user_history"
+    )
+    # удаление родительской таблицы удаляет и все партиции
+    op.drop_table("user_history")
+    op.rename_table("user_history_old", "user_history")
+    op.execute(
+        "ALTER TABLE user_history "
+        "RENAME CONSTRAINT user_history_old_pkey TO user_history_pkey"
+    )
+    create_history_indexes()
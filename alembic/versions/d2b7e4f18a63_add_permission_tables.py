@@ -0,0 +1,107 @@
+"""add normalized permission and role_permission tables
+
+Revision ID: d2b7e4f18a63
+Revises: a91f3c5e7b20
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d2b7e4f18a63"
+down_revision = "a91f3c5e7b20"
+branch_labels = None
+depends_on = None
+
+# Права роли из строки access через запятую, без пробелов и пустых
+ROLE_PERMISSIONS = """
+    SELECT DISTINCT role.id AS role_id, trim(part.value) AS name
+    FROM role, regexp_split_to_table(role.access, ',') AS part(value)
+    WHERE trim(part.value) <> '' {condition}
+"""
+
+# role.access остается полем API, а таблицы прав поддерживаются
+# триггером, поэтому их видят и записи в role мимо приложения.
+# В Postgres 12 нет gen_random_uuid без pgcrypto, uuid строится из md5
+SYNC_FUNCTION = """
+CREATE OR REPLACE FUNCTION sync_role_permissions() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM role_permission WHERE role_id = NEW.id;
+
+    INSERT INTO permission (id, created_at, name)
+    SELECT md5(random()::text || clock_timestamp()::text || rp.name)::uuid,
+        now() AT TIME ZONE 'utc', rp.name
+    FROM ({role_permissions}) rp
+    ON CONFLICT (name) DO NOTHING;
+
+    INSERT INTO role_permission (role_id, permission_id)
+    SELECT rp.role_id, permission.id
+    FROM ({role_permissions}) rp
+    JOIN permission ON permission.name = rp.name;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+""".format(
+    role_permissions=ROLE_PERMISSIONS.format(condition="AND role.id = NEW.id")
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "permission",
+        sa.Column("id", sa.UUID, primary_key=True),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("name", sa.String(255), unique=True, nullable=False),
+    )
+    op.create_table(
+        "role_permission",
+        sa.Column(
+            "role_id",
+            sa.UUID,
+            sa.ForeignKey("role.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column(
+            "permission_id",
+            sa.UUID,
+            sa.ForeignKey("permission.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+    )
+    # первичный ключ начинается с role_id, для поиска ролей
+    # по праву нужен отдельный индекс
+    op.create_index(
+        "ix_role_permission_permission_id",
+        "role_permission",
+        ["permission_id"],
+    )
+
+    op.execute(SYNC_FUNCTION)
+    op.execute(
+        "CREATE TRIGGER role_sync_permissions "
+        "AFTER INSERT OR UPDATE OF access ON role "
+        "FOR EACH ROW EXECUTE FUNCTION sync_role_permissions()"
+    )
+
+    # перенос прав существующих ролей
+    backfill = ROLE_PERMISSIONS.format(condition="")
+    op.execute(
+        "INSERT INTO permission (id, created_at, name) "
+        "SELECT md5(rp.name)::uuid, now() AT TIME ZONE 'utc', rp.name "
+        "FROM (SELECT DISTINCT name FROM ({0}) all_rp) rp".format(backfill)
+    )
+    op.execute(
+        "INSERT INTO role_permission (role_id, permission_id) "
+        "SELECT rp.role_id, permission.id FROM ({0}) rp "
+        "JOIN permission ON permission.name = rp.name".format(backfill)
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS role_sync_permissions ON role")
+    op.execute("DROP FUNCTION IF EXISTS sync_role_permissions()")
+    op.drop_index("ix_role_permission_permission_id")
+    op.drop_table("role_permission")
+    op.drop_table("permission")
@@ -0,0 +1,129 @@
+"""add user_effective_permissions read model
+
+Revision ID: e5c81a2d9f47
+Revises: d2b7e4f18a63
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e5c81a2d9f47"
+down_revision = "d2b7e4f18a63"
+branch_labels = None
+depends_on = None
+
+# Пересчитывает строки пользователей целиком: права всех их ролей
+# собираются одним запросом, поэтому повторный вызов безопасен
+REFRESH_FUNCTION = """
+CREATE OR REPLACE FUNCTION refresh_user_effective_permissions(user_ids uuid[])
+RETURNS void AS $$
+    INSERT INTO user_effective_permissions (user_id, permissions)
+    SELECT target.id, COALESCE(
+        (
+            SELECT array_agg(DISTINCT permission.name ORDER BY permission.name)
+            FROM user_role
+            JOIN role_permission
+                ON role_permission.role_id = user_role.role_id
+            JOIN permission ON permission.id = role_permission.permission_id
+            WHERE user_role.user_id = target.id
+        ),
+        '{}'
+    )
+    FROM unnest(user_ids) AS target(id)
+    WHERE EXISTS (SELECT 1 FROM "user" WHERE "user".id = target.id)
+    ON CONFLICT (user_id) DO UPDATE SET permissions = EXCLUDED.permissions;
+$$ LANGUAGE sql;
+"""
+
+# Триггеры уровня оператора с таблицами переходов: пересчет идет один раз
+# на оператор, а не на каждую строку. Таблицы переходов нельзя указать
+# у триггера на несколько событий, поэтому функций и триггеров по два
+TRIGGER_FUNCTIONS = {
+    "user_role_changed": """
+        PERFORM refresh_user_effective_permissions(
+            ARRAY(SELECT DISTINCT user_id FROM changed)
+        );
+    """,
+    "role_permission_changed": """
+        PERFORM refresh_user_effective_permissions(
+            ARRAY(
+                SELECT DISTINCT user_role.user_id FROM user_role
+                WHERE user_role.role_id IN (SELECT role_id FROM changed)
+            )
+        );
+    """,
+}
+
+TRIGGERS = [
+    # name, table, event, transition table, function
+    ("user_role_inserted", "user_role", "INSERT", "NEW", "user_role_changed"),
+    ("user_role_deleted", "user_role", "DELETE", "OLD", "user_role_changed"),
+    (
+        "role_permission_inserted",
+        "role_permission",
+        "INSERT",
+        "NEW",
+        "role_permission_changed",
+    ),
+    (
+        "role_permission_deleted",
+        "role_permission",
+        "DELETE",
+        "OLD",
+        "role_permission_changed",
+    ),
+]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_effective_permissions",
+        sa.Column(
+            "user_id",
+            sa.UUID,
+            sa.ForeignKey("user.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column(
+            "permissions",
+            sa.ARRAY(sa.String(255)),
+            nullable=False,
+            server_default=sa.text("'{}'"),
+        ),
+    )
+    op.execute(REFRESH_FUNCTION)
+    for name, body in TRIGGER_FUNCTIONS.items():
+        op.execute(
+            "CREATE OR REPLACE FUNCTION {0}() RETURNS trigger AS $$ "
+            "BEGIN {1} RETURN NULL; END; $$ LANGUAGE plpgsql".format(
+                name, body
+            )
+        )
+    for name, table, event, transition, function in TRIGGERS:
+        op.execute(
+            "CREATE TRIGGER {0} AFTER {1} ON {2} "
+            "REFERENCING {3} TABLE AS changed "
+            "FOR EACH STATEMENT EXECUTE FUNCTION {4}()".format(
+                name, event, table, transition, function
+            )
+        )
+
+    # заполнение для пользователей, у которых уже есть роли
+    op.execute(
+        "SELECT refresh_user_effective_permissions("
+        "ARRAY(SELECT DISTINCT user_id FROM user_role))"
+    )
+
+
+def downgrade() -> None:
+    for name, table, _, _, _ in TRIGGERS:
+        op.execute("DROP TRIGGER IF EXISTS {0} ON {1}".format(name, table))
+    for name in TRIGGER_FUNCTIONS:
+        op.execute("DROP FUNCTION IF EXISTS {0}()".format(name))
+    op.execute(
+        "DROP FUNCTION IF EXISTS refresh_user_effective_permissions(uuid[])"
+    )
+    op.drop_table("user_effective_permissions")
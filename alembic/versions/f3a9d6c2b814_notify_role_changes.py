@@ -0,0 +1,42 @@
+"""notify listeners about role changes
+
+Revision ID: f3a9d6c2b814
+Revises: e5c81a2d9f47
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "f3a9d6c2b814"
+down_revision = "e5c81a2d9f47"
+branch_labels = None
+depends_on = None
+
+# Канал совпадает с ROLE_CHANGED_CHANNEL в repositories/role_catalog.py.
+# Уведомление отправляется при фиксации транзакции, одинаковые
+# уведомления одной транзакции Postgres объединяет
+NOTIFY_FUNCTION = """
+CREATE OR REPLACE FUNCTION notify_role_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('role_changed', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade() -> None:
+    op.execute(NOTIFY_FUNCTION)
+    # на оператор, а не на строку: каталог перечитывается целиком
+    op.execute(
+        "CREATE TRIGGER role_notify_changed "
+        "AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON role "
+        "FOR EACH STATEMENT EXECUTE FUNCTION notify_role_changed()"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS role_notify_changed ON role")
+    op.execute("DROP FUNCTION IF EXISTS notify_role_changed()")
@@ -1,5 +1,5 @@
 from typing import Optional
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from schemas.user import UserCreate, UserHistoryShow
 from schemas.login import Login, Change
 from services.auth_service import AuthService, get_auth_service
@@ -47,13 +47,37 @@ async def change(
 
 @router.post("/history")
 async def history(
+    response: Response,
     n_items_per_page: Optional[int] = None,
     page_number: Optional[int] = None,
     descending: Optional[bool] = None,
+    cursor: Optional[str] = None,
     auth_service: AuthService = Depends(get_auth_service),
 ) -> list[UserHistoryShow]:
-    return await auth_service.history(
+    """
+    Login and logout history.
+
+    With `page_number` the page is found by offset. Without it, when
+    `n_items_per_page` or `cursor` is passed, keyset pagination is used:
+    cursors of the neighbour pages are returned in `X-Next-Cursor` and
+    `X-Prev-Cursor` headers and passed back as `cursor`.
+    """
+    if page_number is not None or (
+        n_items_per_page is None and cursor is None
+    ):
+        return await auth_service.history(
+            n_items_per_page=n_items_per_page,
+            page_number=page_number,
+            descending=descending,
+        )
+
+    page = await auth_service.history_page(
         n_items_per_page=n_items_per_page,
-        page_number=page_number,
+        cursor=cursor,
         descending=descending,
     )
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    if page.prev_cursor:
+        response.headers["X-Prev-Cursor"] = page.prev_cursor
+    return page.items
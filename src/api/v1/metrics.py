@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends
+
+from services.auth_service import AuthService, get_auth_service
+from utils.metrics import metrics
+from utils.responses import access_responses
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/", responses={**access_responses})
+async def get_metrics(
+    auth_service: AuthService = Depends(get_auth_service),
+) -> dict:
+    """
+    Get metrics of the current worker.
+
+    Each gunicorn worker keeps its own counters, so the values describe
+    only the worker which handled the request.
+
+    Returns:
+    - A dict with `counters`, `gauges` and `histograms`.
+
+    Raises:
+    - `HTTPException(401)`: If unauthorized action.
+    - `HTTPException(403)`: If don't have permission.
+    """
+    await auth_service.check_access(["metrics_view"])
+    return metrics.snapshot()
@@ -1,21 +1,44 @@
 import asyncio
+import csv
+import json
+import os
+import time
+from uuid import uuid4
 
 import typer
+from redis.asyncio import Redis
 
-from passlib.context import CryptContext
 from typing_extensions import Annotated
 from typing import Optional
 
+from core.config import (
+    PASSWORD_SETTINGS_FILE,
+    password_settings,
+    postgres_settings,
+    redis_setttings,
+)
 from core.get_logger import get_logger
+from models.refresh_token import RefreshToken
+from models.user_history import UserHistory
+from repositories.permission_cache import PermissionCache
+from repositories.redis_cache import CacheRedis
+from repositories.refresh_token_db import RefreshTokenDB
+from repositories.role_catalog import role_catalog
+from repositories.user_history_db import UserHistoryDB
 from repositories.user_db import UserDB
 from repositories.role_db import RoleDB
+from services.hashing_engine import HashingEngine
 from services.user_service import UserService
 from services.password_service import PasslibPasswordService
 from services.role_service import RoleService
 from schemas.user import UserCreate, UserRoleAction
 from schemas.role import RoleModel
 from utils.commands import pg_engine
+from utils import explain as explain_utils
+from utils import partitions
 from utils.constants import AdminRole
+from utils.hashing import construct_crypt_context
+from utils.hash_calibration import calibrate_scheme, write_settings_file
 
 cli = typer.Typer()
 
@@ -35,6 +58,10 @@ def add_superuser(
     ] = None,
 ) -> None:
     loop = asyncio.get_event_loop()
+    # назначение роли сбрасывает кеш прав пользователя в Redis
+    redis_client = Redis(
+        host=redis_setttings.REDIS_HOST, port=redis_setttings.REDIS_PORT
+    )
 
     async def add_superuser_async():
         """Create new user with superadmin role
@@ -51,10 +78,22 @@ def add_superuser(
         # инициализация репозиториев и сервисов
         user_repository = UserDB(pg_engine)
         role_repository = RoleDB(pg_engine)
-        pass_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        pass_context = construct_crypt_context(password_settings)
         pass_service = PasslibPasswordService(pass_context)
 
-        role_service = RoleService(role_repository, user_repository)
+        permission_cache = PermissionCache(
+            redis_client,
+            ttl=redis_setttings.REDIS_PERMISSIONS_TTL,
+            beta=redis_setttings.REDIS_PERMISSIONS_XFETCH_BETA,
+        )
+        # каталог без слушателя не готов, роли читаются из базы
+        role_service = RoleService(
+            role_repository,
+            user_repository,
+            CacheRedis(redis_client),
+            permission_cache,
+            role_catalog,
+        )
         user_service = UserService(user_repository, pass_service)
 
         # заполнение схем pydantic user и role
@@ -100,7 +139,321 @@ def add_superuser(
 
         logger.debug("Failed to create superuser %s.", new_user.login)
 
-    loop.run_until_complete(add_superuser_async())
+    try:
+        loop.run_until_complete(add_superuser_async())
+    finally:
+        loop.run_until_complete(redis_client.close())
+
+
+@cli.command()
+def import_users(
+    input: Annotated[
+        str,
+        typer.Option(
+            help="csv file with login,password,first_name,last_name"
+        ),
+    ],
+    role: Annotated[
+        Optional[str], typer.Option(help="role name assigned to new users")
+    ] = None,
+    batch_size: Annotated[
+        Optional[int],
+        typer.Option(help="rows hashed and inserted in one transaction"),
+    ] = None,
+) -> None:
+    """Create users from csv with bulk inserts, existing logins
+    are skipped and keep their passwords and roles
+    """
+    loop = asyncio.get_event_loop()
+
+    async def import_users_async():
+        logger = get_logger()
+
+        user_repository = UserDB(pg_engine)
+        role_id = None
+        if role is not None:
+            roles = await RoleDB(pg_engine).find({"name": role})
+            if not roles:
+                logger.error("[CLI][import_users] - role %s not found", role)
+                return
+            role_id = roles[0].id
+
+        # хешируем на всех ядрах, импорт упирается в bcrypt
+        engine = HashingEngine.create(
+            kind="process", size=os.cpu_count() or 1
+        )
+        try:
+            pass_context = construct_crypt_context(password_settings)
+            pass_service = PasslibPasswordService(pass_context, engine)
+            user_service = UserService(user_repository, pass_service)
+            # строки читаются пачками, файл целиком в память не грузится
+            with open(input, newline="") as csv_file:
+                rows = csv.DictReader(csv_file)
+                added = await user_service.add_many(
+                    (UserCreate(**row) for row in rows), batch_size, role_id
+                )
+        finally:
+            engine.shutdown()
+
+        # сколько логинов пропущено, пишет add_many
+        logger.info("[CLI][import_users] - %s users added", len(added))
+
+    loop.run_until_complete(import_users_async())
+
+
+@cli.command()
+def calibrate_hash(
+    target_ms: Annotated[
+        float, typer.Option(help="target verify time of one login, ms")
+    ] = 50,
+    workers: Annotated[
+        int, typer.Option(help="gunicorn workers on the host")
+    ] = 4,
+    target_rps: Annotated[
+        Optional[float],
+        typer.Option(help="min logins per second of one worker"),
+    ] = None,
+    output: Annotated[
+        str, typer.Option(help="settings file picked up on startup")
+    ] = PASSWORD_SETTINGS_FILE,
+) -> None:
+    """Benchmark configured hash schemes on this host and write
+    the most expensive costs which still fit the targets
+    """
+    logger = get_logger()
+    cores = os.cpu_count() or 1
+    target_seconds = target_ms / 1000
+
+    values = {
+        "PASSWORD_SCHEMES": json.dumps(password_settings.PASSWORD_SCHEMES)
+    }
+    comments = [
+        "generated by `python -m cli calibrate-hash`",
+        "host cores: {0}, gunicorn workers: {1}, target: {2} ms".format(
+            cores, workers, target_ms
+        ),
+    ]
+    for scheme in password_settings.PASSWORD_SCHEMES:
+        chosen, results = calibrate_scheme(
+            password_settings,
+            scheme,
+            target_seconds=target_seconds,
+            workers=workers,
+            target_logins_per_worker=target_rps,
+        )
+        for result in results:
+            logger.info(
+                "[CLI][calibrate_hash] - %s %s=%s: verify %.1f ms, "
+                "%.1f logins/s per worker",
+                scheme,
+                result.field,
+                result.cost,
+                result.verify_seconds * 1000,
+                result.host_verifies_per_second / workers,
+            )
+        if chosen is None:
+            logger.warning(
+                "[CLI][calibrate_hash] - %s misses targets even with "
+                "the cheapest cost, keep current settings",
+                scheme,
+            )
+            continue
+        values[chosen.field] = chosen.cost
+        comments.append(
+            "{0}: verify {1:.1f} ms, {2:.1f} logins/s per worker".format(
+                scheme,
+                chosen.verify_seconds * 1000,
+                chosen.host_verifies_per_second / workers,
+            )
+        )
+
+    comments.append(
+        "recommended HASH_POOL_SIZE={}".format(max(cores // workers, 1))
+    )
+    write_settings_file(output, values, comments)
+    logger.info("[CLI][calibrate_hash] - settings written to %s", output)
+
+    # переменные окружения главнее файла настроек
+    environment = {key.upper() for key in os.environ}
+    overridden = [key for key in values if key.upper() in environment]
+    if overridden:
+        logger.warning(
+            "[CLI][calibrate_hash] - %s set in the environment and "
+            "override %s, remove them from .env",
+            ", ".join(overridden),
+            output,
+        )
+
+
+@cli.command()
+def benchmark_insert(
+    rows: Annotated[
+        int, typer.Option(help="rows inserted by each path")
+    ] = 2000,
+    batch_size: Annotated[
+        Optional[int], typer.Option(help="rows per bulk statement")
+    ] = None,
+) -> None:
+    """Compare rows/sec of per-row insert and insert_many
+    on the refresh_token table, inserted rows are deleted afterwards
+    """
+    loop = asyncio.get_event_loop()
+
+    async def benchmark_insert_async():
+        logger = get_logger()
+        repository = RefreshTokenDB(pg_engine)
+
+        def make_entities() -> list[RefreshToken]:
+            return [
+                RefreshToken(token="benchmark", user_id=uuid4())
+                for _ in range(rows)
+            ]
+
+        inserted = []
+        entities = make_entities()
+        started_at = time.perf_counter()
+        for entity in entities:
+            inserted.extend(await repository.insert(entity))
+        per_row_seconds = time.perf_counter() - started_at
+
+        entities = make_entities()
+        started_at = time.perf_counter()
+        inserted.extend(await repository.insert_many(entities, batch_size))
+        bulk_seconds = time.perf_counter() - started_at
+
+        await repository.delete_many([entity.id for entity in inserted])
+
+        logger.info(
+            "[CLI][benchmark_insert] - per-row insert: %.0f rows/s",
+            rows / per_row_seconds,
+        )
+        logger.info(
+            "[CLI][benchmark_insert] - insert_many: %.0f rows/s (x%.1f)",
+            rows / bulk_seconds,
+            per_row_seconds / bulk_seconds,
+        )
+
+    loop.run_until_complete(benchmark_insert_async())
+
+
+@cli.command()
+def export_history(
+    output: Annotated[str, typer.Option(help="path of the csv file")],
+    fetch_size: Annotated[
+        Optional[int], typer.Option(help="rows fetched per round trip")
+    ] = None,
+) -> None:
+    """Export the whole user_history table to csv
+    through a server-side cursor
+    """
+    loop = asyncio.get_event_loop()
+
+    async def export_history_async():
+        logger = get_logger()
+        repository = UserHistoryDB(pg_engine)
+        columns = ["id", "user_id", "event", "created_at"]
+
+        exported = 0
+        with open(output, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(columns)
+            async for row in repository.stream(
+                columns=columns, fetch_size=fetch_size
+            ):
+                writer.writerow(row)
+                exported += 1
+
+        logger.info(
+            "[CLI][export_history] - %s rows exported to %s", exported, output
+        )
+
+    loop.run_until_complete(export_history_async())
+
+
+@cli.command()
+def check_indexes(
+    seed_rows: Annotated[
+        int,
+        typer.Option(
+            help="user_history rows generated before the check, "
+            "rolled back afterwards"
+        ),
+    ] = 0,
+) -> None:
+    """Check with EXPLAIN that hot queries use indexes.
+    On small tables the planner prefers Seq Scan anyway,
+    so run it on production-like data or with --seed-rows 10000000
+    """
+    loop = asyncio.get_event_loop()
+
+    async def check_indexes_async() -> bool:
+        logger = get_logger()
+        failed = False
+        async with pg_engine.connect() as conn:
+            transaction = await conn.begin()
+            try:
+                if seed_rows:
+                    logger.info(
+                        "[CLI][check_indexes] - seeding %s rows", seed_rows
+                    )
+                    await explain_utils.seed(conn, seed_rows)
+
+                for query in explain_utils.HOT_QUERIES:
+                    plan = await explain_utils.explain(conn, query)
+                    indexes = explain_utils.used_indexes(plan)
+                    if explain_utils.seq_scanned(plan, query.table):
+                        failed = True
+                        logger.error(
+                            "[CLI][check_indexes] - %s: Seq Scan on %s",
+                            query.name,
+                            query.table,
+                        )
+                    else:
+                        logger.info(
+                            "[CLI][check_indexes] - %s: ok, indexes %s",
+                            query.name,
+                            ", ".join(indexes) or "-",
+                        )
+            finally:
+                # сгенерированные строки не должны остаться в базе
+                await transaction.rollback()
+        return not failed
+
+    if not loop.run_until_complete(check_indexes_async()):
+        raise typer.Exit(code=1)
+
+
+@cli.command()
+def maintain_partitions(
+    retention_months: Annotated[
+        Optional[int],
+        typer.Option(
+            help="full months of user_history to keep, "
+            "POSTGRES_HISTORY_RETENTION_MONTHS if not set"
+        ),
+    ] = None,
+) -> None:
+    """Create future monthly partitions of user_history
+    and drop the ones older than the retention period
+    """
+    loop = asyncio.get_event_loop()
+
+    async def maintain_partitions_async():
+        settings = postgres_settings
+        if retention_months is not None:
+            settings = postgres_settings.copy(
+                update={"POSTGRES_HISTORY_RETENTION_MONTHS": retention_months}
+            )
+        created, dropped = await partitions.maintain_partitions(
+            pg_engine, UserHistory.__tablename__, settings
+        )
+        get_logger().info(
+            "[CLI][maintain_partitions] - created: %s, dropped: %s",
+            ", ".join(created) or "-",
+            ", ".join(dropped) or "-",
+        )
+
+    loop.run_until_complete(maintain_partitions_async())
 
 
 if __name__ == "__main__":
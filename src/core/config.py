@@ -1,10 +1,17 @@
 import os
 from logging import config as logging_config
+from typing import Optional
 
 from pydantic import BaseSettings
 
 from core.logger import LOGGING
 
+# Файл пишет команда cli calibrate-hash. В контейнере он лежит
+# в смонтированном каталоге, чтобы пережить пересоздание контейнера
+PASSWORD_SETTINGS_FILE = os.environ.get(
+    "PASSWORD_SETTINGS_FILE", "password.env"
+)
+
 
 class ProjectSettings(BaseSettings):
     # Название проекта. Используется в Swagger-документации
@@ -15,6 +22,18 @@ class ProjectSettings(BaseSettings):
 
     BACKOFF_MAX_TIME: int = 60
 
+    # Пул для хеширования паролей вне event loop: "thread" или "process".
+    # Размер пула задается на один gunicorn-воркер
+    HASH_POOL_KIND: str = "thread"
+    HASH_POOL_SIZE: int = 2
+
+    # Admission control для хеширования (login, signup, change).
+    # Когда очередь заполнена, запрос сразу получает 503 с Retry-After
+    HASH_MAX_CONCURRENCY: int = 2
+    HASH_MAX_QUEUE: int = 16
+    HASH_QUEUE_TIMEOUT: float = 1.0
+    HASH_RETRY_AFTER: int = 1
+
     class Config:
         env_file = ".env"
 
@@ -23,6 +42,39 @@ class RedisSettings(BaseSettings):
     REDIS_HOST: str = "redis"
     REDIS_PORT: int = 6379
     CACHE_EXPIRE_IN_SECONDS: int = 3600
+    # Кеш списка отозванных токенов в памяти воркера. Отзывы приходят
+    # через pub/sub сразу, а TTL ограничивает устаревание ответа
+    # "не отозван", если сообщение потерялось
+    REDIS_NEAR_CACHE_SIZE: int = 10000
+    REDIS_NEAR_CACHE_TTL: float = 5.0
+    REDIS_DENIED_TOKENS_CHANNEL: str = "auth:denied_tokens"
+    # Отозванные jti со временем истечения в sorted set, из него
+    # воркеры пересобирают Bloom-фильтр
+    REDIS_DENIED_TOKENS_KEY: str = "auth:denied_tokens:expiry"
+    # Bloom-фильтр отозванных токенов: отдельный фильтр на каждое окно
+    # истечения, емкость и доля ложных срабатываний одного окна
+    REDIS_BLOOM_WINDOW: float = 300
+    REDIS_BLOOM_CAPACITY: int = 20000
+    REDIS_BLOOM_ERROR_RATE: float = 0.001
+    REDIS_BLOOM_REBUILD_INTERVAL: float = 3600
+    # Полуоткрытое соединение подписки не дает ошибок, сообщения просто
+    # перестают приходить. Подписчик шлет PING каждые
+    # REDIS_PUBSUB_PING_INTERVAL секунд, и если за REDIS_PUBSUB_STALE_AFTER
+    # секунд не пришло ни сообщения, ни ответа, фильтру больше не верят
+    # и подписка пересоздается
+    REDIS_PUBSUB_PING_INTERVAL: float = 5.0
+    REDIS_PUBSUB_STALE_AFTER: float = 15.0
+    # PING перед командой на соединении, простоявшем дольше интервала
+    REDIS_HEALTH_CHECK_INTERVAL: float = 30.0
+    # Эпоха отзыва пользователя: токены, выпущенные раньше нее,
+    # недействительны. Хранится, пока живет самый долгий refresh-токен
+    REDIS_REVOKED_BEFORE_PREFIX: str = "auth:revoked_before:"
+    REDIS_REVOKED_BEFORE_TTL: int = 30 * 24 * 60 * 60
+    # Кеш прав пользователей: время жизни записи и коэффициент
+    # ранней перезагрузки XFetch (0 - только по истечении)
+    REDIS_PERMISSIONS_PREFIX: str = "auth:permissions:"
+    REDIS_PERMISSIONS_TTL: int = 3600
+    REDIS_PERMISSIONS_XFETCH_BETA: float = 1.0
 
     class Config:
         env_file = ".env"
@@ -36,10 +88,98 @@ class PostgresSettings(BaseSettings):
     POSTGRES_USER: str = "user"
     POSTGRES_PASSWORD: str = "pass"
 
+    # Логирование каждого SQL-запроса, включать только в dev
+    POSTGRES_ECHO: bool = False
+    # Запросы дольше порога попадают в лог с типами параметров,
+    # None отключает лог медленных запросов
+    POSTGRES_SLOW_QUERY_MS: Optional[float] = 200
+    # EXPLAIN ANALYZE медленных SELECT: запрос выполняется повторно,
+    # поэтому только для dev
+    POSTGRES_EXPLAIN_SLOW_QUERIES: bool = False
+
+    # Пул соединений одного gunicorn-воркера
+    POSTGRES_POOL_SIZE: int = 5
+    POSTGRES_MAX_OVERFLOW: int = 10
+    POSTGRES_POOL_TIMEOUT: float = 30
+    POSTGRES_POOL_RECYCLE: int = 1800
+    POSTGRES_POOL_PRE_PING: bool = True
+    # Соединения, удерживаемые дольше порога, попадают в лог как возможная
+    # утечка, None отключает проверку. Стек взявшего соединение кода
+    # запоминается только с POSTGRES_POOL_CAPTURE_STACKS
+    POSTGRES_POOL_HELD_WARNING_SECONDS: Optional[float] = 10
+    POSTGRES_POOL_CAPTURE_STACKS: bool = False
+    POSTGRES_POOL_CHECK_INTERVAL: float = 5
+    # Кеш prepared statements asyncpg на одно соединение
+    POSTGRES_STATEMENT_CACHE_SIZE: int = 100
+    # Готовых запросов find и get в кеше процесса
+    POSTGRES_FIND_CACHE_SIZE: int = 256
+
+    # Строк в одном запросе insert_many, upsert и delete_many
+    POSTGRES_BULK_BATCH_SIZE: int = 1000
+    # Строк за одно обращение к серверному курсору в stream
+    POSTGRES_STREAM_FETCH_SIZE: int = 1000
+
+    # Общий бюджет соединений к Postgres на все воркеры хоста.
+    # Если задан, размер пула каждого воркера считается из него
+    # вместо POSTGRES_POOL_SIZE и POSTGRES_MAX_OVERFLOW
+    POSTGRES_MAX_CONNECTIONS: Optional[int] = None
+    # Соединения, оставляемые для миграций, cli и администрирования
+    POSTGRES_RESERVED_CONNECTIONS: int = 5
+    GUNICORN_WORKERS: int = 4
+
+    # Режим работы через PgBouncer в transaction pooling:
+    # без пула на стороне приложения и без кеша prepared statements
+    POSTGRES_PGBOUNCER: bool = False
+
+    # Реплики только для чтения в формате host или host:port, JSON-списком:
+    # POSTGRES_REPLICA_HOSTS='["replica-1", "replica-2:5433"]'.
+    # Пользователь, пароль и база те же, что у основного сервера
+    POSTGRES_REPLICA_HOSTS: list[str] = []
+    # Сколько секунд после записи чтения запроса идут на основной сервер,
+    # чтобы не получить с реплики данные до собственной записи
+    POSTGRES_READ_YOUR_WRITES_SECONDS: float = 2.0
+
+    # Месячные партиции user_history: сколько будущих месяцев создавать
+    # заранее и сколько полных прошлых месяцев хранить (None - все)
+    POSTGRES_HISTORY_PARTITIONS_AHEAD: int = 3
+    POSTGRES_HISTORY_RETENTION_MONTHS: Optional[int] = None
+    # Период фонового обслуживания партиций в секундах
+    POSTGRES_PARTITION_MAINTENANCE_INTERVAL: int = 24 * 60 * 60
+
+    # LISTEN каталога ролей требует сессионного соединения: с PgBouncer
+    # в transaction pooling здесь указывается сам Postgres
+    POSTGRES_LISTEN_HOST: Optional[str] = None
+    # Проверка соединения LISTEN, если уведомлений давно не было
+    POSTGRES_LISTEN_CHECK_INTERVAL: float = 30
+
     class Config:
         env_file = ".env"
 
 
+class PasswordSettings(BaseSettings):
+    # Схемы хеширования паролей. Первая используется для новых хешей,
+    # хеши остальных схем считаются устаревшими и пересчитываются
+    # при успешном логине
+    PASSWORD_SCHEMES: list[str] = ["bcrypt"]
+
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+
+    PASSWORD_ARGON2_TIME_COST: int = 3
+    # Память в KiB
+    PASSWORD_ARGON2_MEMORY_COST: int = 65536
+    PASSWORD_ARGON2_PARALLELISM: int = 1
+
+    # log2 от параметра N алгоритма scrypt
+    PASSWORD_SCRYPT_ROUNDS: int = 16
+    PASSWORD_SCRYPT_BLOCK_SIZE: int = 8
+    PASSWORD_SCRYPT_PARALLELISM: int = 1
+
+    class Config:
+        # значения из файла calibrate-hash перекрывают .env, но
+        # переменные окружения перекрывают оба файла
+        env_file = (".env", PASSWORD_SETTINGS_FILE)
+
+
 class AuthjwtSettings(BaseSettings):
     authjwt_secret_key: str = "secret_key"
     authjwt_access_token_expires: int = 900
@@ -54,6 +194,7 @@ class AuthjwtSettings(BaseSettings):
 project_settings = ProjectSettings()
 redis_setttings = RedisSettings()
 postgres_settings = PostgresSettings()
+password_settings = PasswordSettings()
 auth_settings = AuthjwtSettings()
 
 # Применяем настройки логирования
@@ -9,6 +9,7 @@ from utils.exceptions import (
     AlreadyExistError,
     UnauthorisedException,
     PermissionDeniedException,
+    ServiceOverloadedError,
 )
 
 
@@ -64,3 +65,11 @@ async def denied_exception(request: Request, exc: PermissionDeniedException):
         status_code=403,
         content={"detail": exc.message},
     )
+
+
+async def overloaded_exception(request: Request, exc: ServiceOverloadedError):
+    return ORJSONResponse(
+        status_code=503,
+        content={"detail": exc.message},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
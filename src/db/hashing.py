@@ -0,0 +1,9 @@
+from typing import Optional
+
+from services.hashing_engine import HashingEngine
+
+hashing_engine: Optional[HashingEngine] = None
+
+
+async def get_hashing_engine() -> HashingEngine:
+    return hashing_engine
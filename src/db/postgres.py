@@ -1,9 +1,27 @@
-from typing import Optional
+from itertools import cycle
+from typing import Iterator, Optional
 
 from sqlalchemy.ext.asyncio import AsyncEngine
 
 postgres: Optional[AsyncEngine] = None
+replicas: list[AsyncEngine] = []
+_replicas_cycle: Optional[Iterator[AsyncEngine]] = None
 
 
 def get_postgres() -> AsyncEngine:
     return postgres
+
+
+def get_postgres_replica() -> Optional[AsyncEngine]:
+    """Read-only engine, replicas are taken in turn
+
+    Returns:
+        AsyncEngine | None: replica engine or None if there are
+            no replicas configured
+    """
+    global _replicas_cycle
+    if not replicas:
+        return None
+    if _replicas_cycle is None:
+        _replicas_cycle = cycle(replicas)
+    return next(_replicas_cycle)
@@ -2,4 +2,4 @@
 cd ..
 alembic upgrade head
 cd app
-gunicorn main:app -b unix:/app-socket/async.sock -w 4 -k uvicorn.workers.UvicornWorker
\ No newline at end of file
+gunicorn main:app -b unix:/app-socket/async.sock -w ${GUNICORN_WORKERS:-4} -k uvicorn.workers.UvicornWorker
\ No newline at end of file
@@ -1,18 +1,17 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 import uvicorn
 from async_fastapi_jwt_auth import AuthJWT
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
-from passlib.context import CryptContext
 from redis.asyncio import Redis
 from redis.exceptions import RedisError
 
-from sqlalchemy.ext.asyncio import create_async_engine
-
-from api.v1 import auth, role, user
+from api.v1 import auth, metrics, role, user
 from core.config import (
     auth_settings,
+    password_settings,
     postgres_settings,
     project_settings,
     redis_setttings,
@@ -25,9 +24,29 @@ from core.exceptions import (
     already_exist_exception,
     unauthorized_exception,
     denied_exception,
+    overloaded_exception,
+)
+from db import auth_jwt, hashing, postgres, pwd_context, redis
+from models.user_history import UserHistory
+from repositories.near_cache import (
+    NearCache,
+    denied_tokens,
+    denied_tokens_subscription,
+    listen_denied_tokens,
+    revocation_epochs,
+    revoked_tokens,
 )
-from db import auth_jwt, postgres, pwd_context, redis
-from utils.db import construct_db_url
+from repositories.redis_cache import CacheRedis
+from repositories.role_catalog import listen_role_changes, role_catalog
+from services.hashing_engine import HashingEngine
+from utils.db import (
+    create_engine_from_settings,
+    create_replica_engines,
+)
+from utils.hashing import construct_crypt_context
+from utils.limiter import ConcurrencyLimiter
+from utils.partitions import run_partition_maintenance
+from utils.pool_metrics import pool_monitor, run_pool_monitor
 from utils.exceptions import (
     UserRoleActionError,
     RoleNotAssigned,
@@ -35,6 +54,7 @@ from utils.exceptions import (
     AlreadyExistError,
     PermissionDeniedException,
     UnauthorisedException,
+    ServiceOverloadedError,
 )
 
 
@@ -44,30 +64,71 @@ async def lifespan(app: FastAPI):
     auth_jwt.auth_jwt = AuthJWT()
 
     # Crypto Context
-    pwd_context.pwd_context = CryptContext(
-        schemes=["bcrypt"], deprecated="auto"
+    pwd_context.pwd_context = construct_crypt_context(password_settings)
+    hashing.hashing_engine = HashingEngine.create(
+        kind=project_settings.HASH_POOL_KIND,
+        size=project_settings.HASH_POOL_SIZE,
+        limiter=ConcurrencyLimiter(
+            name="hashing",
+            max_concurrency=project_settings.HASH_MAX_CONCURRENCY,
+            max_queue=project_settings.HASH_MAX_QUEUE,
+            queue_timeout=project_settings.HASH_QUEUE_TIMEOUT,
+            retry_after=project_settings.HASH_RETRY_AFTER,
+        ),
     )
 
     # Redis
     redis.redis = Redis(
-        host=redis_setttings.REDIS_HOST, port=redis_setttings.REDIS_PORT
+        host=redis_setttings.REDIS_HOST,
+        port=redis_setttings.REDIS_PORT,
+        health_check_interval=redis_setttings.REDIS_HEALTH_CHECK_INTERVAL,
+        socket_keepalive=True,
+    )
+    denied_tokens_listener = asyncio.create_task(
+        listen_denied_tokens(
+            redis.redis,
+            NearCache(
+                CacheRedis(redis.redis),
+                denied_tokens,
+                revoked_tokens,
+                revocation_epochs,
+                denied_tokens_subscription,
+            ),
+            redis_setttings.REDIS_DENIED_TOKENS_CHANNEL,
+            redis_setttings.REDIS_BLOOM_REBUILD_INTERVAL,
+            redis_setttings.REDIS_PUBSUB_PING_INTERVAL,
+        )
     )
 
     # Postgres
-    # Construct database URL
-    db_url = construct_db_url(
-        user=postgres_settings.POSTGRES_USER,
-        password=postgres_settings.POSTGRES_PASSWORD,
-        host=postgres_settings.POSTGRES_HOST,
-        port=postgres_settings.POSTGRES_PORT,
-        database=postgres_settings.POSTGRES_DATABASE,
+    postgres.postgres = create_engine_from_settings(postgres_settings)
+    postgres.replicas = create_replica_engines(postgres_settings)
+    pool_check = asyncio.create_task(
+        run_pool_monitor(
+            pool_monitor, postgres_settings.POSTGRES_POOL_CHECK_INTERVAL
+        )
+    )
+    role_changes_listener = asyncio.create_task(
+        listen_role_changes(role_catalog, postgres.postgres, postgres_settings)
+    )
+    partition_maintenance = asyncio.create_task(
+        run_partition_maintenance(
+            postgres.postgres, UserHistory.__tablename__, postgres_settings
+        )
     )
-    postgres.postgres = create_async_engine(db_url, echo=True, future=True)
 
     yield
 
+    partition_maintenance.cancel()
+    role_changes_listener.cancel()
+    pool_check.cancel()
+    denied_tokens_listener.cancel()
+
     await redis.redis.close()
     await postgres.postgres.dispose()
+    for replica in postgres.replicas:
+        await replica.dispose()
+    hashing.hashing_engine.shutdown()
 
 
 app = FastAPI(
@@ -87,6 +148,7 @@ app = FastAPI(
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["Auth"])
 app.include_router(role.router, prefix="/api/v1/role")
 app.include_router(user.router, prefix="/api/v1/user")
+app.include_router(metrics.router, prefix="/api/v1/metrics")
 
 
 @AuthJWT.load_config
@@ -101,6 +163,7 @@ app.add_exception_handler(NotFoundError, not_found_exception)
 app.add_exception_handler(AlreadyExistError, already_exist_exception)
 app.add_exception_handler(UnauthorisedException, unauthorized_exception)
 app.add_exception_handler(PermissionDeniedException, denied_exception)
+app.add_exception_handler(ServiceOverloadedError, overloaded_exception)
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 from .base import Base
+from .permission import Permission, UserEffectivePermissions
 from .refresh_token import RefreshToken
 from .role import Role
 from .user import User
@@ -13,7 +13,6 @@ class DatabaseBaseModel:
         UUID(as_uuid=True),
         primary_key=True,
         default=uuid.uuid4,
-        unique=True,
         nullable=False,
     )
     created_at = Column(DateTime, default=datetime.utcnow)
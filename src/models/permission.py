@@ -0,0 +1,51 @@
+from sqlalchemy import Column, ForeignKey, Index, String, Table, text
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+
+from .base import Base, DatabaseBaseModel
+
+
+# Связь ролей с правами. Заполняется триггером из role.access,
+# поэтому писать в нее напрямую не нужно
+role_permission_table = Table(
+    "role_permission",
+    Base.metadata,
+    Column(
+        "role_id", ForeignKey("role.id", ondelete="CASCADE"), primary_key=True
+    ),
+    Column(
+        "permission_id",
+        ForeignKey("permission.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    # какие роли дают право X
+    Index("ix_role_permission_permission_id", "permission_id"),
+)
+
+
+class Permission(DatabaseBaseModel, Base):
+    __tablename__ = "permission"
+
+    name = Column(String(255), unique=True, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<Permission {self.name}>"
+
+
+class UserEffectivePermissions(Base):
+    """Distinct permissions of all user roles in one row.
+    Maintained by triggers on user_role and role_permission
+    """
+
+    __tablename__ = "user_effective_permissions"
+
+    user_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("user.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    permissions = Column(
+        ARRAY(String(255)), nullable=False, server_default=text("'{}'")
+    )
+
+    def __repr__(self) -> str:
+        return f"<UserEffectivePermissions {self.user_id}>"
@@ -11,5 +11,8 @@ class RefreshToken(DatabaseBaseModel, Base):
 
     token = Column(String(1000))
     user_id = Column(
-        UUID(as_uuid=True), default=uuid.uuid4, unique=True, nullable=False
+        UUID(as_uuid=True),
+        default=uuid.uuid4,
+        nullable=False,
+        index=True,
     )
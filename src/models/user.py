@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, String, Table
+from sqlalchemy import Column, ForeignKey, Index, String, Table
 from sqlalchemy.orm import relationship
 
 from .base import Base, DatabaseBaseModel
@@ -7,8 +7,13 @@ from .base import Base, DatabaseBaseModel
 user_role_table = Table(
     "user_role",
     Base.metadata,
-    Column("user_id", ForeignKey("user.id"), primary_key=True),
-    Column("role_id", ForeignKey("role.id"), primary_key=True),
+    Column(
+        "user_id", ForeignKey("user.id", ondelete="CASCADE"), primary_key=True
+    ),
+    Column(
+        "role_id", ForeignKey("role.id", ondelete="CASCADE"), primary_key=True
+    ),
+    Index("ix_user_role_role_id", "role_id"),
 )
 
 
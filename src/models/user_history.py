@@ -1,4 +1,7 @@
-from sqlalchemy import Column, ForeignKey, String
+import uuid
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Index, String
 from sqlalchemy.dialects.postgresql import UUID
 
 from models.base import Base, DatabaseBaseModel
@@ -6,6 +9,32 @@ from models.base import Base, DatabaseBaseModel
 
 class UserHistory(DatabaseBaseModel, Base):
     __tablename__ = "user_history"
+    __table_args__ = (
+        Index(
+            "ix_user_history_user_id_created_at",
+            "user_id",
+            "created_at",
+            "id",
+        ),
+        Index(
+            "ix_user_history_created_at_brin",
+            "created_at",
+            postgresql_using="brin",
+        ),
+        # месячные партиции создает utils.partitions
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    # ключ партиционирования обязан входить в первичный ключ
+    id = Column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        default=uuid.uuid4,
+        nullable=False,
+    )
+    created_at = Column(
+        DateTime, primary_key=True, default=datetime.utcnow, nullable=False
+    )
 
     user_id = Column(UUID(as_uuid=True), ForeignKey("user.id"))
     event = Column(String(255), nullable=False)
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Optional
 
 
 class AbstractCache(ABC):
@@ -13,6 +14,18 @@ class AbstractCache(ABC):
     async def get(self, token: str) -> str:
         pass
 
+    @abstractmethod
+    async def get_denied_tokens(self) -> list[tuple[str, float]]:
+        pass
+
+    @abstractmethod
+    async def revoke_user_tokens(self, user_id: str) -> float:
+        pass
+
+    @abstractmethod
+    async def get_revoked_before(self, user_id: str) -> Optional[float]:
+        pass
+
     @abstractmethod
     async def close(self) -> str:
         pass
@@ -1,21 +1,73 @@
-from typing import Optional, Type, TypeVar
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterator, Optional, Type, TypeVar
 from uuid import UUID
 
-from sqlalchemy import and_, delete, insert, select, update
+from sqlalchemy import (
+    Row,
+    Select,
+    and_,
+    bindparam,
+    delete,
+    exists,
+    func,
+    insert,
+    select,
+    text,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncConnection
 
+from core.config import postgres_settings
 from models.base import Base
+from repositories.statement_cache import statement_cache
+from repositories.routing import mark_write, recently_written
+from repositories.unit_of_work import get_current_connection
+from utils.metrics import metrics
+from utils.pagination import NEXT, PREV, decode_cursor, encode_cursor
+from utils.sql_metrics import timed_query
 
 Table = TypeVar("Table", bound=Base)
 
+# Postgres принимает не больше 32767 параметров в одном запросе
+MAX_BIND_PARAMS = 32767
+
+# Таблицы с данными: сама таблица или все ее партиции любой
+# вложенности. У партиционированного родителя нет своих страниц
+# и reltuples, статистика есть только у листьев
+LEAF_TABLES_STATEMENT = text(
+    """
+    WITH RECURSIVE tree(oid) AS (
+        SELECT to_regclass(:table_name)::oid
+        UNION ALL
+        SELECT inhrelid FROM pg_inherits JOIN tree ON inhparent = tree.oid
+    )
+    SELECT c.oid::regclass::text, c.reltuples::bigint, c.relpages
+    FROM tree JOIN pg_class c ON c.oid = tree.oid
+    WHERE c.relkind = 'r'
+    """
+)
+
 
 class AbstractDB:
     table: Type[Table]
+    # Методы, которые читают с реплики, если она передана.
+    # Остальные методы считаются записью и идут на основной сервер
+    read_methods: frozenset[str] = frozenset(
+        {"get", "get_all", "find", "find_page", "stream", "exists", "count"}
+    )
 
-    def __init__(self, connection: AsyncConnection) -> None:
+    def __init__(
+        self,
+        connection: AsyncConnection,
+        read_connection: Optional[AsyncConnection] = None,
+    ) -> None:
         self.connection = connection
+        self.read_connection = read_connection
         self.all_columns = [m.key for m in self.table.__table__.columns]
 
+    @timed_query
     async def insert(self, entity: Table) -> Table:
         """
         Insert SQLalchemy table into SQL table
@@ -36,7 +88,10 @@ class AbstractDB:
 
         return await self._process_crud_statement(statement)
 
-    async def get(self, entity_id: UUID) -> list[Table]:
+    @timed_query
+    async def get(
+        self, entity_id: UUID, columns: Optional[list[str]] = None
+    ) -> list[Table]:
         """
         Get a SQLalchemy table by its id from SQL table
 
@@ -45,26 +100,48 @@ class AbstractDB:
         entity_id : UUID
             UUID of the row
 
+        columns : Optional[list[str]] = None
+            Columns to select, if given then light rows are returned
+            instead of sqlalchemy objects
+
         Returns
         -------
         list[Table]
             List of SQLalchemy tables according to the selected condition
         """
-        statement = select(self.table).where(self.table.id == entity_id)
-        return await self._process_crud_statement(statement)
+        statement = statement_cache.get(
+            self.table.__tablename__,
+            ("get", self._columns_key(columns)),
+            lambda: self._select(columns).where(
+                self.table.id == bindparam("entity_id")
+            ),
+        )
+        return await self._process_select(
+            statement, columns, {"entity_id": entity_id}, method="get"
+        )
 
-    async def get_all(self) -> list[Table]:
+    @timed_query
+    async def get_all(
+        self, columns: Optional[list[str]] = None
+    ) -> list[Table]:
         """
         Get all rows from the SQL table
 
+        Parameters
+        ----------
+        columns : Optional[list[str]] = None
+            Columns to select, if given then light rows are returned
+            instead of sqlalchemy objects
+
         Returns
         -------
         list[Table]
             List of SQLalchemy tables according to the selected condition
         """
-        statement = select(self.table)
-        return await self._process_crud_statement(statement)
+        statement = self._select(columns)
+        return await self._process_select(statement, columns, method="get_all")
 
+    @timed_query
     async def find(
         self,
         search_fields: dict,
@@ -72,6 +149,7 @@ class AbstractDB:
         offset: Optional[int] = None,
         order_by: Optional[str] = None,
         descending: Optional[bool] = None,
+        columns: Optional[list[str]] = None,
     ) -> list[Table]:
         """
         Find the rows from SQL table according to the condition with
@@ -95,13 +173,55 @@ class AbstractDB:
         descending : Optional[int] = None
             Direction of the order of the find statement, if None then no order is applied
 
+        columns : Optional[list[str]] = None
+            Columns to select, if given then light rows are returned
+            instead of sqlalchemy objects
+
         Returns
         -------
         list[Table]
             List of SQLalchemy tables according to the selected condition
         """
+        fields = tuple(sorted(search_fields))
+        key = (
+            "find",
+            fields,
+            order_by.key if order_by is not None else None,
+            descending,
+            limit is not None,
+            offset is not None,
+            self._columns_key(columns),
+        )
+        statement = statement_cache.get(
+            self.table.__tablename__,
+            key,
+            lambda: self._build_find(
+                fields, limit, offset, order_by, descending, columns
+            ),
+        )
+
+        # Значения передаются параметрами, а не зашиваются в запрос
+        params = {"f_" + field: search_fields[field] for field in fields}
+        if limit is not None:
+            params["limit"] = limit
+        if offset is not None:
+            params["offset"] = offset
+        return await self._process_select(
+            statement, columns, params, method="find"
+        )
+
+    def _build_find(
+        self,
+        fields: tuple[str, ...],
+        limit: Optional[int],
+        offset: Optional[int],
+        order_by,
+        descending: Optional[bool],
+        columns: Optional[list[str]],
+    ) -> Select:
         where_clause = and_(
-            getattr(self.table, key) == value for key, value in search_fields.items()
+            getattr(self.table, field) == bindparam("f_" + field)
+            for field in fields
         )
 
         # Determine order by
@@ -112,14 +232,223 @@ class AbstractDB:
                 order_by = order_by.asc()
 
         statement = (
-            select(self.table)
-            .where(where_clause)
-            .order_by(order_by)
-            .offset(offset)
-            .limit(limit)
+            self._select(columns).where(where_clause).order_by(order_by)
         )
-        return await self._process_crud_statement(statement)
+        if offset is not None:
+            statement = statement.offset(bindparam("offset"))
+        if limit is not None:
+            statement = statement.limit(bindparam("limit"))
+        return statement
+
+    @timed_query
+    async def find_page(
+        self,
+        search_fields: dict,
+        limit: int,
+        cursor: Optional[str] = None,
+        descending: bool = False,
+        columns: Optional[list[str]] = None,
+    ) -> tuple[list[Table], Optional[str], Optional[str]]:
+        """
+        Find one page of rows with keyset pagination on (created_at, id).
+        Unlike offset pagination the cost of a page does not depend
+        on its depth
+
+        Parameters
+        ----------
+        search_fields : dict
+            A dictionary with keys corresponding to column names and values
+            corresponding to searched values
+
+        limit : int
+            Number of rows on the page
+
+        cursor : Optional[str] = None
+            Cursor returned with the previous page, first page if None
+
+        descending : bool = False
+            Direction of the order by (created_at, id)
+
+        columns : Optional[list[str]] = None
+            Columns to select, created_at and id are always added
 
+        Raises
+        ------
+        ValueError
+            If cursor is malformed
+
+        Returns
+        -------
+        tuple[list[Table], Optional[str], Optional[str]]
+            Rows of the page, cursor of the next page and cursor
+            of the previous page (None if there is no such page)
+        """
+        position = decode_cursor(cursor) if cursor is not None else None
+        backwards = position is not None and position.direction == PREV
+
+        key = tuple_(self.table.created_at, self.table.id)
+        # при движении назад порядок и сравнение переворачиваются,
+        # а страница разворачивается после выборки
+        reverse = descending != backwards
+        if columns is not None:
+            columns = list(dict.fromkeys([*columns, "created_at", "id"]))
+        statement = self._select(columns).where(self._where(search_fields))
+        if position is not None:
+            boundary = tuple_(position.created_at, position.id)
+            statement = statement.where(
+                key < boundary if reverse else key > boundary
+            )
+        if reverse:
+            statement = statement.order_by(
+                self.table.created_at.desc(), self.table.id.desc()
+            )
+        else:
+            statement = statement.order_by(
+                self.table.created_at.asc(), self.table.id.asc()
+            )
+        # лишняя строка показывает, есть ли следующая страница
+        rows = await self._process_select(
+            statement.limit(limit + 1), columns, method="find_page"
+        )
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return rows, None, None
+        first, last = rows[0], rows[-1]
+        next_cursor = prev_cursor = None
+        if backwards or has_more:
+            next_cursor = encode_cursor(last.created_at, last.id, NEXT)
+        if (backwards and has_more) or (not backwards and position):
+            prev_cursor = encode_cursor(first.created_at, first.id, PREV)
+        return rows, next_cursor, prev_cursor
+
+    @timed_query
+    async def stream(
+        self,
+        search_fields: Optional[dict] = None,
+        columns: Optional[list[str]] = None,
+        fetch_size: Optional[int] = None,
+    ) -> AsyncIterator[Table]:
+        """
+        Iterate over the rows with a server-side cursor. Only fetch_size
+        rows are held in memory at once, so the whole table can be walked
+        with flat memory use
+
+        Parameters
+        ----------
+        search_fields : Optional[dict] = None
+            A dictionary with keys corresponding to column names and values
+            corresponding to searched values, all rows if None
+
+        columns : Optional[list[str]] = None
+            Columns to select, if given then light rows are yielded
+            instead of sqlalchemy objects
+
+        fetch_size : Optional[int] = None
+            Rows fetched per round trip, POSTGRES_STREAM_FETCH_SIZE if None
+
+        Yields
+        ------
+        Table
+            SQLalchemy tables (or rows) according to the selected condition
+        """
+        statement = self._select(columns)
+        if search_fields:
+            statement = statement.where(self._where(search_fields))
+        if fetch_size is None:
+            fetch_size = postgres_settings.POSTGRES_STREAM_FETCH_SIZE
+        statement = statement.execution_options(yield_per=fetch_size)
+        async with self._connect("stream") as conn:
+            result = await conn.stream(statement)
+            async for row in result:
+                if columns is None:
+                    yield self.table(**row._asdict())
+                else:
+                    yield row
+
+    @timed_query
+    async def exists(self, search_fields: dict) -> bool:
+        """
+        Check that at least one row matches the condition with equality
+        (SELECT EXISTS), no row is fetched
+
+        Parameters
+        ----------
+        search_fields : dict
+            A dictionary with keys corresponding to column names and values
+            corresponding to searched values
+
+        Returns
+        -------
+        bool
+            True if the row exists
+        """
+        statement = select(exists().where(self._where(search_fields)))
+        async with self._connect("exists") as conn:
+            return bool(await conn.scalar(statement))
+
+    @timed_query
+    async def count(
+        self, search_fields: Optional[dict] = None, estimate: bool = False
+    ) -> int:
+        """
+        Count rows matching the condition with equality
+
+        Parameters
+        ----------
+        search_fields : Optional[dict] = None
+            A dictionary with keys corresponding to column names and values
+            corresponding to searched values, all rows if None
+
+        estimate : bool = False
+            Return planner estimate from pg_class instead of exact
+            COUNT(*). Used only for the whole table, partitions are
+            summed, partitions which were never analyzed are counted
+            exactly
+
+        Returns
+        -------
+        int
+            Number of rows
+        """
+        async with self._connect("count") as conn:
+            if estimate and not search_fields:
+                estimated = await self._estimate_count(conn)
+                if estimated is not None:
+                    return estimated
+
+            statement = select(func.count()).select_from(self.table)
+            if search_fields:
+                statement = statement.where(self._where(search_fields))
+            return await conn.scalar(statement)
+
+    async def _estimate_count(self, conn: AsyncConnection) -> Optional[int]:
+        # to_regclass понимает только имя в кавычках для "user"
+        table_name = '"{}"'.format(self.table.__tablename__)
+        result = await conn.execute(
+            LEAF_TABLES_STATEMENT, {"table_name": table_name}
+        )
+        leaves = result.fetchall()
+        if not leaves:
+            return None
+
+        total = 0
+        for leaf_name, reltuples, relpages in leaves:
+            # relpages = 0 - таблицу не анализировали (в Postgres 12
+            # reltuples тогда тоже 0) или она пуста. Считаем точно,
+            # для пустой или новой партиции это дешево
+            if relpages > 0 and reltuples >= 0:
+                total += reltuples
+                continue
+            total += await conn.scalar(
+                text("SELECT count(*) FROM {}".format(leaf_name))
+            )
+        return total
+
+    @timed_query
     async def update(self, entity_id: UUID, new_entity: Table) -> Table:
         """
         Update the row of the table with new values.
@@ -146,6 +475,7 @@ class AbstractDB:
         )
         return await self._process_crud_statement(statement)
 
+    @timed_query
     async def delete(self, entity_id: UUID) -> list[Table]:
         """
         Delete a row from SQL table by its id
@@ -165,6 +495,138 @@ class AbstractDB:
         )
         return await self._process_crud_statement(statement)
 
+    @timed_query
+    async def insert_many(
+        self, entities: list[Table], batch_size: Optional[int] = None
+    ) -> list[Table]:
+        """
+        Insert many rows with multi-row VALUES statements
+
+        Parameters
+        ----------
+        entities : list[Table]
+            SQLalchemy tables or pydantic models with the same set of fields
+
+        batch_size : Optional[int] = None
+            Rows per statement, POSTGRES_BULK_BATCH_SIZE if None
+
+        Returns
+        -------
+        list[Table]
+            List of inserted sqlalchemy objects
+        """
+        rows = [self._get_values_dict(entity) for entity in entities]
+        return await self._process_batches(
+            rows,
+            batch_size,
+            lambda batch: insert(self.table)
+            .values(batch)
+            .returning(self.table),
+        )
+
+    @timed_query
+    async def upsert(
+        self,
+        entities: list[Table],
+        conflict_fields: list[str],
+        update_fields: Optional[list[str]] = None,
+        batch_size: Optional[int] = None,
+    ) -> list[Table]:
+        """
+        Insert rows or update them on conflict (INSERT ... ON CONFLICT)
+
+        Parameters
+        ----------
+        entities : list[Table]
+            SQLalchemy tables or pydantic models with the same set of fields
+
+        conflict_fields : list[str]
+            Columns of the unique constraint checked for conflict
+
+        update_fields : Optional[list[str]] = None
+            Columns overwritten on conflict, if empty then DO NOTHING
+
+        batch_size : Optional[int] = None
+            Rows per statement, POSTGRES_BULK_BATCH_SIZE if None
+
+        Returns
+        -------
+        list[Table]
+            Inserted and updated rows. Rows skipped by DO NOTHING
+            are not returned
+        """
+
+        def build(batch: list[dict]):
+            statement = pg_insert(self.table).values(batch)
+            if update_fields:
+                statement = statement.on_conflict_do_update(
+                    index_elements=conflict_fields,
+                    set_={
+                        field: getattr(statement.excluded, field)
+                        for field in update_fields
+                    },
+                )
+            else:
+                statement = statement.on_conflict_do_nothing(
+                    index_elements=conflict_fields
+                )
+            return statement.returning(self.table)
+
+        rows = [self._get_values_dict(entity) for entity in entities]
+        return await self._process_batches(rows, batch_size, build)
+
+    @timed_query
+    async def delete_many(
+        self, entity_ids: list[UUID], batch_size: Optional[int] = None
+    ) -> list[Table]:
+        """
+        Delete rows by ids with one statement per batch
+
+        Parameters
+        ----------
+        entity_ids : list[UUID]
+            IDs of the rows to delete
+
+        batch_size : Optional[int] = None
+            IDs per statement, POSTGRES_BULK_BATCH_SIZE if None
+
+        Returns
+        -------
+        list[Table]
+            List of deleted sqlalchemy objects
+        """
+        return await self._process_batches(
+            entity_ids,
+            batch_size,
+            lambda batch: delete(self.table)
+            .where(self.table.id.in_(batch))
+            .returning(self.table),
+        )
+
+    def _batches(
+        self, items: list, batch_size: Optional[int]
+    ) -> Iterator[list]:
+        if batch_size is None:
+            batch_size = postgres_settings.POSTGRES_BULK_BATCH_SIZE
+        # не выходим за лимит параметров на один запрос
+        batch_size = max(
+            min(batch_size, MAX_BIND_PARAMS // len(self.all_columns)), 1
+        )
+        for start in range(0, len(items), batch_size):
+            yield items[start:start + batch_size]
+
+    async def _process_batches(
+        self, items: list, batch_size: Optional[int], build
+    ) -> list[Table]:
+        entities = []
+        if not items:
+            return entities
+        async with self._connect() as conn:
+            for batch in self._batches(items, batch_size):
+                result = await conn.execute(build(batch))
+                entities.extend(self.table(**val._asdict()) for val in result)
+        return entities
+
     def _get_values_dict(self, entity: Table) -> dict:
         return {
             key: value
@@ -172,9 +634,96 @@ class AbstractDB:
             if key in self.all_columns
         }
 
-    async def _process_crud_statement(self, statement) -> Table:
-        async with self.connection.connect() as conn:
-            result = await conn.execute(statement)
+    @asynccontextmanager
+    async def _connect(
+        self, method: Optional[str] = None
+    ) -> AsyncIterator[AsyncConnection]:
+        """Connection for a repository call.
+
+        Inside unit_of_work the shared connection is used and the
+        transaction is left to the unit of work, otherwise a new
+        connection is checked out and committed after the call.
+        Methods from read_methods go to the replica unless the request
+        has just written to the primary.
+        """
+        is_read = method in self.read_methods
+        shared = get_current_connection(self.connection)
+        if shared is not None:
+            yield shared
+            if not is_read:
+                mark_write()
+            return
+
+        engine = self._route(is_read)
+        async with engine.connect() as conn:
+            yield conn
             await conn.commit()
+        if not is_read:
+            mark_write()
+
+    def _route(self, is_read: bool) -> AsyncConnection:
+        if (
+            not is_read
+            or self.read_connection is None
+            or recently_written(
+                postgres_settings.POSTGRES_READ_YOUR_WRITES_SECONDS
+            )
+        ):
+            metrics.inc("db_checkouts_total", target="primary")
+            return self.connection
+        metrics.inc("db_checkouts_total", target="replica")
+        return self.read_connection
+
+    def _where(self, search_fields: dict):
+        return and_(
+            getattr(self.table, key) == value
+            for key, value in search_fields.items()
+        )
+
+    def _select(self, columns: Optional[list[str]]) -> Select:
+        if columns is None:
+            return select(self.table)
+        return select(*(getattr(self.table, column) for column in columns))
+
+    @staticmethod
+    def _columns_key(columns: Optional[list[str]]) -> Optional[tuple]:
+        return tuple(columns) if columns is not None else None
+
+    async def _process_select(
+        self,
+        statement: Select,
+        columns: Optional[list[str]],
+        params: Optional[dict] = None,
+        method: Optional[str] = None,
+    ) -> list:
+        if columns is None:
+            return await self._process_crud_statement(
+                statement, params, method
+            )
+        return await self._process_rows_statement(statement, params, method)
+
+    async def _process_rows_statement(
+        self,
+        statement,
+        params: Optional[dict] = None,
+        method: Optional[str] = None,
+    ) -> list[Row]:
+        """Execute statement and return rows as they are.
+
+        Row is a tuple with attribute access by column name, so it is
+        much cheaper than building a sqlalchemy object for each row.
+        """
+        async with self._connect(method) as conn:
+            result = await conn.execute(statement, params)
+        return result.all()
+
+    async def _process_crud_statement(
+        self,
+        statement,
+        params: Optional[dict] = None,
+        method: Optional[str] = None,
+    ) -> Table:
+        async with self._connect(method) as conn:
+            result = await conn.execute(statement, params)
 
         return [self.table(**val._asdict()) for val in result]
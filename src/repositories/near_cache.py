@@ -0,0 +1,335 @@
+import asyncio
+import json
+import time
+from typing import Callable, Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from core.config import redis_setttings
+from core.get_logger import logger
+from repositories.abstract_cache import AbstractCache
+from utils.bloom import ExpiringBloomFilter
+from utils.metrics import metrics
+from utils.ttl_cache import MISSING, TTLCache
+
+# Пауза перед повторной подпиской после ошибки Redis
+RESUBSCRIBE_DELAY = 1.0
+
+
+def denied_token_message(jti: str, user_id: str, expire: int) -> str:
+    return json.dumps(
+        {
+            "type": "token",
+            "jti": jti,
+            "user_id": str(user_id),
+            "expire": expire,
+            "published_at": time.time(),
+        }
+    )
+
+
+def user_revoked_message(user_id: str, revoked_before: float) -> str:
+    return json.dumps(
+        {
+            "type": "user",
+            "user_id": str(user_id),
+            "revoked_before": revoked_before,
+            "published_at": time.time(),
+        }
+    )
+
+
+class SubscriptionHealth:
+    """Last sign of life of the revocation subscription, shared by
+    the listener and the caches built for requests
+
+    Args:
+        stale_after (float | None): seconds without messages or pongs
+            after which the subscription is considered lost,
+            never if None
+        clock (Callable[[], float]): monotonic time in seconds
+    """
+
+    def __init__(
+        self,
+        stale_after: Optional[float],
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.stale_after = stale_after
+        self._clock = clock
+        self._alive_at = clock()
+
+    def mark_alive(self) -> None:
+        self._alive_at = self._clock()
+
+    def is_stale(self) -> bool:
+        return (
+            self.stale_after is not None
+            and self._clock() - self._alive_at > self.stale_after
+        )
+
+
+class NearCache(AbstractCache):
+    """Denied tokens cache of the worker in front of the shared one.
+
+    Tokens which are surely not revoked are answered by the Bloom
+    filter. Probable hits go to the TTLCache and then to the shared
+    cache. A denied token stays cached until it expires, "not denied"
+    lives for the TTLCache ttl at most. Revocation epochs of users
+    are cached the same way.
+
+    Args:
+        cache (AbstractCache): shared cache, source of truth
+        local (TTLCache): cache of the worker
+        revoked (ExpiringBloomFilter | None): filter of revoked jti,
+            used only after it is built by reset()
+        epochs (TTLCache | None): revocation epochs of users,
+            not cached if None
+        health (SubscriptionHealth | None): the filter is trusted
+            only while the subscription is not stale, always if None
+    """
+
+    def __init__(
+        self,
+        cache: AbstractCache,
+        local: TTLCache,
+        revoked: Optional[ExpiringBloomFilter] = None,
+        epochs: Optional[TTLCache] = None,
+        health: Optional[SubscriptionHealth] = None,
+    ):
+        self._cache = cache
+        self._local = local
+        self._revoked = revoked
+        self._epochs = epochs
+        self._health = health
+
+    async def add_denied_token(self, jti: str, user_id: str, expire: int):
+        await self._cache.add_denied_token(
+            jti=jti, user_id=user_id, expire=expire
+        )
+        # свой воркер узнает об отзыве сразу, не дожидаясь сообщения
+        self._store(jti, str(user_id), expire, time.time() + expire)
+
+    async def get(self, jti: str) -> Optional[str]:
+        filtered = (
+            self._revoked is not None
+            and self._revoked.ready
+            and not self.is_stale()
+        )
+        if filtered and not self._revoked.might_contain(jti):
+            metrics.inc(
+                "bloom_filter_checks_total",
+                filter=self._revoked.name,
+                result="negative",
+            )
+            return None
+
+        denied_token = self._local.get(jti)
+        if denied_token is MISSING:
+            denied_token = await self._cache.get(jti)
+            # пока шло чтение, отзыв мог прийти сообщением, и ответ
+            # "не отозван" не должен его затереть
+            stored = self._local.peek(jti)
+            if stored not in (MISSING, None):
+                denied_token = stored
+            else:
+                self._local.set(jti, denied_token)
+        if filtered:
+            metrics.inc(
+                "bloom_filter_checks_total",
+                filter=self._revoked.name,
+                result="positive" if denied_token else "false_positive",
+            )
+        return denied_token
+
+    async def get_denied_tokens(self) -> list[tuple[str, float]]:
+        return await self._cache.get_denied_tokens()
+
+    async def revoke_user_tokens(self, user_id: str) -> float:
+        revoked_before = await self._cache.revoke_user_tokens(user_id)
+        self._store_epoch(user_id, revoked_before)
+        return revoked_before
+
+    async def get_revoked_before(self, user_id: str) -> Optional[float]:
+        if self._epochs is None:
+            return await self._cache.get_revoked_before(user_id)
+        revoked_before = self._epochs.get(user_id)
+        if revoked_before is MISSING:
+            revoked_before = await self._cache.get_revoked_before(user_id)
+            # эпоха, пришедшая сообщением во время чтения, новее ответа
+            self._store_epoch(user_id, revoked_before)
+            current = self._epochs.peek(user_id)
+            if current is not MISSING:
+                revoked_before = current
+        return revoked_before
+
+    async def close(self):
+        await self._cache.close()
+
+    def _store_epoch(
+        self, user_id: str, revoked_before: Optional[float]
+    ) -> None:
+        if self._epochs is None:
+            return
+        # сообщения могут прийти не по порядку, эпоха только растет,
+        # None (отзывов не было) меньше любой эпохи
+        current = self._epochs.peek(user_id)
+        if current not in (MISSING, None) and (
+            revoked_before is None or current >= revoked_before
+        ):
+            return
+        self._epochs.set(user_id, revoked_before)
+
+    def _store(
+        self, jti: str, user_id: str, ttl: float, expires_at: float
+    ) -> None:
+        if ttl > 0:
+            self._local.set(jti, user_id, ttl=ttl)
+        if self._revoked is not None:
+            self._revoked.add(jti, expires_at)
+
+    def apply_message(self, data: bytes) -> None:
+        """Store the revocation received from another worker
+
+        Args:
+            data (bytes): message made by denied_token_message
+        """
+        message = json.loads(data)
+        delay = max(time.time() - message["published_at"], 0.0)
+        # задержка между узлами включает и расхождение их часов
+        metrics.observe(
+            "near_cache_propagation_seconds", delay, cache=self._local.name
+        )
+        if message["type"] == "user":
+            self._store_epoch(message["user_id"], message["revoked_before"])
+            return
+        self._store(
+            message["jti"],
+            message["user_id"],
+            message["expire"] - delay,
+            message["published_at"] + message["expire"],
+        )
+
+    async def rebuild_filter(self) -> None:
+        """Rebuild the Bloom filter from all live revoked tokens"""
+        if self._revoked is None:
+            return
+        self._revoked.replace(await self._cache.get_denied_tokens())
+
+    def mark_alive(self) -> None:
+        """Record that the subscription delivered a message or a pong"""
+        if self._health is not None:
+            self._health.mark_alive()
+
+    def is_stale(self) -> bool:
+        """No sign of life of the subscription for too long,
+        revocations may be lost on a half-open connection
+        """
+        return self._health is not None and self._health.is_stale()
+
+    def invalidate(self) -> None:
+        """Forget everything which could be missed while the worker
+        is not subscribed, checks go to the shared cache until reset()
+        """
+        self._local.clear()
+        if self._epochs is not None:
+            self._epochs.clear()
+        if self._revoked is not None:
+            self._revoked.reset()
+
+    async def reset(self) -> None:
+        """Start from scratch right after subscribing"""
+        self.invalidate()
+        await self.rebuild_filter()
+
+
+async def listen_denied_tokens(
+    client: Redis,
+    near_cache: NearCache,
+    channel: str,
+    rebuild_interval: float,
+    ping_interval: float,
+) -> None:
+    """Background task of the application, applies revocations
+    published by all workers and nodes to the cache of this worker
+    and rebuilds the filter every rebuild_interval seconds.
+
+    The subscription is pinged every ping_interval seconds and
+    recreated once the cache considers it stale.
+
+    Messages and rebuilds are handled by this task only,
+    so a rebuild can not lose a revocation applied during it.
+    """
+    while True:
+        try:
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(channel)
+                # отсчет жизни заново, фильтр до reset() не используется
+                near_cache.mark_alive()
+                rebuild_at = None
+                ping_at = time.monotonic() + ping_interval
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        near_cache.mark_alive()
+                    if message is None:
+                        pass
+                    elif message["type"] == "subscribe":
+                        # пока подписки не было, сообщения терялись
+                        await near_cache.reset()
+                        rebuild_at = time.monotonic() + rebuild_interval
+                        logger.info(
+                            "[listen_denied_tokens] - subscribed to %s",
+                            channel,
+                        )
+                    elif message["type"] == "message":
+                        near_cache.apply_message(message["data"])
+                    if near_cache.is_stale():
+                        # запись в полуоткрытое соединение проходит,
+                        # а ответы не приходят
+                        raise RedisConnectionError(
+                            "no messages or pongs from {}".format(channel)
+                        )
+                    if time.monotonic() >= ping_at:
+                        await pubsub.ping()
+                        ping_at = time.monotonic() + ping_interval
+                    if rebuild_at is not None and (
+                        time.monotonic() >= rebuild_at
+                    ):
+                        # сброс ложных срабатываний переполненных окон
+                        await near_cache.rebuild_filter()
+                        rebuild_at = time.monotonic() + rebuild_interval
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(
+                "[listen_denied_tokens] - subscription to %s lost", channel
+            )
+            metrics.inc("near_cache_subscription_errors_total")
+            # без подписки фильтр не узнает о новых отзывах
+            near_cache.invalidate()
+        await asyncio.sleep(RESUBSCRIBE_DELAY)
+
+
+denied_tokens = TTLCache(
+    "denied_tokens",
+    max_size=redis_setttings.REDIS_NEAR_CACHE_SIZE,
+    ttl=redis_setttings.REDIS_NEAR_CACHE_TTL,
+)
+revoked_tokens = ExpiringBloomFilter(
+    "revoked_tokens",
+    window=redis_setttings.REDIS_BLOOM_WINDOW,
+    capacity=redis_setttings.REDIS_BLOOM_CAPACITY,
+    error_rate=redis_setttings.REDIS_BLOOM_ERROR_RATE,
+)
+
+revocation_epochs = TTLCache(
+    "revocation_epochs",
+    max_size=redis_setttings.REDIS_NEAR_CACHE_SIZE,
+    ttl=redis_setttings.REDIS_NEAR_CACHE_TTL,
+)
+
+denied_tokens_subscription = SubscriptionHealth(
+    redis_setttings.REDIS_PUBSUB_STALE_AFTER
+)
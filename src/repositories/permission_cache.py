@@ -0,0 +1,153 @@
+import json
+import math
+import random
+import time
+from functools import lru_cache
+from typing import Awaitable, Callable, Iterable
+
+from fastapi import Depends
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from core.config import redis_setttings
+from core.get_logger import logger
+from db.redis import get_cache
+from utils.decorators import redis_backoff
+from utils.metrics import metrics
+from utils.single_flight import SingleFlight
+
+# Загрузки прав одного пользователя в воркере объединяются
+_loads = SingleFlight("permissions")
+
+
+class PermissionCache:
+    """Permissions of users in Redis, shared by all workers.
+
+    Every user has a version: invalidation increments it, extends
+    its lifetime to twice the entry ttl and deletes the entry. An
+    entry is valid only for the version read before its permissions
+    were loaded, so a load racing with invalidation can not store
+    stale permissions.
+
+    Entries are reloaded shortly before expiry with probability
+    growing towards it (XFetch), and concurrent loads of one user
+    in a worker share one query, so expiry causes no stampede.
+
+    Args:
+        client (Redis): redis client
+        ttl (int): lifetime of an entry in seconds
+        beta (float): eagerness of early reload, 0 disables it
+    """
+
+    def __init__(self, client: Redis, ttl: int, beta: float):
+        self._client = client
+        self.ttl = ttl
+        self.beta = beta
+
+    def _keys(self, user_id: str) -> tuple[str, str]:
+        prefix = redis_setttings.REDIS_PERMISSIONS_PREFIX
+        return prefix + "version:" + user_id, prefix + user_id
+
+    def _reload_early(self, entry: dict) -> bool:
+        # XFetch: чем дольше загрузка и ближе истечение,
+        # тем вероятнее перезагрузка до него
+        gap = -entry["delta"] * self.beta * math.log(1.0 - random.random())
+        return time.time() + gap >= entry["expires_at"]
+
+    async def get(
+        self, user_id: str, load: Callable[[], Awaitable[list[str]]]
+    ) -> list[str]:
+        """Cached permissions of the user, loaded by load() on miss.
+        Redis errors are not fatal, permissions are loaded then
+
+        Args:
+            user_id (str): user identifier
+            load (Callable[[], Awaitable[list[str]]]): loads
+                permissions from the database
+
+        Returns:
+            list[str]: permission names
+        """
+        try:
+            version, entry = await self._client.mget(*self._keys(user_id))
+        except RedisError:
+            logger.exception("permissions of %s not read from cache", user_id)
+            metrics.inc("permission_cache_requests_total", result="error")
+            return await load()
+
+        version = int(version or 0)
+        if entry is None:
+            result = "miss"
+        else:
+            entry = json.loads(entry)
+            if entry["version"] != version:
+                result = "stale"
+            elif self._reload_early(entry):
+                result = "early_reload"
+            else:
+                metrics.inc("permission_cache_requests_total", result="hit")
+                return entry["permissions"]
+        metrics.inc("permission_cache_requests_total", result=result)
+        # версия в ключе: после инвалидации не присоединяемся
+        # к загрузке, начатой до нее
+        return await _loads.do(
+            (user_id, version), lambda: self._load(user_id, version, load)
+        )
+
+    async def _load(
+        self,
+        user_id: str,
+        version: int,
+        load: Callable[[], Awaitable[list[str]]],
+    ) -> list[str]:
+        started_at = time.perf_counter()
+        permissions = await load()
+        delta = time.perf_counter() - started_at
+        metrics.observe("permission_cache_load_seconds", delta)
+        entry = {
+            "version": version,
+            "permissions": permissions,
+            "delta": delta,
+            "expires_at": time.time() + self.ttl,
+        }
+        try:
+            await self._client.set(
+                self._keys(user_id)[1], json.dumps(entry), ex=self.ttl
+            )
+        except RedisError:
+            logger.exception("permissions of %s not cached", user_id)
+        return permissions
+
+    @redis_backoff
+    async def invalidate(self, user_ids: Iterable[str]) -> None:
+        """Drop cached permissions of the users
+
+        Args:
+            user_ids (Iterable[str]): user identifiers
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        async with self._client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                version_key, entry_key = self._keys(user_id)
+                pipe.incr(version_key)
+                # версия живет дольше записи: запись со старой версией,
+                # сохраненная загрузкой, начатой до инвалидации, истечет
+                # раньше, чем версия сбросится в 0 и совпадет с ней
+                pipe.expire(version_key, self.ttl * 2)
+                pipe.delete(entry_key)
+            await pipe.execute()
+        metrics.inc("permission_cache_invalidations_total", len(user_ids))
+        logger.info("permissions cache of %s users dropped", len(user_ids))
+
+
+@lru_cache
+def get_permission_cache(
+    client: Redis = Depends(get_cache),
+) -> PermissionCache:
+    return PermissionCache(
+        client,
+        ttl=redis_setttings.REDIS_PERMISSIONS_TTL,
+        beta=redis_setttings.REDIS_PERMISSIONS_XFETCH_BETA,
+    )
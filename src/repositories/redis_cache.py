@@ -1,11 +1,23 @@
+import time
 from functools import lru_cache
+from typing import Optional
 
 from fastapi import Depends
 from redis.asyncio import Redis
 
+from core.config import redis_setttings
 from core.get_logger import logger
 from db.redis import get_cache
 from repositories.abstract_cache import AbstractCache
+from repositories.near_cache import (
+    NearCache,
+    denied_token_message,
+    denied_tokens,
+    denied_tokens_subscription,
+    revocation_epochs,
+    revoked_tokens,
+    user_revoked_message,
+)
 from utils.decorators import redis_backoff
 
 
@@ -15,7 +27,22 @@ class CacheRedis(AbstractCache):
 
     @redis_backoff
     async def add_denied_token(self, jti: str, user_id: str, expire: int):
-        await self._client.set(name=jti, value=user_id, ex=expire)
+        expires_at = time.time() + expire
+        # запись и оповещение остальных воркеров за один запрос к Redis
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.set(name=jti, value=user_id, ex=expire)
+            pipe.zadd(
+                redis_setttings.REDIS_DENIED_TOKENS_KEY, {jti: expires_at}
+            )
+            # истекшие jti больше не нужны для сборки фильтра
+            pipe.zremrangebyscore(
+                redis_setttings.REDIS_DENIED_TOKENS_KEY, "-inf", time.time()
+            )
+            pipe.publish(
+                redis_setttings.REDIS_DENIED_TOKENS_CHANNEL,
+                denied_token_message(jti, user_id, expire),
+            )
+            await pipe.execute()
         logger.info("{0} set to redis".format(jti))
 
     @redis_backoff
@@ -24,6 +51,48 @@ class CacheRedis(AbstractCache):
         logger.info("Try get {0} from redis".format(jti))
         return denied_token
 
+    @redis_backoff
+    async def get_denied_tokens(self) -> list[tuple[str, float]]:
+        denied_tokens = await self._client.zrangebyscore(
+            redis_setttings.REDIS_DENIED_TOKENS_KEY,
+            time.time(),
+            "+inf",
+            withscores=True,
+        )
+        return [
+            (jti.decode(), expires_at) for jti, expires_at in denied_tokens
+        ]
+
+    @redis_backoff
+    async def revoke_user_tokens(self, user_id: str) -> float:
+        # эпоха с точностью до миллисекунды сравнивается с iat_ms токена:
+        # вход, выполненный в ту же секунду после отзыва (например,
+        # с новым паролем после change), не отклоняется, как было при
+        # округлении эпохи вверх до целой секунды
+        revoked_before = time.time_ns() // 1_000_000 / 1000
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.set(
+                name=redis_setttings.REDIS_REVOKED_BEFORE_PREFIX + user_id,
+                value=revoked_before,
+                ex=redis_setttings.REDIS_REVOKED_BEFORE_TTL,
+            )
+            pipe.publish(
+                redis_setttings.REDIS_DENIED_TOKENS_CHANNEL,
+                user_revoked_message(user_id, revoked_before),
+            )
+            await pipe.execute()
+        logger.info("{0} tokens revoked before {1}".format(
+            user_id, revoked_before
+        ))
+        return revoked_before
+
+    @redis_backoff
+    async def get_revoked_before(self, user_id: str) -> Optional[float]:
+        revoked_before = await self._client.get(
+            redis_setttings.REDIS_REVOKED_BEFORE_PREFIX + user_id
+        )
+        return float(revoked_before) if revoked_before is not None else None
+
     @redis_backoff
     async def close(self):
         await self._client.close()
@@ -33,4 +102,10 @@ class CacheRedis(AbstractCache):
 def get_cache_service(
     client: AbstractCache = Depends(get_cache),
 ) -> AbstractCache:
-    return CacheRedis(client)
+    return NearCache(
+        CacheRedis(client),
+        denied_tokens,
+        revoked_tokens,
+        revocation_epochs,
+        denied_tokens_subscription,
+    )
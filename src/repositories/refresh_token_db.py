@@ -4,3 +4,6 @@ from repositories.postgres_db import PostgresDB
 
 class RefreshTokenDB(PostgresDB):
     table = RefreshToken
+    # Токен проверяется сразу после выдачи в другом запросе,
+    # отставание реплики здесь недопустимо
+    read_methods = frozenset()
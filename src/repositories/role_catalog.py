@@ -0,0 +1,171 @@
+import asyncio
+import time
+from typing import Iterable, Optional
+from uuid import UUID
+
+import asyncpg
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.config import PostgresSettings
+from core.get_logger import logger
+from repositories.role_db import RoleDB
+from schemas.role import RoleResponseModel
+from utils.db import construct_db_url
+from utils.metrics import metrics
+
+# Канал триггера role_notify_changed из миграции f3a9d6c2b814
+ROLE_CHANGED_CHANNEL = "role_changed"
+# Пауза перед повторным подключением после ошибки
+RECONNECT_DELAY = 1.0
+
+
+class RoleCatalog:
+    """All roles in memory of the worker.
+
+    The role table trigger sends NOTIFY on every change and
+    the catalog is reloaded, so workers of all nodes converge
+    without polling. Writes of the worker itself are applied
+    at once, before the notification arrives.
+
+    Until the first load and while the listener is disconnected
+    the catalog is not ready, lookups miss and callers have
+    to read the database.
+    """
+
+    def __init__(self) -> None:
+        self.ready = False
+        self._by_id: dict[UUID, RoleResponseModel] = {}
+        self._by_name: dict[str, RoleResponseModel] = {}
+
+    def _lookup(
+        self, found: Optional[RoleResponseModel]
+    ) -> Optional[RoleResponseModel]:
+        result = "hit" if found is not None else "miss"
+        metrics.inc("role_catalog_lookups_total", result=result)
+        return found
+
+    def get(self, role_id: UUID) -> Optional[RoleResponseModel]:
+        if not self.ready:
+            return None
+        return self._lookup(self._by_id.get(role_id))
+
+    def find(self, name: str) -> Optional[RoleResponseModel]:
+        if not self.ready:
+            return None
+        return self._lookup(self._by_name.get(name))
+
+    def all(self) -> list[RoleResponseModel]:
+        if not self.ready:
+            return []
+        return list(self._by_id.values())
+
+    def replace(self, roles: Iterable[RoleResponseModel]) -> None:
+        by_id = {role.id: role for role in roles}
+        self._by_id = by_id
+        self._by_name = {role.name: role for role in by_id.values()}
+        self.ready = True
+        metrics.set("role_catalog_size", len(by_id))
+
+    def put(self, role: RoleResponseModel) -> None:
+        previous = self._by_id.get(role.id)
+        if previous is not None and previous.name != role.name:
+            self._by_name.pop(previous.name, None)
+        self._by_id[role.id] = role
+        self._by_name[role.name] = role
+
+    def remove(self, role_id: UUID) -> None:
+        role = self._by_id.pop(role_id, None)
+        if role is not None:
+            self._by_name.pop(role.name, None)
+
+    def invalidate(self) -> None:
+        self.ready = False
+
+    async def load(self, repository: RoleDB) -> None:
+        """Replace the catalog with all roles from the database
+
+        Args:
+            repository (RoleDB): repository reading the primary
+        """
+        started_at = time.perf_counter()
+        rows = await repository.get_all(
+            columns=list(RoleResponseModel.__fields__)
+        )
+        self.replace(RoleResponseModel.from_orm(row) for row in rows)
+        metrics.observe(
+            "role_catalog_load_seconds", time.perf_counter() - started_at
+        )
+        logger.debug("[RoleCatalog][load] - %s roles loaded", len(rows))
+
+
+async def listen_role_changes(
+    catalog: RoleCatalog, engine: AsyncEngine, settings: PostgresSettings
+) -> None:
+    """Background task of the application, reloads the catalog
+    on every notification about role changes.
+
+    LISTEN needs a session connection, so it uses its own asyncpg
+    connection outside of the pool, directly to Postgres
+    (POSTGRES_LISTEN_HOST) even when queries go through PgBouncer.
+    """
+    # без реплик: каталог не должен отставать от уведомления
+    repository = RoleDB(engine)
+    dsn = construct_db_url(
+        user=settings.POSTGRES_USER,
+        password=settings.POSTGRES_PASSWORD,
+        host=settings.POSTGRES_LISTEN_HOST or settings.POSTGRES_HOST,
+        port=settings.POSTGRES_PORT,
+        database=settings.POSTGRES_DATABASE,
+        sync_mode=True,
+    )
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(dsn)
+            changed = asyncio.Event()
+            conn.add_termination_listener(lambda *args: changed.set())
+            await conn.add_listener(
+                ROLE_CHANGED_CHANNEL, lambda *args: changed.set()
+            )
+            # подписка до загрузки: изменения между ними не потеряются
+            await catalog.load(repository)
+            logger.info(
+                "[listen_role_changes] - listening to %s",
+                ROLE_CHANGED_CHANNEL,
+            )
+            while True:
+                try:
+                    await asyncio.wait_for(
+                        changed.wait(), settings.POSTGRES_LISTEN_CHECK_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    # молча оборванное соединение уведомлений не получит,
+                    # а проверка на нем без таймаута зависнет до сброса
+                    # TCP, и все это время каталог отдавал бы старые роли.
+                    # По таймауту каталог сбрасывается в finally
+                    await conn.execute(
+                        "SELECT 1",
+                        timeout=settings.POSTGRES_LISTEN_CHECK_INTERVAL,
+                    )
+                    continue
+                changed.clear()
+                if conn.is_closed():
+                    raise ConnectionError("listen connection closed")
+                metrics.inc("role_catalog_reloads_total")
+                await catalog.load(repository)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(
+                "[listen_role_changes] - %s listener failed",
+                ROLE_CHANGED_CHANNEL,
+            )
+        finally:
+            # без подписки каталог может отстать, читаем базу
+            catalog.invalidate()
+            if conn is not None:
+                conn.terminate()
+        await asyncio.sleep(RECONNECT_DELAY)
+
+
+role_catalog = RoleCatalog()
@@ -1,6 +1,32 @@
+from sqlalchemy import select
+
+from models.permission import Permission, role_permission_table
 from models.role import Role
 from repositories.postgres_db import PostgresDB
+from utils.sql_metrics import timed_query
 
 
 class RoleDB(PostgresDB):
     table = Role
+    read_methods = PostgresDB.read_methods | {"get_roles_by_permission"}
+
+    @timed_query
+    async def get_roles_by_permission(self, permission: str) -> list[Role]:
+        """get roles granting the permission,
+        uses index on role_permission.permission_id
+
+        Args:
+            permission (str): permission name
+
+        Returns:
+            list[Role]: roles with the permission
+        """
+        statement = (
+            select(Role)
+            .join(role_permission_table)
+            .join(Permission)
+            .where(Permission.name == permission)
+        )
+        return await self._process_select(
+            statement, None, method="get_roles_by_permission"
+        )
@@ -0,0 +1,27 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+# Момент последней записи в текущем запросе. ContextVar живет
+# в задаче asyncio запроса, поэтому окно не затрагивает другие запросы
+_last_write: ContextVar[Optional[float]] = ContextVar(
+    "last_write", default=None
+)
+
+
+def mark_write() -> None:
+    """Remember that the current request has written to the primary"""
+    _last_write.set(time.monotonic())
+
+
+def recently_written(window: float) -> bool:
+    """Whether the current request wrote less than window seconds ago
+
+    Args:
+        window (float): read-your-writes window in seconds
+
+    Returns:
+        bool: True if reads have to go to the primary
+    """
+    last_write = _last_write.get()
+    return last_write is not None and time.monotonic() - last_write < window
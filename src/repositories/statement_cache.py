@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+from sqlalchemy import Select
+
+from core.config import postgres_settings
+from utils.metrics import metrics
+
+
+class StatementCache:
+    """LRU cache of ready select statements.
+
+    Values of the query are passed as bind parameters, so the same
+    statement object is reused for every call with the same shape.
+    Sqlalchemy memoizes the cache key of the object and finds the
+    compiled SQL in its own cache, and the stable SQL text lets asyncpg
+    reuse the prepared statement of the connection.
+
+    Args:
+        max_size (int): number of kept statements
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._statements: OrderedDict[Hashable, Select] = OrderedDict()
+
+    def get(
+        self, table: str, key: Hashable, build: Callable[[], Select]
+    ) -> Select:
+        """Statement for the key, built by build() on the first call
+
+        Args:
+            table (str): name of the table, used in the key and metrics
+            key (Hashable): shape of the query
+            build (Callable[[], Select]): builds the statement on miss
+
+        Returns:
+            Select: cached statement
+        """
+        full_key = (table, key)
+        statement = self._statements.get(full_key)
+        if statement is not None:
+            self._statements.move_to_end(full_key)
+            metrics.inc("statement_cache_hits_total", table=table)
+            return statement
+
+        metrics.inc("statement_cache_misses_total", table=table)
+        statement = self._statements[full_key] = build()
+        if len(self._statements) > self.max_size:
+            self._statements.popitem(last=False)
+        metrics.set("statement_cache_size", len(self._statements))
+        return statement
+
+    def clear(self) -> None:
+        self._statements.clear()
+
+
+statement_cache = StatementCache(postgres_settings.POSTGRES_FIND_CACHE_SIZE)
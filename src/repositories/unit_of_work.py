@@ -0,0 +1,52 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Optional
+
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+# Соединение текущей единицы работы. ContextVar изолирует его
+# между запросами, которые обрабатываются в разных задачах asyncio
+_current: ContextVar[Optional[tuple[AsyncEngine, AsyncConnection]]] = (
+    ContextVar("unit_of_work", default=None)
+)
+
+
+def get_current_connection(engine: AsyncEngine) -> Optional[AsyncConnection]:
+    """Connection of the active unit of work opened on the engine
+
+    Args:
+        engine (AsyncEngine): engine of the repository
+
+    Returns:
+        AsyncConnection | None: shared connection or None outside
+            of a unit of work
+    """
+    current = _current.get()
+    if current is None or current[0] is not engine:
+        return None
+    return current[1]
+
+
+@asynccontextmanager
+async def unit_of_work(engine: AsyncEngine) -> AsyncIterator[AsyncConnection]:
+    """Run all repository calls inside the block on one connection
+    in one transaction.
+
+    The transaction is committed when the block exits normally and
+    rolled back on exception. Nested blocks join the outer one.
+
+    Args:
+        engine (AsyncEngine): engine shared by the repositories
+    """
+    shared = get_current_connection(engine)
+    if shared is not None:
+        yield shared
+        return
+
+    async with engine.connect() as conn:
+        token = _current.set((engine, conn))
+        try:
+            async with conn.begin():
+                yield conn
+        finally:
+            _current.reset(token)
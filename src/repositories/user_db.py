@@ -1,22 +1,36 @@
+from typing import Optional
 from uuid import UUID
 
-from sqlalchemy import insert, select, and_
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
 
 from models.user import User, user_role_table
+from models.permission import UserEffectivePermissions
 from models.role import Role
 from repositories.postgres_db import PostgresDB
 
-from utils.exceptions import UserRoleActionError
+from utils.db import FOREIGN_KEY_VIOLATION, get_sqlstate
+from utils.exceptions import (
+    NotFoundError,
+    RoleNotAssigned,
+    UserRoleActionError,
+)
+from utils.sql_metrics import timed_query
 
 
 class UserDB(PostgresDB):
     table = User
+    # get_permissions читается только кешем прав, поэтому идет
+    # на основной сервер: отставание реплики осело бы в кеше
+    read_methods = PostgresDB.read_methods | {"get_user_roles"}
 
+    @timed_query
     async def add_role_to_user(self, user_id: UUID, role_id: UUID) -> None:
         """Add role to user
-        use directly database connection to add many-to-many link
+        use directly database connection to add many-to-many link.
+        Existence of the user and the role is checked by foreign keys
+        in the same statement
 
         Args:
             user_id (UUID): id of the user
@@ -24,44 +38,100 @@ class UserDB(PostgresDB):
 
         Raises:
             UserRoleActionError: if role already added
+            NotFoundError: if user or role does not exist
         """
-        async with self.connection.connect() as conn:
-            statement = insert(user_role_table).values(
-                user_id=user_id, role_id=role_id
+        async with self._connect() as conn:
+            statement = (
+                pg_insert(user_role_table)
+                .values(user_id=user_id, role_id=role_id)
+                .on_conflict_do_nothing()
             )
             try:
                 result = await conn.execute(statement)
-            except IntegrityError:
+            except IntegrityError as error:
+                if get_sqlstate(error) == FOREIGN_KEY_VIOLATION:
+                    raise NotFoundError("User or role not found")
+                raise UserRoleActionError
+
+            # исключение внутри _connect откатывает транзакцию
+            if result.rowcount == 0:
                 raise UserRoleActionError("Role already added")
 
-            # if query finish success
-            if result.rowcount > 0:
-                await conn.commit()
-            else:
-                await conn.rollback()
-                raise UserRoleActionError
+    @timed_query
+    async def add_roles_to_users(
+        self,
+        links: list[tuple[UUID, UUID]],
+        batch_size: Optional[int] = None,
+    ) -> int:
+        """Add many user-role links with multi-row INSERT,
+        links which already exist are skipped
+
+        Args:
+            links (list[tuple[UUID, UUID]]): pairs of user id and role id
+            batch_size (int | None): links per statement,
+                POSTGRES_BULK_BATCH_SIZE if None
+
+        Returns:
+            int: number of added links
 
+        Raises:
+            NotFoundError: if a user or a role does not exist,
+                no link is added then
+        """
+        rows = [
+            {"user_id": user_id, "role_id": role_id}
+            for user_id, role_id in links
+        ]
+        added = 0
+        if not rows:
+            return added
+        async with self._connect() as conn:
+            for batch in self._batches(rows, batch_size):
+                statement = (
+                    pg_insert(user_role_table)
+                    .values(batch)
+                    .on_conflict_do_nothing()
+                )
+                try:
+                    result = await conn.execute(statement)
+                except IntegrityError as error:
+                    if get_sqlstate(error) == FOREIGN_KEY_VIOLATION:
+                        raise NotFoundError("User or role not found")
+                    raise UserRoleActionError
+                added += result.rowcount
+        return added
+
+    @timed_query
     async def delete_role_from_user(
         self, user_id: UUID, role_id: UUID
     ) -> None:
-        async with self.connection.connect() as conn:
+        """Delete role from user
+
+        Args:
+            user_id (UUID): id of the user
+            role_id (UUID): id of the role
+
+        Raises:
+            RoleNotAssigned: if there was no such link, the caller
+                has to check whether the user and the role exist
+        """
+        async with self._connect() as conn:
             statement = user_role_table.delete().where(
                 and_(
                     user_role_table.c.user_id == user_id,
                     user_role_table.c.role_id == role_id,
                 )
             )
-            try:
-                result = await conn.execute(statement)
-            except IntegrityError:
-                raise UserRoleActionError("Failed to remove role")
+            result = await conn.execute(statement)
 
-            if result.rowcount > 0:
-                await conn.commit()
-            else:
-                await conn.rollback()
-                raise UserRoleActionError
+            if result.rowcount == 0:
+                raise RoleNotAssigned(
+                    "Role {} not assigned to user {}.".format(
+                        role_id, user_id
+                    )
+                )
 
+    @timed_query
     async def get_user_roles(self, user_id: UUID) -> list[dict]:
         """get all roles assigned to the user
 
@@ -71,7 +141,7 @@ class UserDB(PostgresDB):
         Returns:
             list[dict]: dict of roles prepared to be load in pydantic model
         """
-        async with self.connection.connect() as conn:
+        async with self._connect("get_user_roles") as conn:
             statement = (
                 select(Role.id, Role.name, Role.access, Role.created_at)
                 .join(Role.users)
@@ -90,3 +160,40 @@ class UserDB(PostgresDB):
                 for role_id, role_name, role_access, role_created_at in rows
             ]
         return roles
+
+    @timed_query
+    async def get_role_holders(self, role_id: UUID) -> list[UUID]:
+        """get ids of users the role is assigned to,
+        uses index on user_role.role_id
+
+        Args:
+            role_id (UUID): id of the role
+
+        Returns:
+            list[UUID]: user ids
+        """
+        statement = select(user_role_table.c.user_id).where(
+            user_role_table.c.role_id == role_id
+        )
+        async with self._connect("get_role_holders") as conn:
+            return list(await conn.scalars(statement))
+
+    @timed_query
+    async def get_permissions(self, user_id: UUID) -> list[str]:
+        """get distinct permissions of all roles assigned to the user.
+        Read by primary key from user_effective_permissions, which
+        triggers keep up to date on role and assignment changes
+
+        Args:
+            user_id (UUID): id of the user
+
+        Returns:
+            list[str]: permission names
+        """
+        statement = select(UserEffectivePermissions.permissions).where(
+            UserEffectivePermissions.user_id == user_id
+        )
+        async with self._connect("get_permissions") as conn:
+            permissions = await conn.scalar(statement)
+        # у пользователя без ролей строки нет
+        return permissions or []
@@ -36,6 +36,12 @@ class UserHistoryShow(Base):
         orm_mode = True
 
 
+class UserHistoryPage(Base):
+    items: list[UserHistoryShow]
+    next_cursor: str | None
+    prev_cursor: str | None
+
+
 class UserRoleAction(Base):
     user_id: UUID
     role_id: UUID
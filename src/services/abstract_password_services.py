@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Optional
 
 
 class AbstractPasswordService(ABC):
@@ -13,3 +14,19 @@ class AbstractPasswordService(ABC):
     @abstractmethod
     def get_password_hash(self, password: str) -> str:
         pass
+
+    @abstractmethod
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        pass
+
+    @abstractmethod
+    async def hash(self, password: str) -> str:
+        pass
+
+    @abstractmethod
+    async def verify_and_update(
+        self, plain_password: str, hashed_password: str
+    ) -> tuple[bool, Optional[str]]:
+        """Verify password and return new hash if the stored one
+        was made with deprecated scheme or cost"""
+        pass
@@ -1,4 +1,5 @@
 import datetime
+import time
 from functools import lru_cache
 from http import HTTPStatus
 from typing import Optional, Tuple
@@ -7,26 +8,38 @@ from typing import Optional, Tuple
 from async_fastapi_jwt_auth import AuthJWT
 from async_fastapi_jwt_auth.exceptions import AuthJWTException
 from fastapi import Depends, HTTPException
+from sqlalchemy import Row
 from sqlalchemy.ext.asyncio import AsyncEngine
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from uuid import UUID
 
-from db.postgres import get_postgres
+from db.postgres import get_postgres, get_postgres_replica
 from core.get_logger import logger
 from models.user import User
 from models.user_history import UserHistory
 from models.refresh_token import RefreshToken
 from repositories.abstract_cache import AbstractCache
+from repositories.permission_cache import PermissionCache, get_permission_cache
 from repositories.redis_cache import get_cache_service
 from repositories.refresh_token_db import RefreshTokenDB
 from repositories.user_db import UserDB
 from repositories.user_history_db import UserHistoryDB
-from schemas.user import UserCreate, UserHistoryShow, UserHistoryAdd
+from repositories.unit_of_work import unit_of_work
+from schemas.user import (
+    UserCreate,
+    UserHistoryShow,
+    UserHistoryAdd,
+    UserHistoryPage,
+)
 from schemas.login import Login, Change
 from services.abstract_password_services import AbstractPasswordService
 from services.abstract_service import AbstractService
 from services.password_service import get_password_service
-from utils.constants import AdminRole
+from utils.constants import (
+    AdminRole,
+    HISTORY_PAGE_SIZE,
+    ISSUED_AT_MS_CLAIM,
+)
 from utils.exceptions import UnauthorisedException, PermissionDeniedException
 
 
@@ -39,8 +52,10 @@ class AuthService(AbstractService):
         token_repository: RefreshTokenDB,
         password_service: AbstractPasswordService,
         authorize_service: AuthJWT,
+        permission_cache: PermissionCache,
     ) -> None:
         self.cache_repository = cache_repository
+        self.permission_cache = permission_cache
         self.user_repository = user_repository
         self.user_history = user_history
         self.password_service = password_service
@@ -59,7 +74,7 @@ class AuthService(AbstractService):
         logger.debug("def 'signup' run with %s", user_create)
         user_db = User(**user_create.dict())
         # Захешировать пароль
-        user_db.password = self.password_service.get_password_hash(
+        user_db.password = await self.password_service.hash(
             user_db.password
         )
         await self.create_free_login(user_db)
@@ -76,6 +91,7 @@ class AuthService(AbstractService):
         logger.debug("def 'refresh' run")
 
         await self.check_refresh_token()
+        await self.check_denied_token()
 
         user_id = await self.Authorize.get_jwt_subject()
         await self.check_user_in_db(user_id)
@@ -100,16 +116,21 @@ class AuthService(AbstractService):
 
         user = await self.get_user_by_login(login)
 
+        # права читаются до транзакции: их загрузку разделяют другие
+        # запросы (SingleFlight), и она не должна идти на соединении
+        # транзакции, которое откатится при отмене этого запроса
         (
             access_token, refresh_token
         ) = await self.issue_access_and_refresh_token(user.id)
 
-        refresh_token_db = RefreshToken(
-            token=refresh_token, user_id=str(user.id)
-        )
-        await self.token_repository.insert(entity=refresh_token_db)
+        # запись токена и события атомарны
+        async with unit_of_work(self.user_repository.connection):
+            refresh_token_db = RefreshToken(
+                token=refresh_token, user_id=str(user.id)
+            )
+            await self.token_repository.insert(entity=refresh_token_db)
 
-        await self.add_event(user.id, "Account logged in")
+            await self.add_event(user.id, "Account logged in")
 
         logger.info(
             "access and refresh token has been issued for %s", user.id)
@@ -132,10 +153,11 @@ class AuthService(AbstractService):
 
         await self.add_token_to_denied(user_id)
 
-        await self.token_repository.delete(entity_id=user_id)
-        await self.Authorize.unset_jwt_cookies()
+        async with unit_of_work(self.user_repository.connection):
+            await self.token_repository.delete(entity_id=user_id)
+            await self.add_event(user_id, "Account logged out")
 
-        await self.add_event(user_id, "Account logged out")
+        await self.Authorize.unset_jwt_cookies()
 
         logger.info("%s was logged out", user_id)
         return {"msg": "logged out successful"}
@@ -157,9 +179,11 @@ class AuthService(AbstractService):
         user_id = await self.Authorize.get_jwt_subject()
         user = (await self.user_repository.get(entity_id=user_id))[0]
 
-        self.verify_password_on_change(change, user, user_id)
+        await self.verify_password_on_change(change, user, user_id)
 
         await self.update_new_entity(change, user, user_id)
+        # старый пароль мог утечь: выходим со всех устройств
+        await self.cache_repository.revoke_user_tokens(str(user_id))
 
         logger.info("login and (or) password %s has been change", user_id)
         return {"msg": "login and (or) password has been change"}
@@ -176,19 +200,8 @@ class AuthService(AbstractService):
         Returns:
             list[UserHistoryShow]: list events
         """
-        # только со свежим access_token
-        try:
-            await self.Authorize.jwt_required()
-        except AuthJWTException:
-            raise HTTPException(
-                status_code=HTTPStatus.UNAUTHORIZED,
-                detail="Unauthorized action",
-            )
         logger.debug("def 'history' run")
-
-        await self.check_access_token()
-
-        user_id = await self.Authorize.get_jwt_subject()
+        user_id = await self.get_history_user_id()
 
         events = []
 
@@ -204,6 +217,7 @@ class AuthService(AbstractService):
             limit=n_items_per_page,
             order_by=UserHistory.created_at,
             descending=descending,
+            columns=["event", "created_at"],
         )
         for event_history in user_history:
             events.append(
@@ -215,10 +229,85 @@ class AuthService(AbstractService):
         logger.info("%s viewed history", user_id)
         return events
 
+    async def history_page(
+        self,
+        n_items_per_page: Optional[int] = None,
+        cursor: Optional[str] = None,
+        descending: Optional[bool] = None,
+    ) -> UserHistoryPage:
+        """Login and logout history page with keyset pagination
+
+        Args:
+            n_items_per_page (int | None): page size
+            cursor (str | None): cursor from the previous page,
+                first page if None
+            descending (bool | None): newest events first
+
+        Raises:
+            HTTPException: Invalid cursor.
+
+        Returns:
+            UserHistoryPage: events and cursors of neighbour pages
+        """
+        logger.debug("def 'history_page' run with cursor %s", cursor)
+        user_id = await self.get_history_user_id()
+
+        try:
+            (
+                user_history, next_cursor, prev_cursor
+            ) = await self.user_history.find_page(
+                {"user_id": user_id},
+                limit=n_items_per_page or HISTORY_PAGE_SIZE,
+                cursor=cursor,
+                descending=bool(descending),
+                columns=["event"],
+            )
+        except ValueError:
+            logger.error("invalid history cursor %s", cursor)
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST,
+                detail="Invalid cursor",
+            )
+        logger.info("%s viewed history page", user_id)
+        return UserHistoryPage(
+            items=[
+                UserHistoryShow(
+                    event=event_history.event,
+                    created_at=event_history.created_at,
+                )
+                for event_history in user_history
+            ],
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor,
+        )
+
+    async def get_history_user_id(self) -> str:
+        """Check fresh access token for history and get its user
+
+        Raises:
+            HTTPException: Unauthorized action.
+
+        Returns:
+            str: user identifier
+        """
+        # только со свежим access_token
+        try:
+            await self.Authorize.jwt_required()
+        except AuthJWTException:
+            raise HTTPException(
+                status_code=HTTPStatus.UNAUTHORIZED,
+                detail="Unauthorized action",
+            )
+
+        await self.check_access_token()
+
+        return await self.Authorize.get_jwt_subject()
+
     async def get_permissions(self, user_id: UUID) -> list[str]:
         """get user permission
-        get all access values for a user by
-        concatenating all access values in each user role
+        get distinct access values of all user roles,
+        aggregated on the database side and cached in Redis
+        until roles of the user change
 
         Args:
             user_id (UUID): user id
@@ -227,15 +316,12 @@ class AuthService(AbstractService):
             list[str]: list of access values
         """
         logger.debug("def 'get_permissions' run with %s", user_id)
-        user_roles = await self.user_repository.get_user_roles(user_id)
-        access_set = set()
-        for role in user_roles:
-            access_values = role["access"].split(",")
-            for access in access_values:
-                access = access.strip()
-                access_set.add(access)
+        permissions = await self.permission_cache.get(
+            str(user_id),
+            lambda: self.user_repository.get_permissions(user_id),
+        )
         logger.info("permissions has been granted to the %s", user_id)
-        return list(access_set)
+        return permissions
 
     async def check_access(self, access_list: list[str]) -> None:
         """Check permission.
@@ -248,6 +334,7 @@ class AuthService(AbstractService):
 
         Raises:
             UnauthorisedException: return 401 when user don't have JWT token
+            HTTPException: return 401 when the token is in denied list
             PermissionDeniedException: if user not authontificated to resource return 403
         """
         logger.debug("def 'check_access' run with %s", access_list)
@@ -256,6 +343,9 @@ class AuthService(AbstractService):
         except AuthJWTException:
             raise UnauthorisedException
 
+        # список отзыва читается из кеша воркера, без запроса к Redis
+        await self.check_denied_token()
+
         current_user: dict = await self.Authorize.get_raw_jwt()
         user_access_list: list = current_user.get("scope", [])
         if not user_access_list:
@@ -320,23 +410,42 @@ class AuthService(AbstractService):
         )
 
     async def check_denied_token(self) -> None:
-        """Сhecks if the token is in the denied list.
+        """Сhecks if the token is in the denied list or was issued
+        before all tokens of its user were revoked.
 
         Raises:
             HTTPException: Unauthorized action, access_token in denied list!
                 Please note that hacking is possible.
         """
         logger.debug("def 'check_denied_token' run")
-        jti = (await self.Authorize.get_raw_jwt())["jti"]
+        raw_jwt = await self.Authorize.get_raw_jwt()
+        jti = raw_jwt["jti"]
         if await self.cache_repository.get(jti):
             logger.error("Unauthorized action, access_token in denied list!!!")
             raise HTTPException(
                 status_code=HTTPStatus.UNAUTHORIZED,
                 detail="Unauthorized action",
             )
+        revoked_before = await self.cache_repository.get_revoked_before(
+            raw_jwt["sub"]
+        )
+        # токены, выпущенные до появления iat_ms, сравниваются по iat
+        issued_at_ms = raw_jwt.get(ISSUED_AT_MS_CLAIM, raw_jwt["iat"] * 1000)
+        if revoked_before is not None and issued_at_ms < round(
+            revoked_before * 1000
+        ):
+            logger.error(
+                "Unauthorized action, %s issued before tokens revocation", jti
+            )
+            raise HTTPException(
+                status_code=HTTPStatus.UNAUTHORIZED,
+                detail="Unauthorized action",
+            )
         logger.info("%s not in denied lists", jti)
 
-    def verify_password_on_change(self, change: Change, user, user_id) -> None:
+    async def verify_password_on_change(
+        self, change: Change, user, user_id
+    ) -> None:
         """Verify enter old password with password in database.
 
         Args:
@@ -350,7 +459,7 @@ class AuthService(AbstractService):
         """
         logger.debug("""def 'verify_password_on_change' run with 'change': %s,
             'user' %s and 'user_id' %s""", change, user, user_id)
-        if not self.password_service.verify_password(
+        if not await self.password_service.verify(
             change.old_password, user.password
         ):
             logger.error("""Unauthorized action, incorrect password for
@@ -372,7 +481,7 @@ class AuthService(AbstractService):
         """
         logger.debug("""def 'update_new_entity' run with 'change': %s,
             'user' %s and 'user_id' %s""", change, user, user_id)
-        new_password_hash = self.password_service.get_password_hash(
+        new_password_hash = await self.password_service.hash(
             change.new_password
         )
         new_entity = UserCreate(
@@ -417,7 +526,7 @@ class AuthService(AbstractService):
             HTTPException: _description_
         """
         logger.debug("def 'check_user_in_db' run with %s", user_id)
-        if len(await self.token_repository.find({"user_id": user_id})) == 0:
+        if not await self.token_repository.exists({"user_id": user_id}):
             logger.error("Unauthorized action, user %s not found", user_id)
             raise HTTPException(
                 status_code=HTTPStatus.UNAUTHORIZED,
@@ -425,17 +534,25 @@ class AuthService(AbstractService):
             )
         logger.info("%s has been found in database", user_id)
 
-    async def issue_access_token(self, user_id) -> str:
+    async def issue_access_token(
+        self, user_id, permissions: Optional[list[str]] = None
+    ) -> str:
         """Issue access_token for user with his scope
 
         Args:
             user_id (str|UUID): user identifier
+            permissions (list[str] | None): already loaded permissions
 
         Returns:
             str: new access token
         """
         logger.debug("def 'issue_access_token' run with %s", user_id)
-        scope = {"scope": await self.get_permissions(user_id)}
+        if permissions is None:
+            permissions = await self.get_permissions(user_id)
+        scope = {
+            "scope": permissions,
+            ISSUED_AT_MS_CLAIM: time.time_ns() // 1_000_000,
+        }
         access_token = await self.Authorize.create_access_token(
             subject=str(user_id),
             user_claims=scope,
@@ -444,17 +561,25 @@ class AuthService(AbstractService):
         logger.info("access token has been created for %s", user_id)
         return access_token
 
-    async def issue_refresh_token(self, user_id) -> str:
+    async def issue_refresh_token(
+        self, user_id, permissions: Optional[list[str]] = None
+    ) -> str:
         """Issue refresh_token for user with his scope
 
         Args:
             user_id (str|UUID): user identifier
+            permissions (list[str] | None): already loaded permissions
 
         Returns:
             str: new refresh token
         """
         logger.debug("def 'issue_refresh_token' run with %s", user_id)
-        access = {"access": await self.get_permissions(user_id)}
+        if permissions is None:
+            permissions = await self.get_permissions(user_id)
+        access = {
+            "access": permissions,
+            ISSUED_AT_MS_CLAIM: time.time_ns() // 1_000_000,
+        }
         refresh_token = await self.Authorize.create_refresh_token(
             subject=str(user_id),
             user_claims=access,
@@ -463,21 +588,30 @@ class AuthService(AbstractService):
         logger.info("refresh token has been created for %s", user_id)
         return refresh_token
 
-    async def get_user_by_login(self, login: Login) -> User:
-        """Get user (Base) from db if login and password is correct
+    async def get_user_by_login(self, login: Login) -> Row:
+        """Get user id and password hash from db if login and password
+        is correct
 
         Args:
             login (Login): model include login and password fields
 
         Returns:
-            User: Model User
+            Row: row with id and password of the user
         """
         logger.debug("def 'get_user_by_login' run with %s", login)
-        user = await self.user_repository.find({"login": login.login})
+        # для логина нужны только id и хеш пароля
+        user = await self.user_repository.find(
+            {"login": login.login}, columns=["id", "password"]
+        )
         # Сравнить
-        if len(user) == 0 or not self.password_service.verify_password(
-            login.password, user[0].password
-        ):
+        verified, new_hash = False, None
+        if len(user) != 0:
+            (
+                verified, new_hash
+            ) = await self.password_service.verify_and_update(
+                login.password, user[0].password
+            )
+        if not verified:
             logger.error("""Unauthorized action, incorrect username or password
                 for input "%s" login """, login.login)
             raise HTTPException(
@@ -485,9 +619,29 @@ class AuthService(AbstractService):
                 detail="Incorrect username or password",
             )
         logger.info("%s has been received from the database", user[0].id)
+        if new_hash:
+            await self.rehash_password(user[0].id, new_hash)
         # Получить первый элемент из списка
         return user[0]
 
+    async def rehash_password(self, user_id, new_hash: str) -> None:
+        """Store password hash made with the current scheme and cost.
+        Failure is not fatal for login, old hash stays valid.
+
+        Args:
+            user_id (str|UUID): user identifier
+            new_hash (str): new password hash
+        """
+        logger.debug("def 'rehash_password' run with %s", user_id)
+        try:
+            await self.user_repository.update(
+                entity_id=user_id, new_entity=User(password=new_hash)
+            )
+        except SQLAlchemyError:
+            logger.exception("password rehash failed for %s", user_id)
+            return
+        logger.info("password hash has been upgraded for %s", user_id)
+
     async def issue_access_and_refresh_token(
             self, user_id,
             ) -> Tuple[str, str]:
@@ -500,8 +654,9 @@ class AuthService(AbstractService):
             Tuple[str, str]: access and refresh token
         """
         logger.debug("def 'issue_access_and_refresh_token' run with %s", user_id)
-        access_token = await self.issue_access_token(user_id)
-        refresh_token = await self.issue_refresh_token(user_id)
+        permissions = await self.get_permissions(user_id)
+        access_token = await self.issue_access_token(user_id, permissions)
+        refresh_token = await self.issue_refresh_token(user_id, permissions)
         logger.info("access and refresh token has been issued for %s", user_id)
         return (access_token, refresh_token)
 
@@ -542,14 +697,17 @@ class AuthService(AbstractService):
 def get_auth_service(
     cache_repository: AbstractCache = Depends(get_cache_service),
     db_connection: AsyncEngine = Depends(get_postgres),
+    read_connection: Optional[AsyncEngine] = Depends(get_postgres_replica),
     password_service: AbstractPasswordService = Depends(get_password_service),
     authorize_service: AuthJWT = Depends(),
+    permission_cache: PermissionCache = Depends(get_permission_cache),
 ) -> AuthService:
     return AuthService(
         cache_repository=cache_repository,
-        user_repository=UserDB(db_connection),
-        user_history=UserHistoryDB(db_connection),
+        user_repository=UserDB(db_connection, read_connection),
+        user_history=UserHistoryDB(db_connection, read_connection),
         token_repository=RefreshTokenDB(db_connection),
         password_service=password_service,
         authorize_service=authorize_service,
+        permission_cache=permission_cache,
     )
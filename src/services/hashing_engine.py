@@ -0,0 +1,120 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from core.get_logger import logger
+from utils.limiter import ConcurrencyLimiter
+from utils.metrics import metrics
+
+
+def _timed_call(func: Callable, *args) -> tuple[float, Any]:
+    """Run func in the pool and return the moment it was started.
+
+    time.monotonic is system-wide on Linux, so the value is comparable
+    between the event loop and pool processes.
+    """
+    started_at = time.monotonic()
+    return started_at, func(*args)
+
+
+class HashingEngine:
+    """Runs CPU-bound password hashing outside the event loop.
+
+    Args:
+        executor (Executor): thread or process pool doing the work
+        size (int): number of pool workers
+        limiter (ConcurrencyLimiter | None): admission control in front
+            of the pool
+    """
+
+    def __init__(
+        self,
+        executor: Executor,
+        size: int,
+        limiter: Optional[ConcurrencyLimiter] = None,
+    ) -> None:
+        self.executor = executor
+        self.size = size
+        self.limiter = limiter
+        self.is_process_pool = isinstance(executor, ProcessPoolExecutor)
+        self._queued = 0
+
+    @classmethod
+    def create(
+        cls,
+        kind: str,
+        size: int,
+        limiter: Optional[ConcurrencyLimiter] = None,
+    ) -> "HashingEngine":
+        """Create engine with thread or process pool
+
+        Args:
+            kind (str): "thread" or "process"
+            size (int): number of pool workers
+            limiter (ConcurrencyLimiter | None): admission control
+
+        Returns:
+            HashingEngine: new engine
+        """
+        if kind == "process":
+            executor = ProcessPoolExecutor(max_workers=size)
+        elif kind == "thread":
+            executor = ThreadPoolExecutor(
+                max_workers=size, thread_name_prefix="hashing"
+            )
+        else:
+            raise ValueError("Unknown hashing pool kind {}".format(kind))
+        logger.info(
+            "[HashingEngine][create] - %s pool with %s workers", kind, size
+        )
+        return cls(executor, size, limiter)
+
+    async def run(
+        self, func: Callable, *args, labels: Optional[dict] = None
+    ) -> Any:
+        """Run func(*args) in the pool without blocking the event loop
+
+        Args:
+            func (Callable): picklable callable for process pool
+            labels (dict | None): extra labels of the run time histogram
+
+        Returns:
+            Any: result of func
+
+        Raises:
+            ServiceOverloadedError: if the limiter sheds the call
+        """
+        if self.limiter is None:
+            return await self._run(func, args, labels or {})
+        async with self.limiter:
+            return await self._run(func, args, labels or {})
+
+    async def _run(self, func: Callable, args: tuple, labels: dict) -> Any:
+        loop = asyncio.get_running_loop()
+        submitted_at = time.monotonic()
+        self._set_queued(self._queued + 1)
+        try:
+            started_at, result = await loop.run_in_executor(
+                self.executor, _timed_call, func, *args
+            )
+        finally:
+            self._set_queued(self._queued - 1)
+        finished_at = time.monotonic()
+
+        metrics.inc("hash_tasks_total")
+        metrics.observe("hash_wait_seconds", started_at - submitted_at)
+        metrics.observe(
+            "hash_run_seconds", finished_at - started_at, **labels
+        )
+        return result
+
+    def _set_queued(self, value: int) -> None:
+        # задачи, отправленные в пул и еще не завершенные;
+        # все, что выше size, ждет свободного воркера
+        self._queued = value
+        metrics.set("hash_pool_in_flight", value)
+        metrics.set("hash_pool_queue_depth", max(value - self.size, 0))
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
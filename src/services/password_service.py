@@ -1,14 +1,34 @@
 from functools import lru_cache
+from typing import Optional
 
 from fastapi import Depends
+from passlib.context import CryptContext
 
+from db.hashing import get_hashing_engine
 from db.pwd_context import get_pwd_context
 from services.abstract_password_services import AbstractPasswordService
+from services.hashing_engine import HashingEngine
+
+
+@lru_cache
+def _load_context(config: str) -> CryptContext:
+    return CryptContext.from_string(config)
+
+
+def _context_call(config: str, method: str, *args):
+    """Call CryptContext method inside a pool process.
+
+    CryptContext itself is not sent to the process, it is rebuilt once
+    per process from its string config.
+    """
+    return getattr(_load_context(config), method)(*args)
 
 
 class PasslibPasswordService(AbstractPasswordService):
-    def __init__(self, context):
+    def __init__(self, context, engine: Optional[HashingEngine] = None):
         self.context = context
+        self.engine = engine
+        self._config = context.to_string()
 
     def verify_password(self, plain_password, hashed_password):
         return self.context.verify(plain_password, hashed_password)
@@ -16,8 +36,46 @@ class PasslibPasswordService(AbstractPasswordService):
     def get_password_hash(self, password):
         return self.context.hash(password)
 
+    async def verify(self, plain_password, hashed_password):
+        return await self._offload(
+            "verify",
+            self._scheme(hashed_password),
+            plain_password,
+            hashed_password,
+        )
+
+    async def hash(self, password):
+        return await self._offload(
+            "hash", self.context.default_scheme(), password
+        )
+
+    async def verify_and_update(self, plain_password, hashed_password):
+        return await self._offload(
+            "verify_and_update",
+            self._scheme(hashed_password),
+            plain_password,
+            hashed_password,
+        )
+
+    def _scheme(self, hashed_password: str) -> str:
+        return self.context.identify(hashed_password) or "unknown"
+
+    async def _offload(self, method: str, scheme: str, *args):
+        # без пула (например в cli) хешируем прямо в текущем потоке
+        if self.engine is None:
+            return getattr(self.context, method)(*args)
+        labels = {"op": method, "scheme": scheme}
+        if self.engine.is_process_pool:
+            return await self.engine.run(
+                _context_call, self._config, method, *args, labels=labels
+            )
+        return await self.engine.run(
+            getattr(self.context, method), *args, labels=labels
+        )
+
 
 @lru_cache
 def get_password_service(
-        context=Depends(get_pwd_context)) -> AbstractPasswordService:
-    return PasslibPasswordService(context=context)
+        context=Depends(get_pwd_context),
+        engine=Depends(get_hashing_engine)) -> AbstractPasswordService:
+    return PasslibPasswordService(context=context, engine=engine)
@@ -1,14 +1,23 @@
+import asyncio
 from functools import lru_cache
+from typing import Optional
 from uuid import UUID
 
 from fastapi import Depends
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncEngine
 
-from db.postgres import get_postgres
+from db.postgres import get_postgres, get_postgres_replica
 from core.get_logger import logger
+from repositories.abstract_cache import AbstractCache
 from repositories.abstract_db import AbstractDB
+from repositories.permission_cache import PermissionCache, get_permission_cache
+from repositories.role_catalog import RoleCatalog, role_catalog
+from repositories.redis_cache import get_cache_service
 from repositories.role_db import RoleDB
+from repositories.unit_of_work import unit_of_work
 from repositories.user_db import UserDB
+from utils.db import UNIQUE_VIOLATION, get_sqlstate
 from utils.exceptions import (
     UserRoleActionError,
     NotFoundError,
@@ -18,18 +27,33 @@ from utils.exceptions import (
 from schemas.role import RoleModel, RoleResponseModel, RoleUpdateModel, RoleDeleteMessage
 from schemas.user import UserRoleAction
 
+# Отзывов токенов, одновременно отправляемых в Redis
+REVOKE_BATCH_SIZE = 100
+
 
 class RoleService:
     def __init__(
         self,
         role_repository: RoleDB,
         user_repository: UserDB,
+        cache_repository: AbstractCache,
+        permission_cache: PermissionCache,
+        role_catalog: RoleCatalog,
     ) -> None:
         self.role_repository = role_repository
         self.user_repository = user_repository
+        self.cache_repository = cache_repository
+        self.permission_cache = permission_cache
+        self.role_catalog = role_catalog
 
     async def get(self, id: UUID) -> RoleResponseModel:
         logger.debug("[RoleService][get] - trying to get role by id %s", id)
+        role = self.role_catalog.get(id)
+        if role is not None:
+            logger.info("[RoleService][get] - role found in catalog")
+            return role
+        # промах каталога: роль могла появиться на другом узле
+        # раньше, чем пришло уведомление
         result = await self.role_repository.get(id)
         if not result:
             logger.debug("[RoleService][get] - role %s not found", id)
@@ -38,7 +62,16 @@ class RoleService:
         return RoleResponseModel.from_orm(result[0])
 
     async def get_all(self) -> list[RoleResponseModel]:
-        query_result = await self.role_repository.get_all()
+        result = self.role_catalog.all()
+        if result:
+            logger.info(
+                "[RoleService][get_all] - %s roles found in catalog",
+                len(result),
+            )
+            return result
+        query_result = await self.role_repository.get_all(
+            columns=list(RoleResponseModel.__fields__)
+        )
         logger.debug("[RoleService][get_all] - Trying to get all roles")
         result = [RoleResponseModel.from_orm(item) for item in query_result]
         if not result:
@@ -60,6 +93,10 @@ class RoleService:
         logger.debug(
             "[RoleService][find] - trying to find role by name %s", name
         )
+        role = self.role_catalog.find(name)
+        if role is not None:
+            logger.info("[RoleService][find] - role found in catalog")
+            return role
         result = await self.role_repository.find({"name": name})
 
         if not result:
@@ -74,9 +111,13 @@ class RoleService:
             "[RoleService][add] - trying to add role %s", new_role.name
         )
 
-        result = await self.find(new_role.name)
+        # одна вставка вместо find + insert: уникальность имени проверяет
+        # сама база, и между проверкой и вставкой нет гонки
+        result = await self.role_repository.upsert(
+            [new_role], conflict_fields=["name"]
+        )
 
-        if result:
+        if not result:
             logger.debug(
                 "[RoleService][add] - role %s already exist", new_role.name
             )
@@ -84,33 +125,62 @@ class RoleService:
                 "Role {} already exist.".format(new_role.name)
             )
 
-        result = await self.role_repository.insert(new_role)
-
-        result = result[0]
-
+        role = RoleResponseModel.from_orm(result[0])
+        # уведомление придет позже, свою запись видим сразу
+        self.role_catalog.put(role)
         logger.info("[RoleService][add] - new role added")
-        return RoleResponseModel.from_orm(result)
+        return role
 
     async def update(
         self, id: UUID, updated_role: RoleUpdateModel
     ) -> RoleResponseModel:
-        await self.get(id)
         logger.debug(
             "[RoleService][update] - trying to update role %s",
             updated_role.name,
         )
-        query_result = await self.role_repository.update(id, updated_role)
+        try:
+            query_result = await self.role_repository.update(id, updated_role)
+        except IntegrityError as error:
+            if get_sqlstate(error) != UNIQUE_VIOLATION:
+                raise
+            logger.debug(
+                "[RoleService][update] - role %s already exist",
+                updated_role.name,
+            )
+            raise AlreadyExistError(
+                "Role {} already exist.".format(updated_role.name)
+            )
+
+        if not query_result:
+            logger.debug("[RoleService][update] - role %s not found", id)
+            raise NotFoundError("Role {} not found.".format(id))
+        # права роли могли измениться у всех, кому она назначена
+        await self._invalidate_permissions(
+            await self.user_repository.get_role_holders(id)
+        )
+        role = RoleResponseModel.from_orm(query_result[0])
+        self.role_catalog.put(role)
         logger.info("[RoleService][update] - role updated")
-        return RoleResponseModel.from_orm(query_result[0])
+        return role
 
     async def delete(self, id: UUID) -> RoleDeleteMessage:
-        await self.get(id)
         logger.debug(
             "[RoleService][delete] - trying to delete role id %s",
             id,
         )
-        await self.role_repository.delete(id)
+        # назначения удаляются каскадом, поэтому владельцев роли
+        # читаем до удаления в той же транзакции
+        async with unit_of_work(self.role_repository.connection):
+            holders = await self.user_repository.get_role_holders(id)
+            query_result = await self.role_repository.delete(id)
 
+        if not query_result:
+            logger.debug("[RoleService][delete] - role %s not found", id)
+            raise NotFoundError("Role {} not found.".format(id))
+        self.role_catalog.remove(id)
+        await self._invalidate_permissions(holders)
+        # права удаленной роли записаны в scope уже выданных токенов
+        await self._revoke_tokens(holders)
         logger.info("[RoleService][delete] - role deleted")
         return RoleDeleteMessage(msg="Role {} deleted successfully".format(id))
 
@@ -132,8 +202,7 @@ class RoleService:
             entity_id,
             repository.table,
         )
-        entity = await repository.get(entity_id)
-        if not entity:
+        if not await repository.exists({"id": entity_id}):
             logger.debug(
                 "[RoleService][_check_entity_exist] - "
                 "entity %s not found in repository %s",
@@ -148,34 +217,73 @@ class RoleService:
             repository.table,
         )
 
+    async def _invalidate_permissions(self, user_ids: list[UUID]) -> None:
+        logger.debug(
+            "[RoleService][_invalidate_permissions] - "
+            "drop cached permissions of %s users",
+            len(user_ids),
+        )
+        await self.permission_cache.invalidate(
+            str(user_id) for user_id in user_ids
+        )
+
+    async def _revoke_tokens(self, user_ids: list[UUID]) -> None:
+        logger.debug(
+            "[RoleService][_revoke_tokens] - revoke tokens of %s users",
+            len(user_ids),
+        )
+        for start in range(0, len(user_ids), REVOKE_BATCH_SIZE):
+            batch = user_ids[start:start + REVOKE_BATCH_SIZE]
+            await asyncio.gather(
+                *(
+                    self.cache_repository.revoke_user_tokens(str(user_id))
+                    for user_id in batch
+                )
+            )
+
+    async def _check_user_and_role_exist(self, item: UserRoleAction) -> None:
+        await self._check_entity_exist(item.user_id, self.user_repository)
+        if self.role_catalog.get(item.role_id) is None:
+            await self._check_entity_exist(
+                item.role_id, self.role_repository
+            )
+
     async def add_role_to_user(
         self, item: UserRoleAction
     ) -> list[RoleResponseModel]:
-        await self._check_entity_exist(item.user_id, self.user_repository)
-        await self._check_entity_exist(item.role_id, self.role_repository)
+        logger.debug(
+            "[RoleService][add_role_to_user] - "
+            "trying to add role %s to user %s",
+            item.role_id,
+            item.user_id,
+        )
         try:
-            logger.debug(
-                "[RoleService][add_role_to_user] - "
-                "trying to add role %s to user %s",
-                item.user_id,
-                item.role_id,
-            )
-            await self.user_repository.add_role_to_user(
-                item.user_id, item.role_id
-            )
-        except Exception:
+            # вставка и чтение ролей на одном соединении в одной транзакции
+            async with unit_of_work(self.user_repository.connection):
+                await self.user_repository.add_role_to_user(
+                    item.user_id, item.role_id
+                )
+                result = await self.user_repository.get_user_roles(
+                    item.user_id
+                )
+        except NotFoundError:
+            # внешний ключ не сказал, чего именно нет, а проверки
+            # существования нужны только при ошибке
+            await self._check_user_and_role_exist(item)
+            raise
+        except UserRoleActionError:
             logger.debug(
                 "[RoleService][add_role_to_user] - "
                 "failed to add role %s to user %s."
                 "Possible role assigned to user.",
-                item.user_id,
                 item.role_id,
+                item.user_id,
             )
             raise UserRoleActionError(
                 "Failed add role to user. "
                 "Possible role has already been added."
             )
-        result = await self.user_repository.get_user_roles(item.user_id)
+        await self._invalidate_permissions([item.user_id])
         logger.info(
             "[RoleService][add_role_to_user] - "
             "get all assigned to user roles."
@@ -187,56 +295,37 @@ class RoleService:
     async def delete_role_from_user(
         self, item: UserRoleAction
     ) -> list[RoleResponseModel]:
-        await self._check_entity_exist(item.user_id, self.user_repository)
-        await self._check_entity_exist(item.role_id, self.role_repository)
-
         logger.debug(
             "[RoleService][delete_role_from_user] - "
-            "get all assigned to user %s roles.",
+            "trying to delete role %s from user %s",
+            item.role_id,
             item.user_id,
         )
-        user_roles = await self.user_repository.get_user_roles(item.user_id)
-        roles_ids = [UUID(role["id"]) for role in user_roles]
-
-        if item.role_id not in roles_ids:
-            logger.debug(
-                "[RoleService][delete_role_from_user] - "
-                "role %s not assigned to user %s.",
-                item.user_id,
-                item.role_id,
-            )
-            raise RoleNotAssigned(
-                "Role {} not assigned to user {}.".format(
-                    item.role_id, item.user_id
-                )
-            )
-
         try:
+            async with unit_of_work(self.user_repository.connection):
+                await self.user_repository.delete_role_from_user(
+                    item.user_id, item.role_id
+                )
+                result = await self.user_repository.get_user_roles(
+                    item.user_id
+                )
+        except RoleNotAssigned:
             logger.debug(
                 "[RoleService][delete_role_from_user] - "
-                "trying to delete role %s from user %s",
-                item.user_id,
+                "role %s not assigned to user %s.",
                 item.role_id,
-            )
-            await self.user_repository.delete_role_from_user(
-                item.user_id, item.role_id
-            )
-        except UserRoleActionError:
-            logger.debug(
-                "[RoleService][delete_role_from_user] - "
-                "failed to delete role %s from user %s.",
                 item.user_id,
-                item.role_id,
-            )
-            raise UserRoleActionError(
-                "Failed to delete role {} "
-                "from user {}. ".format(item.role_id, item.user_id)
             )
+            # пустое удаление: отличаем 404 от неназначенной роли
+            await self._check_user_and_role_exist(item)
+            raise
+        await self._invalidate_permissions([item.user_id])
+        # права роли записаны в scope уже выданных токенов
+        await self.cache_repository.revoke_user_tokens(str(item.user_id))
         logger.info(
             "[RoleService][delete_role_from_user] - "
             "get all assigned to user roles."
         )
-        result = await self.user_repository.get_user_roles(item.user_id)
         roles = [RoleResponseModel(**role) for role in result]
         logger.info(
             "[RoleService][delete_role_from_user] - role deleted from user."
@@ -245,8 +334,19 @@ class RoleService:
 
 
 @lru_cache
-def get_role_service(db: AsyncEngine = Depends(get_postgres)) -> RoleService:
-    role_repository = RoleDB(db)
-    user_repository = UserDB(db)
-    role_srv = RoleService(role_repository, user_repository)
+def get_role_service(
+    db: AsyncEngine = Depends(get_postgres),
+    read_db: Optional[AsyncEngine] = Depends(get_postgres_replica),
+    cache_repository: AbstractCache = Depends(get_cache_service),
+    permission_cache: PermissionCache = Depends(get_permission_cache),
+) -> RoleService:
+    role_repository = RoleDB(db, read_db)
+    user_repository = UserDB(db, read_db)
+    role_srv = RoleService(
+        role_repository,
+        user_repository,
+        cache_repository,
+        permission_cache,
+        role_catalog,
+    )
     return role_srv
@@ -1,10 +1,16 @@
+import asyncio
 from functools import lru_cache
+from itertools import islice
+from typing import Iterable, Optional
+from uuid import UUID
 from fastapi import Depends
 
 from sqlalchemy.ext.asyncio import AsyncEngine
 
-from db.postgres import get_postgres
+from db.postgres import get_postgres, get_postgres_replica
+from core.config import postgres_settings
 from core.get_logger import logger
+from repositories.unit_of_work import unit_of_work
 from repositories.user_db import UserDB
 from services.abstract_password_services import AbstractPasswordService
 from services.password_service import get_password_service
@@ -45,9 +51,7 @@ class UserService:
             "[UserService][add] - trying to add user %s",
             user_create.login,
         )
-        password = self.password_service.get_password_hash(
-            user_create.password
-        )
+        password = await self.password_service.hash(user_create.password)
         user_create.password = password
         result = await self.user_repository.insert(entity=user_create)
         if not result:
@@ -59,12 +63,78 @@ class UserService:
         logger.info("[UserService][add] - user added")
         return UserSchema.from_orm(result[0])
 
+    async def add_many(
+        self,
+        users: Iterable[UserCreate],
+        batch_size: Optional[int] = None,
+        role_id: Optional[UUID] = None,
+    ) -> list[UserSchema]:
+        """Add users with multi-row INSERT, logins which already
+        exist are skipped. Users are hashed and inserted batch by
+        batch, every batch with its role links in one transaction
+
+        Args:
+            users (Iterable[UserCreate]): new users with plain passwords,
+                read lazily
+            batch_size (int | None): users per batch,
+                POSTGRES_BULK_BATCH_SIZE if None
+            role_id (UUID | None): role assigned to added users
+
+        Returns:
+            list[UserSchema]: added users
+        """
+        if batch_size is None:
+            batch_size = postgres_settings.POSTGRES_BULK_BATCH_SIZE
+        users = iter(users)
+        added: list[UserSchema] = []
+        total = 0
+        while batch := list(islice(users, batch_size)):
+            total += len(batch)
+            added.extend(await self._add_batch(batch, batch_size, role_id))
+            logger.debug(
+                "[UserService][add_many] - %s of %s users added",
+                len(added),
+                total,
+            )
+        logger.info(
+            "[UserService][add_many] - %s of %s users added",
+            len(added),
+            total,
+        )
+        return added
+
+    async def _add_batch(
+        self,
+        users: list[UserCreate],
+        batch_size: int,
+        role_id: Optional[UUID],
+    ) -> list[UserSchema]:
+        # пароли хешируются параллельно, насколько позволяет пул
+        passwords = await asyncio.gather(
+            *(self.password_service.hash(user.password) for user in users)
+        )
+        for user, password in zip(users, passwords):
+            user.password = password
+        # пользователи без роли не фиксируются: при повторном импорте
+        # их логины пропускаются и роль они бы уже не получили
+        async with unit_of_work(self.user_repository.connection):
+            # уникальность логина проверяет база, без find на каждого
+            result = await self.user_repository.upsert(
+                users, conflict_fields=["login"], batch_size=batch_size
+            )
+            if role_id is not None:
+                await self.user_repository.add_roles_to_users(
+                    [(user.id, role_id) for user in result], batch_size
+                )
+        return [UserSchema.from_orm(user) for user in result]
+
 
 @lru_cache
 def get_user_service(
     db: AsyncEngine = Depends(get_postgres),
+    read_db: Optional[AsyncEngine] = Depends(get_postgres_replica),
     pass_service: AbstractPasswordService = Depends(get_password_service),
 ) -> UserService:
-    user_repository = UserDB(db)
+    user_repository = UserDB(db, read_db)
     pass_service = pass_service
     return UserService(user_repository, pass_service)
@@ -0,0 +1,163 @@
+import hashlib
+import math
+import time
+from typing import Iterable, Optional
+
+from utils.metrics import metrics
+
+
+class BloomFilter:
+    """Bloom filter of strings with a fixed capacity.
+
+    No false negatives; false positives grow above error_rate
+    once more than capacity keys are added.
+
+    Args:
+        capacity (int): expected number of keys
+        error_rate (float): false positive rate at capacity
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        capacity = max(capacity, 1)
+        self.size = math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2
+        )
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str) -> Iterable[int]:
+        # двойное хеширование: k позиций из двух половин одного дайджеста
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for index in range(self.hashes):
+            yield (first + index * second) % self.size
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+    @property
+    def bytes(self) -> int:
+        return len(self._bits)
+
+
+class ExpiringBloomFilter:
+    """Bloom filters of keys with expiry, one filter per time window.
+
+    A key goes to the filter of the window its expiry falls into,
+    the filter is dropped as soon as the window is over, so memory
+    is bounded by the keys which have not expired yet.
+
+    Until the first replace() the filter is not ready and knows
+    nothing, callers have to ask the source of truth.
+
+    Args:
+        name (str): filter name used in metrics
+        window (float): seconds of expiry covered by one filter
+        capacity (int): expected keys in one filter
+        error_rate (float): false positive rate of one filter
+    """
+
+    def __init__(
+        self, name: str, window: float, capacity: int, error_rate: float
+    ) -> None:
+        self.name = name
+        self.window = window
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.ready = False
+        self._filters: dict[int, BloomFilter] = {}
+
+    def _add(
+        self,
+        filters: dict[int, BloomFilter],
+        key: str,
+        expires_at: float,
+        now: float,
+    ) -> None:
+        if expires_at <= now:
+            return
+        window = int(expires_at // self.window)
+        bloom = filters.get(window)
+        if bloom is None:
+            bloom = filters[window] = BloomFilter(
+                self.capacity, self.error_rate
+            )
+        bloom.add(key)
+
+    def add(self, key: str, expires_at: float) -> None:
+        """Add the key until expires_at
+
+        Args:
+            key (str): key
+            expires_at (float): unix time after which the key
+                may be forgotten
+        """
+        self._add(self._filters, key, expires_at, time.time())
+        self._report()
+
+    def might_contain(self, key: str) -> bool:
+        """False only if the key was surely not added
+
+        Args:
+            key (str): key
+
+        Returns:
+            bool: the key is probably in the filter
+        """
+        self._drop_expired()
+        return any(key in bloom for bloom in self._filters.values())
+
+    def replace(
+        self, items: Iterable[tuple[str, float]], now: Optional[float] = None
+    ) -> None:
+        """Rebuild filters from all live keys and mark the filter ready
+
+        Args:
+            items (Iterable[tuple[str, float]]): keys and their expiry
+            now (float | None): current unix time, time.time() if None
+        """
+        now = time.time() if now is None else now
+        filters: dict[int, BloomFilter] = {}
+        for key, expires_at in items:
+            self._add(filters, key, expires_at, now)
+        self._filters = filters
+        self.ready = True
+        self._report()
+
+    def reset(self) -> None:
+        self._filters = {}
+        self.ready = False
+        self._report()
+
+    def _drop_expired(self) -> None:
+        # окно закончилось - все ключи в нем истекли
+        current = int(time.time() // self.window)
+        expired = [window for window in self._filters if window < current]
+        if expired:
+            for window in expired:
+                del self._filters[window]
+            self._report()
+
+    def _report(self) -> None:
+        filters = list(self._filters.values())
+        metrics.set(
+            "bloom_filter_keys",
+            sum(bloom.count for bloom in filters),
+            filter=self.name,
+        )
+        metrics.set(
+            "bloom_filter_bytes",
+            sum(bloom.bytes for bloom in filters),
+            filter=self.name,
+        )
+        metrics.set("bloom_filter_windows", len(filters), filter=self.name)
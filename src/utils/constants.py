@@ -3,3 +3,11 @@ from enum import Enum
 
 class AdminRole(Enum):
     SUPER_ADMIN = "superadmin"
+
+
+# Время выпуска токена в миллисекундах. Стандартный iat целый, и по нему
+# нельзя отличить токен, выпущенный в ту же секунду после отзыва
+ISSUED_AT_MS_CLAIM = "iat_ms"
+
+# Размер страницы истории входов по умолчанию при keyset-пагинации
+HISTORY_PAGE_SIZE = 50
@@ -1,3 +1,35 @@
+from typing import Optional
+from uuid import uuid4
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from core.config import PostgresSettings
+from utils.pool_metrics import InstrumentedQueuePool, pool_monitor
+from utils.sql_metrics import StatementTimer
+
+
+# SQLSTATE ошибок Postgres, которые сервисы переводят в 404 и 409
+FOREIGN_KEY_VIOLATION = "23503"
+UNIQUE_VIOLATION = "23505"
+
+
+def get_sqlstate(error: DBAPIError) -> Optional[str]:
+    """SQLSTATE code of the database error
+
+    Args:
+        error (DBAPIError): error raised by sqlalchemy
+
+    Returns:
+        str | None: five-character code or None if the driver
+            did not report it
+    """
+    return getattr(error.orig, "sqlstate", None) or getattr(
+        error.orig, "pgcode", None
+    )
+
+
 def construct_db_url(
     user: str,
     password: str,
@@ -13,3 +45,131 @@ def construct_db_url(
     return "".join(
         [driver, user, ":", password, "@", host, ":", str(port), "/", database]
     )
+
+
+def _prepared_statement_name() -> str:
+    # уникальные имена, чтобы не пересечься с чужими statements
+    # на серверном соединении PgBouncer
+    return "__asyncpg_{}__".format(uuid4())
+
+
+def split_connection_budget(
+    max_connections: int, workers: int, reserved: int = 0
+) -> tuple[int, int]:
+    """Split connections budget of the host between gunicorn workers
+
+    Args:
+        max_connections (int): connections allowed for the whole host
+        workers (int): number of gunicorn workers
+        reserved (int): connections kept for migrations, cli, etc.
+
+    Returns:
+        tuple[int, int]: pool_size and max_overflow of one worker
+    """
+    per_worker = max((max_connections - reserved) // max(workers, 1), 1)
+    # четверть бюджета воркера оставляем на пики через overflow
+    max_overflow = per_worker // 4
+    pool_size = per_worker - max_overflow
+    return pool_size, max_overflow
+
+
+def parse_replica_host(replica: str, default_port: int) -> tuple[str, int]:
+    """Split "host" or "host:port" of a replica
+
+    Args:
+        replica (str): replica address
+        default_port (int): port used if it is not given
+
+    Returns:
+        tuple[str, int]: host and port
+    """
+    host, _, port = replica.partition(":")
+    return host, int(port) if port else default_port
+
+
+def create_engine_from_settings(
+    settings: PostgresSettings,
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+) -> AsyncEngine:
+    """Create async engine with pool and driver options from settings
+
+    Args:
+        settings (PostgresSettings): postgres settings
+        host (str | None): server host, POSTGRES_HOST if None
+        port (int | None): server port, POSTGRES_PORT if None
+
+    Returns:
+        AsyncEngine: configured engine
+    """
+    host = host or settings.POSTGRES_HOST
+    db_url = construct_db_url(
+        user=settings.POSTGRES_USER,
+        password=settings.POSTGRES_PASSWORD,
+        host=host,
+        port=port or settings.POSTGRES_PORT,
+        database=settings.POSTGRES_DATABASE,
+    )
+
+    if settings.POSTGRES_PGBOUNCER:
+        # PgBouncer сам держит пул, а prepared statements не переживают
+        # смену серверного соединения между транзакциями
+        engine = create_async_engine(
+            db_url,
+            echo=settings.POSTGRES_ECHO,
+            poolclass=NullPool,
+            connect_args={
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": _prepared_statement_name,
+            },
+        )
+    else:
+        if settings.POSTGRES_MAX_CONNECTIONS is not None:
+            pool_size, max_overflow = split_connection_budget(
+                settings.POSTGRES_MAX_CONNECTIONS,
+                settings.GUNICORN_WORKERS,
+                settings.POSTGRES_RESERVED_CONNECTIONS,
+            )
+        else:
+            pool_size = settings.POSTGRES_POOL_SIZE
+            max_overflow = settings.POSTGRES_MAX_OVERFLOW
+
+        engine = create_async_engine(
+            db_url,
+            echo=settings.POSTGRES_ECHO,
+            poolclass=InstrumentedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=settings.POSTGRES_POOL_TIMEOUT,
+            pool_recycle=settings.POSTGRES_POOL_RECYCLE,
+            pool_pre_ping=settings.POSTGRES_POOL_PRE_PING,
+            connect_args={
+                "prepared_statement_cache_size": (
+                    settings.POSTGRES_STATEMENT_CACHE_SIZE
+                ),
+            },
+        )
+
+    StatementTimer(
+        slow_query_ms=settings.POSTGRES_SLOW_QUERY_MS,
+        explain_slow=settings.POSTGRES_EXPLAIN_SLOW_QUERIES,
+    ).attach(engine)
+    pool_monitor.attach(engine, label=host)
+    return engine
+
+
+def create_replica_engines(settings: PostgresSettings) -> list[AsyncEngine]:
+    """Create engines of read-only replicas from settings
+
+    Args:
+        settings (PostgresSettings): postgres settings
+
+    Returns:
+        list[AsyncEngine]: one engine per replica, empty if there are none
+    """
+    engines = []
+    for replica in settings.POSTGRES_REPLICA_HOSTS:
+        host, port = parse_replica_host(replica, settings.POSTGRES_PORT)
+        engines.append(create_engine_from_settings(settings, host, port))
+    return engines
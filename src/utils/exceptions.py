@@ -50,3 +50,16 @@ class UnauthorisedException(Exception):
     ) -> None:
         self.message = message
         super().__init__(self.message)
+
+
+class ServiceOverloadedError(Exception):
+    """Exception raised when request is shed by admission control"""
+
+    def __init__(
+        self,
+        message: str = "Service overloaded, retry later.",
+        retry_after: int = 1,
+    ) -> None:
+        self.message = message
+        self.retry_after = retry_after
+        super().__init__(self.message)
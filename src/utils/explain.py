@@ -0,0 +1,187 @@
+import json
+from typing import Iterator, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from utils.partitions import partition_month
+
+# Префикс логинов и ролей, созданных для проверки
+SEED_PREFIX = "check_indexes_"
+SEED_ROLES = 50
+
+
+class HotQuery(NamedTuple):
+    name: str
+    table: str
+    sql: str
+
+
+# Запросы горячих путей, параметры подставляются из существующих строк
+HOT_QUERIES = [
+    HotQuery(
+        "login",
+        "user",
+        'SELECT id, password FROM "user" WHERE login = :login',
+    ),
+    HotQuery(
+        "history",
+        "user_history",
+        "SELECT event, created_at FROM user_history WHERE user_id = :user_id "
+        "ORDER BY created_at DESC LIMIT 50",
+    ),
+    HotQuery(
+        "history_page",
+        "user_history",
+        "SELECT event, created_at, id FROM user_history "
+        "WHERE user_id = :user_id AND (created_at, id) < (now(), :id) "
+        "ORDER BY created_at DESC, id DESC LIMIT 51",
+    ),
+    HotQuery(
+        "role_users",
+        "user_role",
+        "SELECT user_id FROM user_role WHERE role_id = :role_id",
+    ),
+    HotQuery(
+        "refresh_token_exists",
+        "refresh_token",
+        "SELECT EXISTS (SELECT 1 FROM refresh_token WHERE user_id = :user_id)",
+    ),
+]
+
+SEED_STATEMENTS = [
+    """
+    INSERT INTO "user" (id, created_at, login, password)
+    SELECT md5(random()::text || g)::uuid, now(), :prefix || g::text, 'x'
+    FROM generate_series(1, :users) g
+    """,
+    """
+    INSERT INTO role (id, created_at, name, access)
+    SELECT md5(random()::text || g)::uuid, now(), :prefix || g::text, 'x'
+    FROM generate_series(1, :roles) g
+    """,
+    """
+    WITH users AS (
+        SELECT id, row_number() OVER () AS n FROM "user"
+        WHERE login LIKE :prefix || '%'
+    )
+    INSERT INTO user_history (id, created_at, event, user_id)
+    SELECT md5(random()::text || g)::uuid,
+        now() - g * interval '1 second', 'login', users.id
+    FROM generate_series(1, :rows) g
+    JOIN users ON users.n = g % :users + 1
+    """,
+    """
+    INSERT INTO refresh_token (id, created_at, token, user_id)
+    SELECT md5(random()::text || id::text)::uuid, now(), 'x', id
+    FROM "user" WHERE login LIKE :prefix || '%'
+    """,
+    """
+    WITH users AS (
+        SELECT id, row_number() OVER () AS n FROM "user"
+        WHERE login LIKE :prefix || '%'
+    ), roles AS (
+        SELECT id, row_number() OVER () AS n FROM role
+        WHERE name LIKE :prefix || '%'
+    )
+    INSERT INTO user_role (user_id, role_id)
+    SELECT users.id, roles.id
+    FROM users JOIN roles ON roles.n = users.n % :roles + 1
+    """,
+    "ANALYZE",
+]
+
+SAMPLE_PARAMS = {
+    "login": 'SELECT login FROM "user" ORDER BY login DESC LIMIT 1',
+    "user_id": "SELECT user_id FROM user_history LIMIT 1",
+    "role_id": "SELECT role_id FROM user_role LIMIT 1",
+    # граница страницы истории - id строки, как в курсоре
+    "id": "SELECT id FROM user_history LIMIT 1",
+}
+
+
+def plan_nodes(plan: dict) -> Iterator[dict]:
+    """Walk all nodes of EXPLAIN (FORMAT JSON) plan
+
+    Args:
+        plan (dict): node of the plan
+
+    Yields:
+        dict: the node and all its children
+    """
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def _is_table_or_partition(relation: Optional[str], table: str) -> bool:
+    if relation is None:
+        return False
+    return (
+        relation in (table, "{0}_default".format(table))
+        or partition_month(table, relation) is not None
+    )
+
+
+def seq_scanned(plan: dict, table: str) -> bool:
+    """Whether the plan reads the table or its partitions
+    with a sequential scan
+
+    Args:
+        plan (dict): root node of the plan
+        table (str): name of the table
+
+    Returns:
+        bool: True if there is a Seq Scan node on the table
+    """
+    return any(
+        node["Node Type"] == "Seq Scan"
+        and _is_table_or_partition(node.get("Relation Name"), table)
+        for node in plan_nodes(plan)
+    )
+
+
+def used_indexes(plan: dict) -> list[str]:
+    return [
+        node["Index Name"] for node in plan_nodes(plan) if "Index Name" in node
+    ]
+
+
+async def seed(conn: AsyncConnection, rows: int) -> None:
+    """Fill tables with generated rows for the planner to see
+    production-like statistics, one user per 100 history rows
+
+    Args:
+        conn (AsyncConnection): connection with an open transaction
+        rows (int): number of user_history rows
+    """
+    params = {
+        "prefix": SEED_PREFIX,
+        "rows": rows,
+        "users": max(rows // 100, 1),
+        "roles": SEED_ROLES,
+    }
+    for statement in SEED_STATEMENTS:
+        await conn.execute(text(statement), params)
+
+
+async def explain(conn: AsyncConnection, query: HotQuery) -> dict:
+    """EXPLAIN of the hot query with parameters from existing rows
+
+    Args:
+        conn (AsyncConnection): database connection
+        query (HotQuery): checked query
+
+    Returns:
+        dict: root node of the plan
+    """
+    params = {}
+    for name, sample in SAMPLE_PARAMS.items():
+        if ":{}".format(name) in query.sql:
+            params[name] = await conn.scalar(text(sample))
+    result = await conn.scalar(
+        text("EXPLAIN (FORMAT JSON) " + query.sql), params
+    )
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]["Plan"]
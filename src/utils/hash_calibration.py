@@ -0,0 +1,151 @@
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional
+
+from passlib.context import CryptContext
+
+from core.config import PasswordSettings
+from utils.hashing import construct_crypt_context
+
+BENCHMARK_PASSWORD = "calibration-password"
+
+# Параметр стоимости каждой схемы и проверяемые значения
+# в порядке возрастания стоимости
+COST_CANDIDATES = {
+    "bcrypt": ("PASSWORD_BCRYPT_ROUNDS", range(4, 17)),
+    "argon2": ("PASSWORD_ARGON2_TIME_COST", range(1, 11)),
+    "scrypt": ("PASSWORD_SCRYPT_ROUNDS", range(10, 19)),
+}
+
+
+class BenchmarkResult(NamedTuple):
+    scheme: str
+    field: str
+    cost: int
+    # медиана времени одной проверки при загрузке всех ядер
+    verify_seconds: float
+    # проверок в секунду на весь хост
+    host_verifies_per_second: float
+
+
+def _verify_batch(config: str, hashed: str, iterations: int) -> list[float]:
+    context = CryptContext.from_string(config)
+    durations = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        context.verify(BENCHMARK_PASSWORD, hashed)
+        durations.append(time.perf_counter() - started_at)
+    return durations
+
+
+def benchmark_cost(
+    settings: PasswordSettings,
+    scheme: str,
+    cost: int,
+    executor: ProcessPoolExecutor,
+    processes: int,
+    iterations: int,
+) -> BenchmarkResult:
+    """Measure verify time of the scheme with given cost on all cores
+
+    Args:
+        settings (PasswordSettings): base settings for other parameters
+        scheme (str): passlib scheme name
+        cost (int): value of the scheme cost parameter
+        executor (ProcessPoolExecutor): pool with one process per core
+        processes (int): number of parallel verify loops
+        iterations (int): verifies done by each loop
+
+    Returns:
+        BenchmarkResult: measured verify time and host throughput
+    """
+    field, _ = COST_CANDIDATES[scheme]
+    candidate = settings.copy(
+        update={"PASSWORD_SCHEMES": [scheme], field: cost}
+    )
+    context = construct_crypt_context(candidate)
+    hashed = context.hash(BENCHMARK_PASSWORD)
+    config = context.to_string()
+
+    started_at = time.perf_counter()
+    futures = [
+        executor.submit(_verify_batch, config, hashed, iterations)
+        for _ in range(processes)
+    ]
+    durations = [value for future in futures for value in future.result()]
+    elapsed = time.perf_counter() - started_at
+
+    return BenchmarkResult(
+        scheme=scheme,
+        field=field,
+        cost=cost,
+        verify_seconds=statistics.median(durations),
+        host_verifies_per_second=len(durations) / elapsed,
+    )
+
+
+def calibrate_scheme(
+    settings: PasswordSettings,
+    scheme: str,
+    target_seconds: float,
+    workers: int,
+    target_logins_per_worker: Optional[float] = None,
+    iterations: int = 3,
+) -> tuple[Optional[BenchmarkResult], list[BenchmarkResult]]:
+    """Find the most expensive cost which still fits the targets.
+
+    Costs are tried from the cheapest one and the search stops at the
+    first cost slower than target_seconds.
+
+    Args:
+        settings (PasswordSettings): base settings
+        scheme (str): passlib scheme name
+        target_seconds (float): max verify time of one login
+        workers (int): gunicorn workers sharing the host
+        target_logins_per_worker (float | None): min logins per second
+            each worker has to sustain
+        iterations (int): verifies done by each process per cost
+
+    Returns:
+        tuple: chosen result (None if even the cheapest cost misses
+            the targets) and all measured results
+    """
+    processes = os.cpu_count() or 1
+    _, costs = COST_CANDIDATES[scheme]
+    chosen = None
+    results = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        # прогрев: запуск процессов и загрузка backend схемы
+        benchmark_cost(settings, scheme, costs[0], executor, processes, 1)
+        for cost in costs:
+            result = benchmark_cost(
+                settings, scheme, cost, executor, processes, iterations
+            )
+            results.append(result)
+            per_worker = result.host_verifies_per_second / workers
+            if result.verify_seconds > target_seconds:
+                break
+            if (
+                target_logins_per_worker is not None
+                and per_worker < target_logins_per_worker
+            ):
+                break
+            chosen = result
+    return chosen, results
+
+
+def write_settings_file(path: str, values: dict, comments: list[str]) -> None:
+    """Write calibrated values in env file format
+
+    Args:
+        path (str): file path, picked up by PasswordSettings
+        values (dict): settings names and values
+        comments (list[str]): lines written before values
+    """
+    with open(path, "w") as settings_file:
+        for comment in comments:
+            settings_file.write("# {}\n".format(comment))
+        for key, value in values.items():
+            settings_file.write("{0}={1}\n".format(key, value))
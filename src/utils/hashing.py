@@ -0,0 +1,39 @@
+from passlib.context import CryptContext
+
+from core.config import PasswordSettings
+
+
+def construct_crypt_context(settings: PasswordSettings) -> CryptContext:
+    """Build passlib context from password settings.
+
+    Min and max costs are pinned to the configured value, so hashes made
+    with any other cost (cheaper or more expensive) need an update too.
+
+    Args:
+        settings (PasswordSettings): schemes and their cost parameters
+
+    Returns:
+        CryptContext: context hashing with the first configured scheme
+    """
+    options = {
+        "bcrypt__rounds": settings.PASSWORD_BCRYPT_ROUNDS,
+        "bcrypt__min_rounds": settings.PASSWORD_BCRYPT_ROUNDS,
+        "bcrypt__max_rounds": settings.PASSWORD_BCRYPT_ROUNDS,
+        "argon2__type": "ID",
+        "argon2__time_cost": settings.PASSWORD_ARGON2_TIME_COST,
+        "argon2__memory_cost": settings.PASSWORD_ARGON2_MEMORY_COST,
+        "argon2__parallelism": settings.PASSWORD_ARGON2_PARALLELISM,
+        "scrypt__rounds": settings.PASSWORD_SCRYPT_ROUNDS,
+        "scrypt__min_rounds": settings.PASSWORD_SCRYPT_ROUNDS,
+        "scrypt__max_rounds": settings.PASSWORD_SCRYPT_ROUNDS,
+        "scrypt__block_size": settings.PASSWORD_SCRYPT_BLOCK_SIZE,
+        "scrypt__parallelism": settings.PASSWORD_SCRYPT_PARALLELISM,
+    }
+    schemes = settings.PASSWORD_SCHEMES
+    # опции неиспользуемых схем passlib не принимает
+    options = {
+        key: value
+        for key, value in options.items()
+        if key.split("__")[0] in schemes
+    }
+    return CryptContext(schemes=schemes, deprecated="auto", **options)
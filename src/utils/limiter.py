@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+from core.get_logger import logger
+from utils.exceptions import ServiceOverloadedError
+from utils.metrics import metrics
+
+
+class ConcurrencyLimiter:
+    """Admission control with a bounded wait queue.
+
+    At most max_concurrency callers run at once, up to max_queue callers
+    wait for a slot no longer than queue_timeout seconds. Everyone else
+    is rejected at once with ServiceOverloadedError.
+
+    Args:
+        name (str): limiter name used in metrics
+        max_concurrency (int): number of callers allowed to run
+        max_queue (int): number of callers allowed to wait
+        queue_timeout (float): max wait time in seconds
+        retry_after (int): Retry-After value returned to rejected clients
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        retry_after: int,
+    ) -> None:
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        self._running = 0
+
+        metrics.set(
+            "admission_max_concurrency", max_concurrency, limiter=name
+        )
+        metrics.set("admission_max_queue", max_queue, limiter=name)
+        metrics.set(
+            "admission_queue_timeout_seconds", queue_timeout, limiter=name
+        )
+
+    async def __aenter__(self) -> "ConcurrencyLimiter":
+        if not self._semaphore.locked():
+            # свободный слот есть, acquire не будет ждать
+            await self._semaphore.acquire()
+            metrics.inc("admission_admitted_total", limiter=self.name)
+            self._set_running(self._running + 1)
+            return self
+
+        if self._waiting >= self.max_queue:
+            self._reject("queue_full")
+
+        self._set_waiting(self._waiting + 1)
+        started_at = time.monotonic()
+        try:
+            await asyncio.wait_for(
+                self._semaphore.acquire(), timeout=self.queue_timeout
+            )
+        except asyncio.TimeoutError:
+            self._reject("timeout")
+        finally:
+            self._set_waiting(self._waiting - 1)
+
+        metrics.observe(
+            "admission_wait_seconds",
+            time.monotonic() - started_at,
+            limiter=self.name,
+        )
+        metrics.inc("admission_admitted_total", limiter=self.name)
+        self._set_running(self._running + 1)
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        self._set_running(self._running - 1)
+        self._semaphore.release()
+
+    def _reject(self, reason: str) -> None:
+        logger.warning(
+            "[ConcurrencyLimiter][%s] - request rejected: %s",
+            self.name,
+            reason,
+        )
+        metrics.inc(
+            "admission_rejected_total", limiter=self.name, reason=reason
+        )
+        raise ServiceOverloadedError(retry_after=self.retry_after)
+
+    def _set_waiting(self, value: int) -> None:
+        self._waiting = value
+        metrics.set("admission_waiting", value, limiter=self.name)
+
+    def _set_running(self, value: int) -> None:
+        self._running = value
+        metrics.set("admission_running", value, limiter=self.name)
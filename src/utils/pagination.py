@@ -0,0 +1,57 @@
+import base64
+import json
+from datetime import datetime
+from typing import NamedTuple
+from uuid import UUID
+
+NEXT = "next"
+PREV = "prev"
+
+
+class Cursor(NamedTuple):
+    created_at: datetime
+    id: UUID
+    # направление от страницы, выдавшей курсор: NEXT или PREV
+    direction: str
+
+
+def encode_cursor(created_at: datetime, id: UUID, direction: str) -> str:
+    """Encode keyset position into an opaque url-safe string
+
+    Args:
+        created_at (datetime): created_at of the boundary row
+        id (UUID): id of the boundary row
+        direction (str): NEXT or PREV
+
+    Returns:
+        str: cursor
+    """
+    payload = json.dumps(
+        [created_at.isoformat(), str(id), direction], separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Decode cursor made by encode_cursor
+
+    Args:
+        cursor (str): cursor
+
+    Raises:
+        ValueError: if cursor is malformed
+
+    Returns:
+        Cursor: keyset position
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        created_at, id, direction = json.loads(
+            base64.urlsafe_b64decode(cursor + padding)
+        )
+        result = Cursor(datetime.fromisoformat(created_at), UUID(id), direction)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+    if result.direction not in (NEXT, PREV):
+        raise ValueError("Invalid cursor")
+    return result
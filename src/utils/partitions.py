@@ -0,0 +1,253 @@
+import asyncio
+import re
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from core.config import PostgresSettings
+from core.get_logger import logger
+
+# Партиции создаются как <table>_pYYYYMM и покрывают календарный месяц
+PARTITION_SUFFIX = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return "{0}_p{1:04d}{2:02d}".format(table, month.year, month.month)
+
+
+def partition_month(table: str, name: str) -> Optional[date]:
+    """Month covered by the partition, None for default and foreign ones
+
+    Args:
+        table (str): partitioned table
+        name (str): partition table name
+
+    Returns:
+        date | None: first day of the month
+    """
+    if not name.startswith(table):
+        return None
+    match = PARTITION_SUFFIX.search(name[len(table):])
+    if match is None:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+async def _lock(conn: AsyncConnection, table: str) -> None:
+    # воркеры и cli обслуживают партиции по очереди,
+    # блокировка снимается вместе с транзакцией
+    await conn.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:key))"),
+        {"key": "partitions:" + table},
+    )
+
+
+async def list_partitions(conn: AsyncConnection, table: str) -> list[str]:
+    result = await conn.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(:table)"
+        ),
+        {"table": table},
+    )
+    return [row[0] for row in result]
+
+
+async def ensure_partitions(
+    conn: AsyncConnection,
+    table: str,
+    months_ahead: int,
+    today: Optional[date] = None,
+) -> list[str]:
+    """Create monthly partitions from the current month to months_ahead
+
+    Rows already written to the default partition for the month
+    are moved to the new partition.
+
+    Args:
+        conn (AsyncConnection): connection with an open transaction
+        table (str): table partitioned by range of created_at
+        months_ahead (int): number of future months to prepare
+        today (date | None): current date, utc today if None
+
+    Returns:
+        list[str]: names of created partitions
+    """
+    await _lock(conn, table)
+    existing = set(await list_partitions(conn, table))
+    default = "{0}_default".format(table)
+    current = month_start(today or datetime.utcnow().date())
+
+    created = []
+    for offset in range(months_ahead + 1):
+        start = add_months(current, offset)
+        end = add_months(start, 1)
+        name = partition_name(table, start)
+        if name in existing:
+            continue
+
+        bounds = {"start": start, "end": end}
+        in_default = default in existing and await conn.scalar(
+            text(
+                'SELECT EXISTS (SELECT 1 FROM "{0}" '
+                "WHERE created_at >= :start AND created_at < :end)".format(
+                    default
+                )
+            ),
+            bounds,
+        )
+        values = "FOR VALUES FROM ('{0}') TO ('{1}')".format(start, end)
+        if not in_default:
+            await conn.execute(
+                text(
+                    'CREATE TABLE "{0}" PARTITION OF "{1}" {2}'.format(
+                        name, table, values
+                    )
+                )
+            )
+        else:
+            # новая партиция не подключится, пока ее строки лежат
+            # в default, поэтому сначала переносим их
+            await conn.execute(
+                text(
+                    'CREATE TABLE "{0}" (LIKE "{1}" INCLUDING DEFAULTS)'
+                    .format(name, table)
+                )
+            )
+            await conn.execute(
+                text(
+                    'WITH moved AS (DELETE FROM "{0}" WHERE created_at '
+                    ">= :start AND created_at < :end RETURNING *) "
+                    'INSERT INTO "{1}" SELECT * FROM moved'.format(
+                        default, name
+                    )
+                ),
+                bounds,
+            )
+            await conn.execute(
+                text(
+                    'ALTER TABLE "{0}" ATTACH PARTITION "{1}" {2}'.format(
+                        table, name, values
+                    )
+                )
+            )
+        created.append(name)
+    return created
+
+
+async def drop_expired_partitions(
+    conn: AsyncConnection,
+    table: str,
+    retention_months: int,
+    today: Optional[date] = None,
+) -> list[str]:
+    """Drop monthly partitions which ended before the retention period.
+    Dropping a partition is instant and leaves no dead rows behind,
+    unlike DELETE. Expired rows which landed in the default partition
+    are deleted from it
+
+    Args:
+        conn (AsyncConnection): connection with an open transaction
+        table (str): table partitioned by range of created_at
+        retention_months (int): number of full months to keep
+            before the current one
+        today (date | None): current date, utc today if None
+
+    Returns:
+        list[str]: names of dropped partitions
+    """
+    await _lock(conn, table)
+    current = month_start(today or datetime.utcnow().date())
+    oldest_kept = add_months(current, -retention_months)
+
+    partitions = await list_partitions(conn, table)
+    dropped = []
+    for name in partitions:
+        month = partition_month(table, name)
+        if month is None or month >= oldest_kept:
+            continue
+        await conn.execute(text('DROP TABLE "{0}"'.format(name)))
+        dropped.append(name)
+
+    # строки месяцев без своей партиции лежат в default,
+    # их удаляем обычным DELETE
+    default = "{0}_default".format(table)
+    if default in partitions:
+        result = await conn.execute(
+            text(
+                'DELETE FROM "{0}" WHERE created_at < :oldest_kept'.format(
+                    default
+                )
+            ),
+            {"oldest_kept": oldest_kept},
+        )
+        if result.rowcount:
+            logger.info(
+                "[drop_expired_partitions] - %s expired rows deleted "
+                "from %s",
+                result.rowcount,
+                default,
+            )
+    return sorted(dropped)
+
+
+async def maintain_partitions(
+    engine: AsyncEngine, table: str, settings: PostgresSettings
+) -> tuple[list[str], list[str]]:
+    """Create future partitions and drop expired ones in one transaction
+
+    Args:
+        engine (AsyncEngine): primary engine
+        table (str): table partitioned by range of created_at
+        settings (PostgresSettings): postgres settings
+
+    Returns:
+        tuple[list[str], list[str]]: created and dropped partitions
+    """
+    async with engine.begin() as conn:
+        created = await ensure_partitions(
+            conn, table, settings.POSTGRES_HISTORY_PARTITIONS_AHEAD
+        )
+        dropped = []
+        if settings.POSTGRES_HISTORY_RETENTION_MONTHS is not None:
+            dropped = await drop_expired_partitions(
+                conn, table, settings.POSTGRES_HISTORY_RETENTION_MONTHS
+            )
+    if created or dropped:
+        logger.info(
+            "[maintain_partitions] - %s: created %s, dropped %s",
+            table,
+            created,
+            dropped,
+        )
+    return created, dropped
+
+
+async def run_partition_maintenance(
+    engine: AsyncEngine, table: str, settings: PostgresSettings
+) -> None:
+    """Background task of the application, repeats maintenance
+    every POSTGRES_PARTITION_MAINTENANCE_INTERVAL seconds
+    """
+    while True:
+        try:
+            await maintain_partitions(engine, table, settings)
+        except Exception:
+            # без новой партиции строки попадут в default,
+            # поэтому ошибка не должна останавливать приложение
+            logger.exception(
+                "[run_partition_maintenance] - %s maintenance failed", table
+            )
+        await asyncio.sleep(settings.POSTGRES_PARTITION_MAINTENANCE_INTERVAL)
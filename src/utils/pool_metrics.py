@@ -0,0 +1,201 @@
+import asyncio
+import sys
+import time
+import traceback
+from typing import NamedTuple, Optional
+
+import greenlet
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+from core.config import postgres_settings
+from core.get_logger import logger
+from utils.metrics import metrics
+from utils.sql_metrics import current_query_label
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool recording how long callers wait for a connection.
+
+    The wait includes opening an overflow connection and pre-ping,
+    both are part of the latency the caller sees.
+    """
+
+    label = "postgres"
+
+    def connect(self):
+        started_at = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            metrics.inc("db_pool_checkout_timeouts_total", pool=self.label)
+            raise
+        finally:
+            metrics.observe(
+                "db_pool_checkout_wait_seconds",
+                time.perf_counter() - started_at,
+                pool=self.label,
+            )
+
+    def _do_return_conn(self, record) -> None:
+        super()._do_return_conn(record)
+        # событие checkin приходит до возврата соединения в пул,
+        # поэтому заполненность после возврата публикуется здесь
+        report_queue_pool_usage(self, self.label)
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        # dispose() создает новый пул, метка должна сохраниться
+        pool = super().recreate()
+        pool.label = self.label
+        return pool
+
+
+def report_queue_pool_usage(pool: QueuePool, label: str) -> None:
+    metrics.set("db_pool_in_use", pool.checkedout(), pool=label)
+    metrics.set("db_pool_idle", pool.checkedin(), pool=label)
+    metrics.set("db_pool_overflow", max(pool.overflow(), 0), pool=label)
+
+
+class HeldConnection(NamedTuple):
+    pool: str
+    query: str
+    checked_out_at: float
+    stack: Optional[str]
+
+
+def _caller_stack() -> str:
+    # события пула вызываются в greenlet, созданном asyncio-адаптером
+    # sqlalchemy, и его стек заканчивается на самой sqlalchemy.
+    # Корутины приложения остались в родительском greenlet
+    frame = sys._getframe(2)
+    parent = greenlet.getcurrent().parent
+    if parent is not None and parent.gr_frame is not None:
+        frame = parent.gr_frame
+    return "".join(traceback.format_stack(frame))
+
+
+class PoolMonitor:
+    """Pool event listeners tracking connections in use.
+
+    Args:
+        held_warning_seconds (float | None): connections held longer
+            are reported as possible leaks, disabled if None
+        capture_stacks (bool): remember the stack which checked out
+            the connection, costs a traceback walk on every checkout
+    """
+
+    def __init__(
+        self, held_warning_seconds: Optional[float], capture_stacks: bool
+    ) -> None:
+        self.held_warning_seconds = held_warning_seconds
+        self.capture_stacks = capture_stacks
+        # запись пула -> кто и когда взял соединение
+        self._held: dict[object, HeldConnection] = {}
+        self._pools: set[str] = set()
+
+    def attach(self, engine: AsyncEngine, label: str) -> None:
+        self._pools.add(label)
+        if isinstance(engine.sync_engine.pool, InstrumentedQueuePool):
+            engine.sync_engine.pool.label = label
+
+        def on_checkout(dbapi_connection, connection_record, proxy) -> None:
+            pool = engine.sync_engine.pool
+            self._held[connection_record] = HeldConnection(
+                pool=label,
+                query=current_query_label(),
+                checked_out_at=time.perf_counter(),
+                stack=_caller_stack() if self.capture_stacks else None,
+            )
+            if isinstance(pool, QueuePool) and pool.overflow() > 0:
+                metrics.inc("db_pool_overflow_checkouts_total", pool=label)
+            self._report_usage(pool, label)
+
+        def on_checkin(dbapi_connection, connection_record) -> None:
+            held = self._held.pop(connection_record, None)
+            if held is not None:
+                metrics.observe(
+                    "db_pool_connection_held_seconds",
+                    time.perf_counter() - held.checked_out_at,
+                    pool=label,
+                )
+            pool = engine.sync_engine.pool
+            # у InstrumentedQueuePool счетчики еще не учитывают
+            # возврат, он сам опубликует их после него
+            if not isinstance(pool, InstrumentedQueuePool):
+                self._report_usage(pool, label)
+
+        # слушатели на engine переходят и в пул, пересозданный dispose()
+        event.listen(engine.sync_engine, "checkout", on_checkout)
+        event.listen(engine.sync_engine, "checkin", on_checkin)
+
+    def _report_usage(self, pool: Pool, label: str) -> None:
+        if not isinstance(pool, QueuePool):
+            # у NullPool (PgBouncer) нет размера, считаем свои выдачи
+            in_use = sum(
+                1 for held in self._held.values() if held.pool == label
+            )
+            metrics.set("db_pool_in_use", in_use, pool=label)
+            return
+        report_queue_pool_usage(pool, label)
+
+    def long_held(self) -> list[tuple[HeldConnection, float]]:
+        """Connections checked out longer than held_warning_seconds
+
+        Returns:
+            list[tuple[HeldConnection, float]]: connections and seconds
+                they have been held, the longest first
+        """
+        if self.held_warning_seconds is None:
+            return []
+        now = time.perf_counter()
+        found = [
+            (held, now - held.checked_out_at)
+            for held in list(self._held.values())
+            if now - held.checked_out_at >= self.held_warning_seconds
+        ]
+        return sorted(found, key=lambda item: item[1], reverse=True)
+
+    def report_long_held(self) -> int:
+        """Log connections held too long with the stack that took them
+
+        Returns:
+            int: number of such connections
+        """
+        found = self.long_held()
+        counts: dict[str, int] = {}
+        for held, seconds in found:
+            counts[held.pool] = counts.get(held.pool, 0) + 1
+            logger.warning(
+                "[pool] - %s connection held for %.1f s by %s, "
+                "checked out at:\n%s",
+                held.pool,
+                seconds,
+                held.query,
+                held.stack
+                or "unknown, set POSTGRES_POOL_CAPTURE_STACKS=true",
+            )
+        for pool in self._pools:
+            metrics.set(
+                "db_pool_long_held_connections", counts.get(pool, 0), pool=pool
+            )
+        return len(found)
+
+
+async def run_pool_monitor(monitor: PoolMonitor, interval: float) -> None:
+    """Background task of the application, reports connections held
+    too long every interval seconds
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            monitor.report_long_held()
+        except Exception:
+            logger.exception("[run_pool_monitor] - pool check failed")
+
+
+pool_monitor = PoolMonitor(
+    held_warning_seconds=postgres_settings.POSTGRES_POOL_HELD_WARNING_SECONDS,
+    capture_stacks=postgres_settings.POSTGRES_POOL_CAPTURE_STACKS,
+)
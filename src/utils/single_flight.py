@@ -0,0 +1,42 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from utils.metrics import metrics
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution.
+
+    Coalesces calls inside one worker only, the first caller's
+    context (connection of unit_of_work, routing) is used for all.
+    Do not call it inside unit_of_work: the shared call would keep
+    using the transaction after the first caller rolls it back.
+
+    Args:
+        name (str): name used in metrics
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """Result of func, shared with callers waiting for the same key
+
+        Args:
+            key (Hashable): key of the call
+            func (Callable[[], Awaitable[T]]): makes the call
+
+        Returns:
+            T: result of func
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = asyncio.ensure_future(func())
+            call.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            metrics.inc("single_flight_shared_total", flight=self.name)
+        # отмена одного ожидающего не отменяет общий вызов
+        return await asyncio.shield(call)
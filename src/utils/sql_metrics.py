@@ -0,0 +1,177 @@
+import functools
+import inspect
+import re
+import time
+from contextlib import suppress
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.get_logger import logger
+from utils.metrics import metrics
+
+# Метод репозитория, который выполняет текущий запрос
+_query_label: ContextVar[str] = ContextVar("query_label", default="other")
+
+_PLACEHOLDER = re.compile(r"\$\d+(?:::[\w\[\]]+)?|%\(\w+\)s|%s|\?")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:, \?)+")
+_VALUES_LIST = re.compile(r"(\([?., ]+\))(?:, \([?., ]+\))+")
+_SPACES = re.compile(r"\s+")
+MAX_STATEMENT_LENGTH = 200
+
+
+def normalize_statement(statement: str) -> str:
+    """Statement without literal parameters and repeated lists, so that
+    insert_many batches and IN lists of any size share one key
+
+    Args:
+        statement (str): SQL sent to the driver
+
+    Returns:
+        str: normalized SQL
+    """
+    statement = _SPACES.sub(" ", statement).strip()
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _PLACEHOLDER_LIST.sub("?, ...", statement)
+    statement = _VALUES_LIST.sub(r"\1, ...", statement)
+    return statement[:MAX_STATEMENT_LENGTH]
+
+
+def parameters_shape(parameters: Any, executemany: bool = False) -> str:
+    """Types of bind parameters without their values,
+    values may contain passwords and tokens
+
+    Args:
+        parameters (Any): parameters passed to the driver
+        executemany (bool): parameters are a list of parameter sets
+
+    Returns:
+        str: shape like "(UUID, str, int)"
+    """
+    if executemany:
+        first = parameters_shape(parameters[0]) if parameters else "()"
+        return "{0} x {1}".format(len(parameters), first)
+    if isinstance(parameters, dict):
+        parameters = parameters.values()
+    return "({0})".format(
+        ", ".join(type(value).__name__ for value in parameters or ())
+    )
+
+
+def current_query_label() -> str:
+    return _query_label.get()
+
+
+def timed_query(func: Callable) -> Callable:
+    """Label SQL executed inside the repository method with
+    its qualified name, e.g. "UserDB.get_user_roles"
+    """
+    label = func.__qualname__
+
+    if inspect.isasyncgenfunction(func):
+
+        @functools.wraps(func)
+        async def generator_wrapper(*args, **kwargs):
+            token = _query_label.set(label)
+            try:
+                async for item in func(*args, **kwargs):
+                    yield item
+            finally:
+                # генератор может закрыть сборщик мусора в другом контексте
+                with suppress(ValueError):
+                    _query_label.reset(token)
+
+        return generator_wrapper
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = _query_label.set(label)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _query_label.reset(token)
+
+    return wrapper
+
+
+class StatementTimer:
+    """Engine event listeners recording latency of every statement.
+
+    Args:
+        slow_query_ms (float | None): threshold of the slow query log,
+            disabled if None
+        explain_slow (bool): log EXPLAIN ANALYZE of slow SELECT
+            statements, only for dev since the query is run again
+    """
+
+    def __init__(
+        self, slow_query_ms: Optional[float], explain_slow: bool = False
+    ) -> None:
+        self.slow_query_ms = slow_query_ms
+        self.explain_slow = explain_slow
+
+    def attach(self, engine: AsyncEngine) -> None:
+        event.listen(
+            engine.sync_engine, "before_cursor_execute", self.before_execute
+        )
+        event.listen(
+            engine.sync_engine, "after_cursor_execute", self.after_execute
+        )
+
+    def before_execute(
+        self, conn: Connection, cursor, statement, parameters, context, many
+    ) -> None:
+        # время храним в контексте выполнения: если запрос упадет,
+        # ничего не останется висеть на соединении
+        if context is not None:
+            context.query_started_at = time.perf_counter()
+
+    def after_execute(
+        self, conn: Connection, cursor, statement, parameters, context, many
+    ) -> None:
+        started_at = getattr(context, "query_started_at", None)
+        if started_at is None or conn.info.get("explaining"):
+            return
+        elapsed = time.perf_counter() - started_at
+        label = _query_label.get()
+        normalized = normalize_statement(statement)
+        metrics.observe(
+            "sql_statement_seconds", elapsed, query=label, statement=normalized
+        )
+
+        if self.slow_query_ms is None or elapsed * 1000 < self.slow_query_ms:
+            return
+        metrics.inc("sql_slow_statements_total", query=label)
+        logger.warning(
+            "[sql] - slow query %.1f ms in %s: %s parameters %s",
+            elapsed * 1000,
+            label,
+            normalized,
+            parameters_shape(parameters, many),
+        )
+        if (
+            self.explain_slow
+            and not many
+            and statement.lstrip().upper().startswith("SELECT")
+            and not context.execution_options.get("stream_results")
+        ):
+            self._explain(conn, statement, parameters)
+
+    def _explain(self, conn: Connection, statement, parameters) -> None:
+        # строки исходного запроса уже получены драйвером,
+        # поэтому соединение можно занять еще одним запросом.
+        # Savepoint не дает ошибке EXPLAIN сломать транзакцию запроса
+        conn.info["explaining"] = True
+        try:
+            with conn.begin_nested():
+                plan = conn.exec_driver_sql(
+                    "EXPLAIN ANALYZE " + statement, parameters
+                ).scalars()
+                logger.warning("[sql] - plan:\n%s", "\n".join(plan))
+        except Exception:
+            logger.exception("[sql] - EXPLAIN ANALYZE failed")
+        finally:
+            conn.info["explaining"] = False
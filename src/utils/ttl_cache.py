@@ -0,0 +1,100 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, NamedTuple, Optional
+
+from utils.metrics import metrics
+
+# Отличает закешированный None от отсутствия записи
+MISSING = object()
+
+
+class _Entry(NamedTuple):
+    value: Any
+    stored_at: float
+    expires_at: float
+
+
+class TTLCache:
+    """Bounded in-process LRU cache with expiry of every entry.
+
+    Lives in one worker, so it is safe only for values which are
+    invalidated by the owner or may be stale for ttl seconds.
+
+    Args:
+        name (str): cache name used in metrics
+        max_size (int): entries kept, the least recently used
+            are evicted first
+        ttl (float): default lifetime of an entry in seconds
+        clock (Callable[[], float]): monotonic time in seconds
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        """Cached value, MISSING if there is no fresh entry
+
+        Args:
+            key (Hashable): cache key
+
+        Returns:
+            Any: value or MISSING
+        """
+        entry = self._entries.get(key)
+        now = self._clock()
+        if entry is None or entry.expires_at <= now:
+            if entry is not None:
+                del self._entries[key]
+            metrics.inc("near_cache_misses_total", cache=self.name)
+            return MISSING
+        self._entries.move_to_end(key)
+        metrics.inc("near_cache_hits_total", cache=self.name)
+        # возраст отданной записи - насколько ответ может отставать
+        metrics.observe(
+            "near_cache_hit_age_seconds",
+            now - entry.stored_at,
+            cache=self.name,
+        )
+        return entry.value
+
+    def peek(self, key: Hashable) -> Any:
+        """Like get, but without metrics and LRU update"""
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= self._clock():
+            return MISSING
+        return entry.value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store the value for ttl seconds, default ttl if None
+
+        Args:
+            key (Hashable): cache key
+            value (Any): value to store, None is allowed
+            ttl (float | None): lifetime of the entry in seconds
+        """
+        now = self._clock()
+        self._entries[key] = _Entry(
+            value, now, now + (self.ttl if ttl is None else ttl)
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            metrics.inc("near_cache_evictions_total", cache=self.name)
+        metrics.set("near_cache_size", len(self._entries), cache=self.name)
+
+    def delete(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        metrics.set("near_cache_size", 0, cache=self.name)
@@ -158,6 +158,80 @@ test_good_history = [
         # message
         {"status_login": "Token not found", "len": "Number of records is not correct"},
     ),
+    (
+        # query
+        {
+            "user_create": ["abc12", "abc12", "first", "last"],
+            "path_login": "/api/v1/auth/login",
+            "data_login": {"login": "abc12", "password": "abc12"},
+            "path_history": "/api/v1/auth/history?n_items_per_page=10&descending=true",
+        },
+        # expected_answer
+        {"status": HTTPStatus.OK, "len": 1},
+        # message
+        {"status_login": "Token not found", "len": "Number of records is not correct"},
+    ),
+]
+
+test_history_cursor = [
+    (
+        # query
+        {
+            "user_create": ["abc13", "abc13", "first", "last"],
+            "path_login": "/api/v1/auth/login",
+            "data_login": {"login": "abc13", "password": "abc13"},
+            "logins": 5,
+            "path_history": "/api/v1/auth/history?n_items_per_page=2",
+        },
+        # expected_answer
+        {"status": HTTPStatus.OK, "pages": [2, 2, 1]},
+        # message
+        {
+            "status": "History page not found",
+            "pages": "Page sizes are not correct",
+            "order": "Pages overlap or are out of order",
+            "first": "First page has a previous page",
+            "last": "Last page has a next page",
+            "back": "Previous page differs from the one walked forward",
+        },
+    ),
+    (
+        # query
+        {
+            "user_create": ["abc14", "abc14", "first", "last"],
+            "path_login": "/api/v1/auth/login",
+            "data_login": {"login": "abc14", "password": "abc14"},
+            "logins": 4,
+            "path_history": "/api/v1/auth/history?n_items_per_page=2&descending=true",
+        },
+        # expected_answer
+        {"status": HTTPStatus.OK, "pages": [2, 2]},
+        # message
+        {
+            "status": "History page not found",
+            "pages": "Page sizes are not correct",
+            "order": "Pages overlap or are out of order",
+            "first": "First page has a previous page",
+            "last": "Last page has a next page",
+            "back": "Previous page differs from the one walked forward",
+        },
+    ),
+]
+
+test_failed_history_cursor = [
+    (
+        # query
+        {
+            "user_create": ["abc15", "abc15", "first", "last"],
+            "path_login": "/api/v1/auth/login",
+            "data_login": {"login": "abc15", "password": "abc15"},
+            "path_history": "/api/v1/auth/history?n_items_per_page=2&cursor=not-a-cursor",
+        },
+        # expected_answer
+        {"status": HTTPStatus.BAD_REQUEST},
+        # message
+        {"status": "Invalid cursor accepted"},
+    ),
 ]
 
 TEST_PARAMS_AUTH = {
@@ -193,4 +267,12 @@ TEST_PARAMS_AUTH = {
         "keys": "query, expected_answer, message",
         "data": test_good_history,
     },
+    "test_history_cursor": {
+        "keys": "query, expected_answer, message",
+        "data": test_history_cursor,
+    },
+    "test_failed_history_cursor": {
+        "keys": "query, expected_answer, message",
+        "data": test_failed_history_cursor,
+    },
 }
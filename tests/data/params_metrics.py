@@ -0,0 +1,34 @@
+from http import HTTPStatus
+
+test_get_metrics = [
+    (
+        # query
+        {
+            "path_login": "/api/v1/auth/login",
+            "data_login": {"login": "superadmin", "password": "secret"},
+            "path_metrics": "/api/v1/metrics",
+        },
+        # expected_answer
+        {"body_keys": {"counters", "gauges", "histograms"}, "status": HTTPStatus.OK},
+    ),
+]
+
+test_get_metrics_unauthorized = [
+    (
+        # query
+        {"path_metrics": "/api/v1/metrics"},
+        # expected_answer
+        {"status": HTTPStatus.UNAUTHORIZED},
+    ),
+]
+
+TEST_PARAMS_METRICS = {
+    "test_get_metrics": {
+        "keys": "query, expected_answer",
+        "data": test_get_metrics,
+    },
+    "test_get_metrics_unauthorized": {
+        "keys": "query, expected_answer",
+        "data": test_get_metrics_unauthorized,
+    },
+}
@@ -31,6 +31,32 @@ async def make_post_request():
     return inner
 
 
+@pytest_asyncio.fixture
+async def make_post_request_headers():
+    # Make post request, returns case-insensitive response headers
+    # instead of cookies
+    async def inner(
+        path: str,
+        query_data: dict[str, Any] = {},
+        headers: dict[str, str] = {},
+        cookies: dict[str, str] = {},
+    ):
+        url = "http://" + test_settings.SERVICE_URL + path
+        session = aiohttp.ClientSession(
+            headers=headers,
+            cookies=cookies,
+            trust_env=True,
+        )
+
+        async with session.post(url, json=query_data) as response:
+            status = response.status
+            response_headers = response.headers.copy()
+            body = await response.json()
+        return body, status, response_headers
+
+    return inner
+
+
 @pytest_asyncio.fixture
 async def make_get_request():
     # Make get request
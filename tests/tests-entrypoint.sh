@@ -1,4 +1,4 @@
 #!/usr/bin/env bash
 pip install -r /tests/test_requirements.txt
 python3 /tests/healthcheck.py
-pytest /tests/unit/src --durations=3 > /tests/logs/pytest.output.log
+pytest /tests/unit/src /tests/unit/app --durations=3 > /tests/logs/pytest.output.log
@@ -0,0 +1,31 @@
+import sys
+from pathlib import Path
+
+import pytest_asyncio
+
+from tests.config.settings import dsn
+
+# Модули приложения импортируются так же, как в самом приложении:
+# из src в репозитории или из /app в контейнере сервиса
+for app_dir in (Path(__file__).parents[3] / "src", Path("/app")):
+    if (app_dir / "main.py").exists():
+        sys.path.insert(0, str(app_dir))
+        break
+
+
+@pytest_asyncio.fixture
+async def pg_engine():
+    # Engine приложения, настроенный на тестовую базу
+    from core.config import PostgresSettings
+    from utils.db import create_engine_from_settings
+
+    settings = PostgresSettings(
+        POSTGRES_HOST=dsn.host,
+        POSTGRES_PORT=dsn.port,
+        POSTGRES_DATABASE=dsn.dbname,
+        POSTGRES_USER=dsn.user,
+        POSTGRES_PASSWORD=dsn.password,
+    )
+    engine = create_engine_from_settings(settings)
+    yield engine
+    await engine.dispose()
@@ -0,0 +1,59 @@
+from sqlalchemy import Column, Integer, text
+from sqlalchemy.orm import declarative_base
+
+from repositories.postgres_db import PostgresDB
+
+ScratchBase = declarative_base()
+
+
+class CountScratch(ScratchBase):
+    __tablename__ = "test_count_scratch"
+
+    id = Column(Integer, primary_key=True)
+
+
+class CountScratchDB(PostgresDB):
+    table = CountScratch
+
+
+async def recreate(engine, *statements: str) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP TABLE IF EXISTS test_count_scratch"))
+        for statement in statements:
+            await conn.execute(text(statement))
+
+
+async def test_count_estimate_never_analyzed_table(pg_engine):
+    await recreate(
+        pg_engine,
+        "CREATE TABLE test_count_scratch (id int PRIMARY KEY)",
+        "INSERT INTO test_count_scratch SELECT generate_series(1, 1000)",
+    )
+    repository = CountScratchDB(pg_engine)
+    try:
+        # reltuples у не анализированной таблицы 0, а строк 1000
+        assert await repository.count(estimate=True) == 1000
+    finally:
+        await recreate(pg_engine)
+
+
+async def test_count_estimate_sums_partitions(pg_engine):
+    await recreate(
+        pg_engine,
+        "CREATE TABLE test_count_scratch (id int) PARTITION BY RANGE (id)",
+        "CREATE TABLE test_count_scratch_low PARTITION OF "
+        "test_count_scratch FOR VALUES FROM (0) TO (1000)",
+        "CREATE TABLE test_count_scratch_high PARTITION OF "
+        "test_count_scratch FOR VALUES FROM (1000) TO (2000)",
+        "CREATE TABLE test_count_scratch_empty PARTITION OF "
+        "test_count_scratch FOR VALUES FROM (2000) TO (3000)",
+        "INSERT INTO test_count_scratch SELECT generate_series(0, 1499)",
+        # статистика есть только у одной партиции
+        "ANALYZE test_count_scratch_low",
+    )
+    repository = CountScratchDB(pg_engine)
+    try:
+        assert await repository.count() == 1500
+        assert await repository.count(estimate=True) == 1500
+    finally:
+        await recreate(pg_engine)
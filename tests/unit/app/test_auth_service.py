@@ -0,0 +1,158 @@
+from http import HTTPStatus
+from types import SimpleNamespace
+from typing import Optional
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+
+from repositories.unit_of_work import get_current_connection
+from schemas.login import Login
+from services.auth_service import AuthService
+from utils.constants import ISSUED_AT_MS_CLAIM
+
+
+class EpochCache:
+    """Кеш без отозванных jti с заданной эпохой отзыва"""
+
+    def __init__(self, revoked_before: Optional[float]) -> None:
+        self.revoked_before = revoked_before
+
+    async def get(self, jti: str) -> Optional[str]:
+        return None
+
+    async def get_revoked_before(self, user_id: str) -> Optional[float]:
+        return self.revoked_before
+
+
+class RawJWT:
+    def __init__(self, raw_jwt: dict) -> None:
+        self.raw_jwt = raw_jwt
+
+    async def get_raw_jwt(self) -> dict:
+        return self.raw_jwt
+
+
+def make_auth_service(
+    revoked_before: Optional[float], claims: dict
+) -> AuthService:
+    raw_jwt = {"jti": "jti", "sub": "user", **claims}
+    return AuthService(
+        cache_repository=EpochCache(revoked_before),
+        user_repository=None,
+        user_history=None,
+        token_repository=None,
+        password_service=None,
+        authorize_service=RawJWT(raw_jwt),
+        permission_cache=None,
+    )
+
+
+@pytest.mark.parametrize(
+    "revoked_before, claims",
+    [
+        # отзывов не было
+        (None, {"iat": 1000, ISSUED_AT_MS_CLAIM: 1000000}),
+        # выпущен в ту же миллисекунду, что и отзыв
+        (1000.5, {"iat": 1000, ISSUED_AT_MS_CLAIM: 1000500}),
+        # выпущен в ту же секунду, но после отзыва
+        (1000.5, {"iat": 1000, ISSUED_AT_MS_CLAIM: 1000700}),
+        # токен без iat_ms после отзыва
+        (1000.5, {"iat": 1001}),
+        # целая эпоха, записанная до миллисекундной
+        (1000, {"iat": 1000}),
+    ],
+)
+async def test_check_denied_token_accepts(revoked_before, claims):
+    auth_service = make_auth_service(revoked_before, claims)
+
+    await auth_service.check_denied_token()
+
+
+@pytest.mark.parametrize(
+    "revoked_before, claims",
+    [
+        # на миллисекунду раньше отзыва
+        (1000.5, {"iat": 1000, ISSUED_AT_MS_CLAIM: 1000499}),
+        # токен без iat_ms сравнивается по iat, и та же секунда
+        # до отзыва не проходит
+        (1000.5, {"iat": 1000}),
+        (1000, {"iat": 999}),
+    ],
+)
+async def test_check_denied_token_rejects_revoked(revoked_before, claims):
+    auth_service = make_auth_service(revoked_before, claims)
+
+    with pytest.raises(HTTPException) as error:
+        await auth_service.check_denied_token()
+    assert error.value.status_code == HTTPStatus.UNAUTHORIZED
+
+
+class LoginRepositories:
+    """Репозитории логина, запоминающие, шел ли вызов в транзакции"""
+
+    def __init__(self, engine) -> None:
+        self.connection = engine
+        self.user_id = uuid4()
+        self.in_transaction: dict[str, bool] = {}
+
+    def record(self, call: str) -> None:
+        in_transaction = get_current_connection(self.connection) is not None
+        self.in_transaction[call] = in_transaction
+
+    async def find(self, filter: dict, columns: list[str]) -> list:
+        return [SimpleNamespace(id=self.user_id, password="hash")]
+
+    async def get_permissions(self, user_id) -> list[str]:
+        self.record("get_permissions")
+        return ["read"]
+
+    async def insert(self, entity) -> None:
+        self.record(type(entity).__name__)
+
+
+class LoginServices:
+    """Проверка пароля, кеш прав и JWT без внешних зависимостей"""
+
+    async def verify_and_update(self, password: str, hash: str):
+        return True, None
+
+    async def get(self, user_id: str, load):
+        return await load()
+
+    async def create_access_token(self, subject: str, user_claims: dict):
+        return "access"
+
+    async def create_refresh_token(self, subject: str, user_claims: dict):
+        return "refresh"
+
+    async def set_access_cookies(self, token: str) -> None:
+        pass
+
+    async def set_refresh_cookies(self, token: str) -> None:
+        pass
+
+
+async def test_login_loads_permissions_outside_transaction(pg_engine):
+    repositories = LoginRepositories(pg_engine)
+    services = LoginServices()
+    auth_service = AuthService(
+        cache_repository=None,
+        user_repository=repositories,
+        user_history=repositories,
+        token_repository=repositories,
+        password_service=services,
+        authorize_service=services,
+        permission_cache=services,
+    )
+
+    tokens = await auth_service.login(Login(login="user", password="secret"))
+
+    assert tokens == {"access_token": "access", "refresh_token": "refresh"}
+    # загрузку прав разделяют другие запросы, транзакция этого
+    # запроса ей не передается
+    assert repositories.in_transaction == {
+        "get_permissions": False,
+        "RefreshToken": True,
+        "UserHistory": True,
+    }
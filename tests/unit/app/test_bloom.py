@@ -0,0 +1,95 @@
+import time
+
+from utils.bloom import BloomFilter, ExpiringBloomFilter
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=5000, error_rate=0.01)
+    keys = ["jti-{}".format(index) for index in range(5000)]
+    for key in keys:
+        bloom.add(key)
+
+    assert all(key in bloom for key in keys)
+    assert bloom.count == 5000
+
+
+def test_bloom_filter_false_positive_rate_at_capacity():
+    bloom = BloomFilter(capacity=5000, error_rate=0.01)
+    for index in range(5000):
+        bloom.add("jti-{}".format(index))
+
+    probes = 20000
+    false_positives = sum(
+        "other-{}".format(index) in bloom for index in range(probes)
+    )
+    # запас в три раза от расчетной вероятности
+    assert false_positives / probes < 0.03
+
+
+def make_filter(monkeypatch, now: list[float]) -> ExpiringBloomFilter:
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return ExpiringBloomFilter(
+        "test", window=100, capacity=100, error_rate=0.001
+    )
+
+
+def test_expiring_bloom_filter_forgets_keys_after_window(monkeypatch):
+    now = [1000.0]
+    bloom = make_filter(monkeypatch, now)
+    bloom.replace([])
+    # окно 10 покрывает истечения с 1000 по 1099
+    bloom.add("first", expires_at=1050)
+    bloom.add("second", expires_at=1150)
+
+    now[0] = 1099
+    assert bloom.might_contain("first")
+    assert bloom.might_contain("second")
+
+    now[0] = 1100
+    assert not bloom.might_contain("first")
+    assert bloom.might_contain("second")
+    assert list(bloom._filters) == [11]
+
+    now[0] = 1200
+    assert not bloom.might_contain("second")
+    assert bloom._filters == {}
+
+
+def test_expiring_bloom_filter_skips_expired_keys(monkeypatch):
+    now = [1000.0]
+    bloom = make_filter(monkeypatch, now)
+    bloom.replace([])
+    bloom.add("expired", expires_at=1000)
+
+    assert not bloom.might_contain("expired")
+    assert bloom._filters == {}
+
+
+def test_expiring_bloom_filter_replace(monkeypatch):
+    now = [1000.0]
+    bloom = make_filter(monkeypatch, now)
+    # до первой сборки фильтр ничего не знает
+    assert not bloom.ready
+
+    bloom.add("dropped-by-replace", expires_at=1500)
+    bloom.replace([("live", 1300.0), ("expired", 900.0)])
+
+    assert bloom.ready
+    assert bloom.might_contain("live")
+    assert not bloom.might_contain("expired")
+    assert not bloom.might_contain("dropped-by-replace")
+
+    bloom.replace([("late", 1400.0)], now=1350)
+    assert bloom.might_contain("late")
+    assert not bloom.might_contain("live")
+
+
+def test_expiring_bloom_filter_reset(monkeypatch):
+    now = [1000.0]
+    bloom = make_filter(monkeypatch, now)
+    bloom.replace([("live", 1300.0)])
+
+    bloom.reset()
+
+    assert not bloom.ready
+    assert not bloom.might_contain("live")
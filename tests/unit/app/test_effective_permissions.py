@@ -0,0 +1,159 @@
+import asyncio
+from uuid import uuid4
+
+from sqlalchemy import text
+
+PREFIX = "test_effective_"
+
+
+async def create_user(conn) -> str:
+    user_id = str(uuid4())
+    await conn.execute(
+        text(
+            'INSERT INTO "user" (id, created_at, login, password) '
+            "VALUES (:id, now(), :login, 'x')"
+        ),
+        {"id": user_id, "login": PREFIX + user_id},
+    )
+    return user_id
+
+
+async def create_role(conn, access: str) -> str:
+    role_id = str(uuid4())
+    await conn.execute(
+        text(
+            "INSERT INTO role (id, created_at, name, access) "
+            "VALUES (:id, now(), :name, :access)"
+        ),
+        {"id": role_id, "name": PREFIX + role_id, "access": access},
+    )
+    return role_id
+
+
+async def assign(conn, user_id: str, role_id: str) -> None:
+    await conn.execute(
+        text("INSERT INTO user_role (user_id, role_id) VALUES (:user, :role)"),
+        {"user": user_id, "role": role_id},
+    )
+
+
+async def permissions(conn, user_id: str) -> list[str]:
+    return await conn.scalar(
+        text(
+            "SELECT permissions FROM user_effective_permissions "
+            "WHERE user_id = :user"
+        ),
+        {"user": user_id},
+    )
+
+
+async def cleanup(engine) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                "DELETE FROM user_role WHERE user_id IN "
+                '(SELECT id FROM "user" WHERE login LIKE :prefix)'
+            ),
+            {"prefix": PREFIX + "%"},
+        )
+        await conn.execute(
+            text('DELETE FROM "user" WHERE login LIKE :prefix'),
+            {"prefix": PREFIX + "%"},
+        )
+        await conn.execute(
+            text("DELETE FROM role WHERE name LIKE :prefix"),
+            {"prefix": PREFIX + "%"},
+        )
+        await conn.execute(
+            text("DELETE FROM permission WHERE name LIKE :prefix"),
+            {"prefix": PREFIX + "%"},
+        )
+
+
+async def run_concurrently(engine, first, second) -> None:
+    """first выполняется и держит транзакцию открытой, пока second
+    не упрется в блокировку, затем обе фиксируются
+    """
+    async with engine.connect() as first_conn:
+        await first_conn.begin()
+        await first(first_conn)
+
+        async def run_second() -> None:
+            async with engine.begin() as second_conn:
+                await second(second_conn)
+
+        second_task = asyncio.create_task(run_second())
+        await asyncio.sleep(0.5)
+        # вторая транзакция ждет первую
+        assert not second_task.done()
+        await first_conn.commit()
+        await asyncio.wait_for(second_task, timeout=10)
+
+
+async def test_concurrent_role_assignments_keep_both_roles(pg_engine):
+    async with pg_engine.begin() as conn:
+        user_id = await create_user(conn)
+        first_role = await create_role(conn, PREFIX + "a")
+        second_role = await create_role(conn, PREFIX + "b")
+    try:
+        await run_concurrently(
+            pg_engine,
+            lambda conn: assign(conn, user_id, first_role),
+            lambda conn: assign(conn, user_id, second_role),
+        )
+        async with pg_engine.connect() as conn:
+            assert await permissions(conn, user_id) == [
+                PREFIX + "a",
+                PREFIX + "b",
+            ]
+    finally:
+        await cleanup(pg_engine)
+
+
+async def test_role_access_change_races_with_assignment(pg_engine):
+    async with pg_engine.begin() as conn:
+        user_id = await create_user(conn)
+        role_id = await create_role(conn, PREFIX + "c")
+
+    async def change_access(conn) -> None:
+        await conn.execute(
+            text("UPDATE role SET access = :access WHERE id = :id"),
+            {"access": "{0}c,{0}d".format(PREFIX), "id": role_id},
+        )
+
+    try:
+        await run_concurrently(
+            pg_engine,
+            change_access,
+            lambda conn: assign(conn, user_id, role_id),
+        )
+        async with pg_engine.connect() as conn:
+            assert await permissions(conn, user_id) == [
+                PREFIX + "c",
+                PREFIX + "d",
+            ]
+    finally:
+        await cleanup(pg_engine)
+
+
+async def test_role_delete_cascades_to_holders(pg_engine):
+    async with pg_engine.begin() as conn:
+        user_id = await create_user(conn)
+        kept_role = await create_role(conn, PREFIX + "e")
+        deleted_role = await create_role(conn, PREFIX + "f")
+        await assign(conn, user_id, kept_role)
+        await assign(conn, user_id, deleted_role)
+    try:
+        async with pg_engine.begin() as conn:
+            await conn.execute(
+                text("DELETE FROM role WHERE id = :id"), {"id": deleted_role}
+            )
+        async with pg_engine.connect() as conn:
+            roles = await conn.scalars(
+                text("SELECT role_id FROM user_role WHERE user_id = :user"),
+                {"user": user_id},
+            )
+            assert [str(role) for role in roles] == [kept_role]
+            assert await permissions(conn, user_id) == [PREFIX + "e"]
+    finally:
+        await cleanup(pg_engine)
@@ -0,0 +1,127 @@
+import asyncio
+import json
+from http import HTTPStatus
+
+import pytest
+
+from core.exceptions import overloaded_exception
+from utils.exceptions import ServiceOverloadedError
+from utils.limiter import ConcurrencyLimiter
+from utils.metrics import metrics
+
+
+def make_limiter(name: str, **kwargs) -> ConcurrencyLimiter:
+    params = {
+        "max_concurrency": 1,
+        "max_queue": 1,
+        "queue_timeout": 1.0,
+        "retry_after": 7,
+    }
+    params.update(kwargs)
+    return ConcurrencyLimiter(name, **params)
+
+
+def rejected(limiter: ConcurrencyLimiter, reason: str) -> int:
+    counters = metrics.snapshot()["counters"]
+    key = "admission_rejected_total{{limiter={0},reason={1}}}".format(
+        limiter.name, reason
+    )
+    return counters.get(key, 0)
+
+
+async def hold(limiter: ConcurrencyLimiter, release: asyncio.Event) -> None:
+    async with limiter:
+        await release.wait()
+
+
+async def test_limiter_admits_up_to_max_concurrency():
+    limiter = make_limiter("test-admit", max_concurrency=2, max_queue=0)
+    release = asyncio.Event()
+    holders = [asyncio.create_task(hold(limiter, release)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    assert limiter._running == 2
+
+    release.set()
+    await asyncio.gather(*holders)
+    assert limiter._running == 0
+
+
+async def test_limiter_rejects_when_queue_is_full():
+    limiter = make_limiter("test-queue-full", max_queue=1)
+    release = asyncio.Event()
+    running = asyncio.create_task(hold(limiter, release))
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(hold(limiter, release))
+    await asyncio.sleep(0)
+    assert limiter._waiting == 1
+
+    # третий не помещается ни в слот, ни в очередь и не ждет
+    with pytest.raises(ServiceOverloadedError) as error:
+        async with limiter:
+            pass
+
+    assert error.value.retry_after == 7
+    assert rejected(limiter, "queue_full") == 1
+
+    release.set()
+    await asyncio.gather(running, waiting)
+    assert limiter._running == 0
+    assert limiter._waiting == 0
+
+
+async def test_limiter_rejects_after_queue_timeout():
+    limiter = make_limiter("test-timeout", queue_timeout=0.05)
+    release = asyncio.Event()
+    running = asyncio.create_task(hold(limiter, release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(ServiceOverloadedError):
+        async with limiter:
+            pass
+
+    assert rejected(limiter, "timeout") == 1
+    # ожидавший ушел из очереди и не занял слот
+    assert limiter._waiting == 0
+    assert limiter._running == 1
+
+    release.set()
+    await running
+    async with limiter:
+        assert limiter._running == 1
+
+
+async def test_limiter_queued_caller_gets_released_slot():
+    limiter = make_limiter("test-queued")
+    release = asyncio.Event()
+    running = asyncio.create_task(hold(limiter, release))
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(hold(limiter, asyncio.Event()))
+    await asyncio.sleep(0)
+    assert limiter._waiting == 1
+
+    release.set()
+    await running
+    # ожидающему нужно несколько итераций цикла, чтобы занять слот
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+    assert limiter._waiting == 0
+    assert limiter._running == 1
+
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    assert limiter._running == 0
+
+
+async def test_overloaded_exception_returns_503_with_retry_after():
+    response = await overloaded_exception(
+        None, ServiceOverloadedError(retry_after=7)
+    )
+
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == "7"
+    assert json.loads(response.body) == {
+        "detail": "Service overloaded, retry later."
+    }
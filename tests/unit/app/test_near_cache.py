@@ -0,0 +1,133 @@
+import asyncio
+import time
+from typing import Optional
+
+from repositories.abstract_cache import AbstractCache
+from repositories.near_cache import (
+    NearCache,
+    SubscriptionHealth,
+    denied_token_message,
+    user_revoked_message,
+)
+from utils.bloom import ExpiringBloomFilter
+from utils.ttl_cache import TTLCache
+
+
+class DictCache(AbstractCache):
+    """Общий кеш в словаре вместо Redis"""
+
+    def __init__(self) -> None:
+        self.denied: dict[str, str] = {}
+        self.epochs: dict[str, float] = {}
+        self.reads = 0
+
+    async def add_denied_token(self, jti: str, user_id: str, expire: int):
+        self.denied[jti] = user_id
+
+    async def get(self, token: str) -> Optional[str]:
+        self.reads += 1
+        return self.denied.get(token)
+
+    async def get_denied_tokens(self) -> list[tuple[str, float]]:
+        return [(jti, time.time() + 60) for jti in self.denied]
+
+    async def revoke_user_tokens(self, user_id: str) -> float:
+        self.epochs[user_id] = time.time()
+        return self.epochs[user_id]
+
+    async def get_revoked_before(self, user_id: str) -> Optional[float]:
+        return self.epochs.get(user_id)
+
+    async def close(self):
+        pass
+
+
+def make_near_cache(now: list[float]):
+    # свои часы вместо time.monotonic: по нему идут и таймеры event loop
+    shared = DictCache()
+    near_cache = NearCache(
+        shared,
+        TTLCache("test-near", max_size=10, ttl=0, clock=lambda: now[0]),
+        ExpiringBloomFilter("test-near", window=300, capacity=100, error_rate=0.001),
+        health=SubscriptionHealth(stale_after=10, clock=lambda: now[0]),
+    )
+    return shared, near_cache
+
+
+async def test_near_cache_trusts_filter_while_subscription_is_alive():
+    now = [1000.0]
+    shared, near_cache = make_near_cache(now)
+    await near_cache.reset()
+    # отзыв, сообщение о котором не дошло
+    shared.denied["lost"] = "user"
+
+    assert await near_cache.get("lost") is None
+    assert shared.reads == 0
+
+
+async def test_near_cache_skips_filter_of_stale_subscription():
+    now = [1000.0]
+    shared, near_cache = make_near_cache(now)
+    await near_cache.reset()
+    shared.denied["lost"] = "user"
+
+    now[0] += 11
+    assert near_cache.is_stale()
+    assert await near_cache.get("lost") == "user"
+    assert shared.reads == 1
+
+    # pong от Redis возвращает доверие к фильтру
+    near_cache.mark_alive()
+    assert not near_cache.is_stale()
+    assert await near_cache.get("lost") is None
+
+
+class SlowDictCache(DictCache):
+    """Чтение ждет, пока тест его не отпустит"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.release = asyncio.Event()
+
+    async def get(self, token: str) -> Optional[str]:
+        denied = self.denied.get(token)
+        await self.release.wait()
+        return denied
+
+    async def get_revoked_before(self, user_id: str) -> Optional[float]:
+        revoked_before = self.epochs.get(user_id)
+        await self.release.wait()
+        return revoked_before
+
+
+async def test_near_cache_read_in_flight_keeps_revocation():
+    shared = SlowDictCache()
+    near_cache = NearCache(
+        shared, TTLCache("test-near-race", max_size=10, ttl=60)
+    )
+
+    reader = asyncio.create_task(near_cache.get("jti"))
+    await asyncio.sleep(0)
+    # отзыв пришел, пока Redis отвечал по старому состоянию
+    near_cache.apply_message(denied_token_message("jti", "user", 60).encode())
+    shared.release.set()
+
+    assert await reader == "user"
+    assert await near_cache.get("jti") == "user"
+
+
+async def test_near_cache_epoch_read_in_flight_keeps_revocation():
+    shared = SlowDictCache()
+    near_cache = NearCache(
+        shared,
+        TTLCache("test-near-race", max_size=10, ttl=60),
+        epochs=TTLCache("test-epochs-race", max_size=10, ttl=60),
+    )
+
+    reader = asyncio.create_task(near_cache.get_revoked_before("user"))
+    await asyncio.sleep(0)
+    near_cache.apply_message(user_revoked_message("user", 1000.5).encode())
+    shared.release.set()
+
+    assert await reader == 1000.5
+    assert await near_cache.get_revoked_before("user") == 1000.5
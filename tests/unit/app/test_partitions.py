@@ -0,0 +1,132 @@
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+from utils.partitions import (
+    drop_expired_partitions,
+    ensure_partitions,
+    list_partitions,
+)
+
+TABLE = "test_partitions_scratch"
+
+
+async def recreate(engine, *rows: datetime) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP TABLE IF EXISTS {0}".format(TABLE)))
+        await conn.execute(
+            text(
+                "CREATE TABLE {0} (id serial, created_at timestamp) "
+                "PARTITION BY RANGE (created_at)".format(TABLE)
+            )
+        )
+        await conn.execute(
+            text("CREATE TABLE {0}_default PARTITION OF {0} DEFAULT".format(TABLE))
+        )
+        for created_at in rows:
+            await conn.execute(
+                text("INSERT INTO {0} (created_at) VALUES (:created_at)".format(TABLE)),
+                {"created_at": created_at},
+            )
+
+
+async def drop(engine) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP TABLE IF EXISTS {0}".format(TABLE)))
+
+
+async def rows_by_partition(conn) -> dict[str, list[datetime]]:
+    result = await conn.execute(
+        text(
+            "SELECT tableoid::regclass::text, created_at FROM {0} "
+            "ORDER BY created_at".format(TABLE)
+        )
+    )
+    rows: dict[str, list[datetime]] = {}
+    for partition, created_at in result:
+        rows.setdefault(partition, []).append(created_at)
+    return rows
+
+
+async def test_ensure_partitions_creates_months_ahead(pg_engine):
+    await recreate(pg_engine)
+    try:
+        async with pg_engine.begin() as conn:
+            created = await ensure_partitions(
+                conn, TABLE, months_ahead=2, today=date(2020, 11, 20)
+            )
+            assert created == [
+                "{0}_p202011".format(TABLE),
+                "{0}_p202012".format(TABLE),
+                "{0}_p202101".format(TABLE),
+            ]
+            # повторный запуск ничего не создает
+            assert await ensure_partitions(
+                conn, TABLE, months_ahead=2, today=date(2020, 11, 20)
+            ) == []
+            assert len(await list_partitions(conn, TABLE)) == 4
+    finally:
+        await drop(pg_engine)
+
+
+async def test_ensure_partitions_moves_rows_out_of_default(pg_engine):
+    rows = [
+        datetime(2020, 11, 1),
+        datetime(2020, 11, 30, 23, 59),
+        datetime(2020, 12, 15),
+        datetime(2021, 3, 1),
+    ]
+    await recreate(pg_engine, *rows)
+    try:
+        async with pg_engine.begin() as conn:
+            await ensure_partitions(
+                conn, TABLE, months_ahead=1, today=date(2020, 11, 5)
+            )
+            by_partition = await rows_by_partition(conn)
+    finally:
+        await drop(pg_engine)
+
+    assert by_partition == {
+        "{0}_p202011".format(TABLE): rows[:2],
+        "{0}_p202012".format(TABLE): rows[2:3],
+        # месяц без партиции остается в default
+        "{0}_default".format(TABLE): rows[3:],
+    }
+
+
+async def test_drop_expired_partitions(pg_engine):
+    rows = [
+        # в default: партиций за эти месяцы не было
+        datetime(2019, 12, 31),
+        datetime(2020, 6, 1),
+        # в партициях
+        datetime(2020, 8, 10),
+        datetime(2020, 10, 10),
+    ]
+    await recreate(pg_engine, *rows)
+    try:
+        async with pg_engine.begin() as conn:
+            await ensure_partitions(
+                conn, TABLE, months_ahead=0, today=date(2020, 8, 1)
+            )
+            await ensure_partitions(
+                conn, TABLE, months_ahead=1, today=date(2020, 10, 1)
+            )
+
+            # храним два полных месяца до ноября: сентябрь и октябрь
+            dropped = await drop_expired_partitions(
+                conn, TABLE, retention_months=2, today=date(2020, 11, 3)
+            )
+            by_partition = await rows_by_partition(conn)
+            partitions = await list_partitions(conn, TABLE)
+    finally:
+        await drop(pg_engine)
+
+    assert dropped == ["{0}_p202008".format(TABLE)]
+    assert sorted(partitions) == [
+        "{0}_default".format(TABLE),
+        "{0}_p202010".format(TABLE),
+        "{0}_p202011".format(TABLE),
+    ]
+    # устаревшие строки default удалены, как и партиция августа
+    assert by_partition == {"{0}_p202010".format(TABLE): rows[3:]}
@@ -0,0 +1,143 @@
+import asyncio
+import json
+import random
+import time
+from typing import Optional
+
+from repositories.permission_cache import PermissionCache
+
+TTL = 60
+
+
+class DictPipeline:
+    def __init__(self, client: "DictRedis") -> None:
+        self.client = client
+        self.commands: list = []
+
+    async def __aenter__(self) -> "DictPipeline":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        pass
+
+    def incr(self, name: str) -> None:
+        self.commands.append(lambda: self.client.incr(name))
+
+    def expire(self, name: str, seconds: int) -> None:
+        self.commands.append(lambda: self.client.expire(name, seconds))
+
+    def delete(self, name: str) -> None:
+        self.commands.append(lambda: self.client.data.pop(name, None))
+
+    async def execute(self) -> list:
+        return [command() for command in self.commands]
+
+
+class DictRedis:
+    """Команды Redis, нужные PermissionCache, в словаре"""
+
+    def __init__(self) -> None:
+        self.data: dict[str, bytes] = {}
+        self.ttls: dict[str, int] = {}
+
+    async def mget(self, *names: str) -> list[Optional[bytes]]:
+        return [self.data.get(name) for name in names]
+
+    async def set(self, name: str, value: str, ex: int) -> None:
+        self.data[name] = value.encode()
+        self.ttls[name] = ex
+
+    def incr(self, name: str) -> int:
+        value = int(self.data.get(name, 0)) + 1
+        self.data[name] = str(value).encode()
+        return value
+
+    def expire(self, name: str, seconds: int) -> None:
+        self.ttls[name] = seconds
+
+    def pipeline(self, transaction: bool) -> DictPipeline:
+        return DictPipeline(self)
+
+
+class Loader:
+    def __init__(self, permissions: list[str]) -> None:
+        self.permissions = permissions
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self) -> list[str]:
+        self.calls += 1
+        permissions = list(self.permissions)
+        await self.release.wait()
+        return permissions
+
+
+def make_cache(beta: float = 0.0) -> tuple[DictRedis, PermissionCache]:
+    client = DictRedis()
+    return client, PermissionCache(client, ttl=TTL, beta=beta)
+
+
+async def test_invalidate_sets_version_expiry():
+    client, cache = make_cache()
+    version_key, entry_key = cache._keys("user")
+    await cache.get("user", Loader(["read"]))
+
+    await cache.invalidate(["user"])
+
+    assert client.data[version_key] == b"1"
+    # версия переживает любую запись со старой версией
+    assert client.ttls[version_key] >= 2 * TTL
+    assert entry_key not in client.data
+
+
+async def test_concurrent_misses_share_one_load():
+    _, cache = make_cache()
+    loader = Loader(["read"])
+    loader.release.clear()
+
+    readers = [
+        asyncio.create_task(cache.get("shared", loader)) for _ in range(5)
+    ]
+    await asyncio.sleep(0)
+    loader.release.set()
+
+    assert await asyncio.gather(*readers) == [["read"]] * 5
+    assert loader.calls == 1
+
+
+async def test_load_racing_with_invalidation_is_not_served():
+    client, cache = make_cache()
+    _, entry_key = cache._keys("racing")
+    stale = Loader(["old"])
+    stale.release.clear()
+
+    reader = asyncio.create_task(cache.get("racing", stale))
+    await asyncio.sleep(0)
+    # права поменялись, пока шла загрузка
+    await cache.invalidate(["racing"])
+    fresh = Loader(["new"])
+    # загрузка после инвалидации не присоединяется к начатой до нее
+    assert await cache.get("racing", fresh) == ["new"]
+    stale.release.set()
+    assert await reader == ["old"]
+
+    # запись старой версии, сохраненная последней, не отдается
+    assert json.loads(client.data[entry_key])["version"] == 0
+    assert await cache.get("racing", fresh) == ["new"]
+    assert fresh.calls == 2
+
+
+async def test_entry_is_reloaded_early_only_near_expiry(monkeypatch):
+    _, cache = make_cache(beta=1.0)
+    monkeypatch.setattr(random, "random", lambda: 0.5)
+    now = time.time()
+    # -ln(0.5) * delta ~ 0.69 s до истечения
+    entry = {"delta": 1.0, "expires_at": now + 0.5}
+    assert cache._reload_early(entry)
+    entry["expires_at"] = now + TTL
+    assert not cache._reload_early(entry)
+
+    cache.beta = 0.0
+    entry["expires_at"] = now + 0.5
+    assert not cache._reload_early(entry)
@@ -0,0 +1,77 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from repositories import role_catalog as role_catalog_module
+from repositories.role_catalog import RoleCatalog, listen_role_changes
+
+CHECK_INTERVAL = 0.05
+
+
+class SilentConnection:
+    """Соединение, оборванное без FIN: уведомлений нет, запросы висят"""
+
+    def __init__(self) -> None:
+        self.terminated = False
+        self.probe_timeouts: list[float] = []
+
+    def add_termination_listener(self, callback) -> None:
+        pass
+
+    async def add_listener(self, channel: str, callback) -> None:
+        pass
+
+    async def execute(self, query: str, timeout: float = None) -> None:
+        self.probe_timeouts.append(timeout)
+        await asyncio.wait_for(asyncio.Event().wait(), timeout)
+
+    def is_closed(self) -> bool:
+        return False
+
+    def terminate(self) -> None:
+        self.terminated = True
+
+
+async def test_silent_listen_connection_invalidates_catalog(monkeypatch):
+    connections: list[SilentConnection] = []
+    reconnected = asyncio.Event()
+    ready_on_reconnect: list[bool] = []
+
+    async def connect(dsn: str) -> SilentConnection:
+        if connections:
+            ready_on_reconnect.append(catalog.ready)
+            reconnected.set()
+        connections.append(SilentConnection())
+        return connections[-1]
+
+    async def load(repository) -> None:
+        catalog.replace([])
+
+    monkeypatch.setattr(role_catalog_module.asyncpg, "connect", connect)
+    monkeypatch.setattr(role_catalog_module, "RECONNECT_DELAY", 0)
+    catalog = RoleCatalog()
+    monkeypatch.setattr(catalog, "load", load)
+    settings = SimpleNamespace(
+        POSTGRES_USER="user",
+        POSTGRES_PASSWORD="password",
+        POSTGRES_LISTEN_HOST=None,
+        POSTGRES_HOST="localhost",
+        POSTGRES_PORT=5432,
+        POSTGRES_DATABASE="database",
+        POSTGRES_LISTEN_CHECK_INTERVAL=CHECK_INTERVAL,
+    )
+
+    listener = asyncio.create_task(
+        listen_role_changes(catalog, None, settings)
+    )
+    try:
+        await asyncio.wait_for(reconnected.wait(), timeout=5)
+        # проверка ограничена таймаутом, каталог сброшен до переподключения
+        assert connections[0].probe_timeouts == [CHECK_INTERVAL]
+        assert connections[0].terminated
+        assert ready_on_reconnect == [False]
+    finally:
+        listener.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await listener
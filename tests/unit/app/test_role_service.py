@@ -0,0 +1,80 @@
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import text
+
+from repositories.role_catalog import RoleCatalog
+from repositories.role_db import RoleDB
+from repositories.user_db import UserDB
+from services.role_service import RoleService
+
+PREFIX = "test_role_service_"
+
+
+class RecordingCache:
+    """Отзывы токенов и сбросы прав вместо Redis"""
+
+    def __init__(self) -> None:
+        self.revoked: list[str] = []
+        self.invalidated: list[str] = []
+
+    async def revoke_user_tokens(self, user_id: str) -> float:
+        self.revoked.append(user_id)
+        return 0.0
+
+    async def invalidate(self, user_ids) -> None:
+        self.invalidated.extend(user_ids)
+
+
+@pytest.fixture
+async def holders_and_role(pg_engine):
+    user_ids, role_id = [uuid4(), uuid4()], uuid4()
+    async with pg_engine.begin() as conn:
+        await conn.execute(
+            text(
+                "INSERT INTO role (id, created_at, name, access) "
+                "VALUES (:id, now(), :name, '')"
+            ),
+            {"id": role_id, "name": PREFIX + str(role_id)},
+        )
+        for user_id in user_ids:
+            await conn.execute(
+                text(
+                    'INSERT INTO "user" (id, created_at, login, password) '
+                    "VALUES (:id, now(), :login, 'x')"
+                ),
+                {"id": user_id, "login": PREFIX + str(user_id)},
+            )
+            await conn.execute(
+                text(
+                    "INSERT INTO user_role (user_id, role_id) "
+                    "VALUES (:user, :role)"
+                ),
+                {"user": user_id, "role": role_id},
+            )
+    yield user_ids, role_id
+    async with pg_engine.begin() as conn:
+        await conn.execute(
+            text('DELETE FROM "user" WHERE login LIKE :prefix'),
+            {"prefix": PREFIX + "%"},
+        )
+        await conn.execute(
+            text("DELETE FROM role WHERE name LIKE :prefix"),
+            {"prefix": PREFIX + "%"},
+        )
+
+
+async def test_role_delete_revokes_tokens_of_holders(
+    pg_engine, holders_and_role
+):
+    user_ids, role_id = holders_and_role
+    cache = RecordingCache()
+    role_service = RoleService(
+        RoleDB(pg_engine), UserDB(pg_engine), cache, cache, RoleCatalog()
+    )
+
+    await role_service.delete(role_id)
+
+    holders = sorted(str(user_id) for user_id in user_ids)
+    assert sorted(cache.invalidated) == holders
+    assert sorted(cache.revoked) == holders
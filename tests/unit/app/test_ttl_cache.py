@@ -0,0 +1,77 @@
+from utils.ttl_cache import MISSING, TTLCache
+
+
+def test_ttl_cache_returns_fresh_value():
+    cache = TTLCache("test-fresh", max_size=10, ttl=60)
+    cache.set("key", "value")
+
+    assert cache.get("key") == "value"
+    assert cache.peek("key") == "value"
+
+
+def test_ttl_cache_entry_expires():
+    now = [1000.0]
+    cache = TTLCache(
+        "test-expiry", max_size=10, ttl=5, clock=lambda: now[0]
+    )
+    cache.set("default", 1)
+    cache.set("custom", 2, ttl=20)
+
+    now[0] += 5
+    # запись живет ровно ttl секунд
+    assert cache.get("default") is MISSING
+    assert cache.get("custom") == 2
+
+    now[0] += 15
+    assert cache.peek("custom") is MISSING
+    assert cache.get("custom") is MISSING
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache("test-lru", max_size=2, ttl=60)
+    cache.set("first", 1)
+    cache.set("second", 2)
+    # чтение делает first самой свежей записью
+    assert cache.get("first") == 1
+
+    cache.set("third", 3)
+
+    assert cache.get("second") is MISSING
+    assert cache.get("first") == 1
+    assert cache.get("third") == 3
+
+
+def test_ttl_cache_peek_does_not_touch_lru_order():
+    cache = TTLCache("test-peek", max_size=2, ttl=60)
+    cache.set("first", 1)
+    cache.set("second", 2)
+    assert cache.peek("first") == 1
+
+    cache.set("third", 3)
+
+    assert cache.peek("first") is MISSING
+    assert cache.peek("second") == 2
+
+
+def test_ttl_cache_stores_none_apart_from_missing():
+    cache = TTLCache("test-none", max_size=10, ttl=60)
+    cache.set("cached-none", None)
+
+    assert cache.get("cached-none") is None
+    assert cache.get("absent") is MISSING
+    assert cache.peek("cached-none") is None
+    assert cache.peek("absent") is MISSING
+
+
+def test_ttl_cache_delete_and_clear():
+    cache = TTLCache("test-clear", max_size=10, ttl=60)
+    cache.set("first", 1)
+    cache.set("second", 2)
+
+    cache.delete("first")
+    cache.delete("absent")
+    assert cache.get("first") is MISSING
+    assert cache.get("second") == 2
+
+    cache.clear()
+    assert cache.get("second") is MISSING
@@ -0,0 +1,73 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import text
+
+from repositories.user_db import UserDB
+from utils.exceptions import NotFoundError, UserRoleActionError
+from utils.metrics import metrics
+from utils.pool_metrics import PoolMonitor
+
+PREFIX = "test_user_db_"
+
+
+@pytest.fixture
+async def user_and_role(pg_engine):
+    user_id, role_id = uuid4(), uuid4()
+    async with pg_engine.begin() as conn:
+        await conn.execute(
+            text(
+                'INSERT INTO "user" (id, created_at, login, password) '
+                "VALUES (:id, now(), :login, 'x')"
+            ),
+            {"id": user_id, "login": PREFIX + str(user_id)},
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO role (id, created_at, name, access) "
+                "VALUES (:id, now(), :name, '')"
+            ),
+            {"id": role_id, "name": PREFIX + str(role_id)},
+        )
+    yield user_id, role_id
+    async with pg_engine.begin() as conn:
+        await conn.execute(
+            text("DELETE FROM user_role WHERE user_id = :id"), {"id": user_id}
+        )
+        await conn.execute(
+            text('DELETE FROM "user" WHERE id = :id'), {"id": user_id}
+        )
+        await conn.execute(
+            text("DELETE FROM role WHERE id = :id"), {"id": role_id}
+        )
+
+
+async def test_add_role_to_user_errors_return_connections(
+    pg_engine, user_and_role
+):
+    user_id, role_id = user_and_role
+    PoolMonitor(held_warning_seconds=None, capture_stacks=False).attach(
+        pg_engine, label="test_user_db"
+    )
+    repository = UserDB(pg_engine)
+    await repository.add_role_to_user(user_id, role_id)
+
+    calls = []
+    for _ in range(20):
+        # повторное назначение - ON CONFLICT DO NOTHING без строк
+        calls.append(repository.add_role_to_user(user_id, role_id))
+        # нарушение внешнего ключа - IntegrityError из базы
+        calls.append(repository.add_role_to_user(uuid4(), role_id))
+        calls.append(repository.add_role_to_user(user_id, uuid4()))
+    results = await asyncio.gather(*calls, return_exceptions=True)
+
+    assert [type(result) for result in results] == [
+        UserRoleActionError,
+        NotFoundError,
+        NotFoundError,
+    ] * 20
+    pool = pg_engine.sync_engine.pool
+    assert pool.checkedout() == 0
+    gauges = metrics.snapshot()["gauges"]
+    assert gauges["db_pool_in_use{pool=test_user_db}"] == 0
@@ -0,0 +1,92 @@
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import text
+
+from repositories.user_db import UserDB
+from schemas.user import UserCreate
+from services.user_service import UserService
+from utils.exceptions import NotFoundError
+
+PREFIX = "test_user_service_"
+
+
+class PlainPasswordService:
+    """Хеш без bcrypt, пароль "fail" не хешируется"""
+
+    def __init__(self) -> None:
+        self.hashed: list[str] = []
+
+    async def hash(self, password: str) -> str:
+        if password == "fail":
+            raise ValueError("hashing failed")
+        self.hashed.append(password)
+        return "hashed:" + password
+
+
+def make_users(*passwords: str):
+    for password in passwords:
+        yield UserCreate(login=PREFIX + str(uuid4()), password=password)
+
+
+@pytest.fixture
+async def role_id(pg_engine):
+    role_id = uuid4()
+    async with pg_engine.begin() as conn:
+        await conn.execute(
+            text(
+                "INSERT INTO role (id, created_at, name, access) "
+                "VALUES (:id, now(), :name, '')"
+            ),
+            {"id": role_id, "name": PREFIX + str(role_id)},
+        )
+    yield role_id
+    async with pg_engine.begin() as conn:
+        await conn.execute(
+            text('DELETE FROM "user" WHERE login LIKE :prefix'),
+            {"prefix": PREFIX + "%"},
+        )
+        await conn.execute(
+            text("DELETE FROM role WHERE id = :id"), {"id": role_id}
+        )
+
+
+async def imported(pg_engine) -> list[tuple[str, int]]:
+    async with pg_engine.connect() as conn:
+        result = await conn.execute(
+            text(
+                'SELECT "user".password, count(user_role.role_id) '
+                'FROM "user" LEFT JOIN user_role '
+                'ON user_role.user_id = "user".id '
+                'WHERE "user".login LIKE :prefix '
+                'GROUP BY "user".id ORDER BY "user".password'
+            ),
+            {"prefix": PREFIX + "%"},
+        )
+        return [tuple(row) for row in result]
+
+
+async def test_add_many_commits_batches_with_roles(pg_engine, role_id):
+    passwords = PlainPasswordService()
+    user_service = UserService(UserDB(pg_engine), passwords)
+
+    with pytest.raises(ValueError):
+        await user_service.add_many(
+            make_users("a", "b", "c", "fail", "d"),
+            batch_size=2,
+            role_id=role_id,
+        )
+
+    # первая пачка зафиксирована вместе с ролью, пачка с ошибкой
+    # не вставлена, а оставшиеся строки даже не хешировались
+    assert await imported(pg_engine) == [("hashed:a", 1), ("hashed:b", 1)]
+    assert passwords.hashed == ["a", "b", "c"]
+
+
+async def test_add_many_does_not_keep_users_without_role(pg_engine, role_id):
+    user_service = UserService(UserDB(pg_engine), PlainPasswordService())
+
+    with pytest.raises(NotFoundError):
+        await user_service.add_many(make_users("a", "b"), role_id=uuid4())
+
+    assert await imported(pg_engine) == []
@@ -224,3 +224,94 @@ async def test_good_history(
     assert len(body_history) == expected_answer["len"], message["len"]
 
     # await delete_users()
+
+
+@pytest.mark.parametrize(
+    TEST_PARAMS_AUTH["test_history_cursor"]["keys"],
+    TEST_PARAMS_AUTH["test_history_cursor"]["data"],
+)
+async def test_history_cursor(
+    make_post_request,
+    make_post_request_headers,
+    signup_user,
+    query,
+    expected_answer,
+    message,
+):
+    # add user in db
+    await signup_user(*query["user_create"])
+
+    # every login adds an event to the history
+    for _ in range(query["logins"]):
+        body_login, _, cookies_login = await make_post_request(
+            path=query["path_login"], query_data=query["data_login"]
+        )
+    headers_login = {"Authorization": "Bearer {0}".format(body_login["access_token"])}
+
+    # walk forward through all pages
+    pages, headers_pages = [], []
+    path = query["path_history"]
+    while True:
+        body_page, status, headers_page = await make_post_request_headers(
+            path=path, headers=headers_login, cookies=cookies_login
+        )
+        assert status == expected_answer["status"], message["status"]
+        pages.append(body_page)
+        headers_pages.append(headers_page)
+        if "X-Next-Cursor" not in headers_page:
+            break
+        path = "{0}&cursor={1}".format(
+            query["path_history"], headers_page["X-Next-Cursor"]
+        )
+
+    assert [len(page) for page in pages] == expected_answer["pages"], message["pages"]
+    assert "X-Prev-Cursor" not in headers_pages[0], message["first"]
+    assert "X-Next-Cursor" not in headers_pages[-1], message["last"]
+
+    # pages continue each other without gaps and overlaps
+    walked = [event["created_at"] for page in pages for event in page]
+    descending = "descending=true" in query["path_history"]
+    assert walked == sorted(walked, reverse=descending), message["order"]
+    assert len(set(walked)) == query["logins"], message["order"]
+
+    # step back across the boundary of the last page
+    body_back, status, headers_back = await make_post_request_headers(
+        path="{0}&cursor={1}".format(
+            query["path_history"], headers_pages[-1]["X-Prev-Cursor"]
+        ),
+        headers=headers_login,
+        cookies=cookies_login,
+    )
+    assert status == expected_answer["status"], message["status"]
+    assert body_back == pages[-2], message["back"]
+    assert "X-Next-Cursor" in headers_back, message["back"]
+
+
+@pytest.mark.parametrize(
+    TEST_PARAMS_AUTH["test_failed_history_cursor"]["keys"],
+    TEST_PARAMS_AUTH["test_failed_history_cursor"]["data"],
+)
+async def test_failed_history_cursor(
+    make_post_request,
+    signup_user,
+    query,
+    expected_answer,
+    message,
+):
+    # add user in db
+    await signup_user(*query["user_create"])
+
+    # Request login
+    body_login, _, cookies_login = await make_post_request(
+        path=query["path_login"], query_data=query["data_login"]
+    )
+    headers_login = {"Authorization": "Bearer {0}".format(body_login["access_token"])}
+
+    # Request history with a malformed cursor
+    _, status, _ = await make_post_request(
+        path=query["path_history"],
+        headers=headers_login,
+        cookies=cookies_login,
+    )
+
+    assert status == expected_answer["status"], message["status"]
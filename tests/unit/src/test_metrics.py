@@ -0,0 +1,38 @@
+import pytest
+
+from tests.data.params_metrics import TEST_PARAMS_METRICS
+
+
+@pytest.mark.parametrize(
+    TEST_PARAMS_METRICS["test_get_metrics"]["keys"],
+    TEST_PARAMS_METRICS["test_get_metrics"]["data"],
+)
+async def test_get_metrics(
+    make_get_request, make_post_request, query, expected_answer
+):
+    # Login as superuser
+    body_login, _, cookies_login = await make_post_request(
+        path=query["path_login"], query_data=query["data_login"]
+    )
+    headers_login = {"Authorization": "Bearer {0}".format(body_login["access_token"])}
+
+    # Request metrics of the worker
+    body_response, status_response, _ = await make_get_request(
+        path=query["path_metrics"],
+        headers=headers_login,
+        cookies=cookies_login,
+    )
+
+    assert status_response == expected_answer["status"]
+    assert set(body_response.keys()) == expected_answer["body_keys"]
+
+
+@pytest.mark.parametrize(
+    TEST_PARAMS_METRICS["test_get_metrics_unauthorized"]["keys"],
+    TEST_PARAMS_METRICS["test_get_metrics_unauthorized"]["data"],
+)
+async def test_get_metrics_unauthorized(make_get_request, query, expected_answer):
+    # Request metrics without a token
+    _, status_response, _ = await make_get_request(path=query["path_metrics"])
+
+    assert status_response == expected_answer["status"]